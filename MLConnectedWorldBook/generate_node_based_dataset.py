@@ -6,23 +6,44 @@ This Python file contains functions to generate the full dataset required for th
 The actual dataset used in the node-based learning chapter is provided in the repository, located in the 'data' folder. This file is provided to ensure repeatability and transparency in how the dataset was generated.
 
 Usage:
-    - Ensure you have the required libraries installed: pandas, networkx, tqdm, joblib
-    - Place this script in the same directory as your graph data or adjust the paths accordingly
-    - Run the script to generate the dataset and save it as needed
+    - Ensure you have the required libraries installed: pandas, networkx, tqdm, joblib, pyarrow
+    - Run `python MLConnectedWorldBook/generate_node_based_dataset.py` to generate the dataset
+    - Run with `--help` to see how to select stages, force recomputation, and set the
+      number of workers and node shards
 
-The script is designed to utilize parallel processing to speed up the computation, leveraging 8 CPUs.
+The features are computed as stages of a pipeline (see `feature_pipeline.py`). Independent
+stages run in parallel worker processes, node-level stages are split into node shards,
+and every stage and shard is checkpointed, so an interrupted run resumes where it stopped
+and a re-run only recomputes stages whose code changed.
 
 Author: Boris Gorelik
 
 """
 
+import argparse
 import os
+import shutil
 import sys
+import tempfile
 
-sys.path.append(os.getcwd())
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from tqdm.auto import tqdm
 import numpy as np
+import centrality
+import community_sweep
+import csr_graph
 import data_utils
+import ego_features
+import graph_views
+import instrumentation
+import neighborhoods
+from feature_pipeline import (
+    Stage,
+    available_cpus,
+    graph_fingerprint,
+    run_pipeline,
+    stage_keys,
+)
 
 
 from joblib import Parallel, delayed
@@ -31,109 +52,100 @@ import networkx as nx
 from tqdm import tqdm
 
 
-def compute_node_features(g) -> pd.DataFrame:
-    # approx 2 minutes of computation time on the full dataset
-    degrees = dict(g.degree)
-    clustering = nx.clustering(g)
-    triangles = nx.triangles(g)
-    triangles_no_others = dict()
-    n_depth_2 = dict()
-    n_depth_4 = dict()
-    for node in tqdm(g.nodes, total=len(g.nodes), leave=False, desc="Node features"):
-        triangles_no_others[node] = sum(
-            [1 for n in g.neighbors(node) if n in triangles and triangles[n] == 1]
-        )
-        n_depth_2[node] = len(
-            set(nx.single_source_shortest_path_length(g, node, cutoff=2))
+def _n_nodes(g, nodes=None, **kwargs) -> int:
+    return g.number_of_nodes() if nodes is None else len(nodes)
+
+
+@instrumentation.instrumented(items=_n_nodes)
+def compute_triangle_features(g) -> pd.DataFrame:
+    """
+    The triangle counts of all the nodes of `g` (see
+    `neighborhoods.triangles_no_others`).
+    """
+    return neighborhoods.triangles_no_others(csr_graph.from_networkx(g))
+
+
+@instrumentation.instrumented(items=_n_nodes)
+def compute_node_features(
+    g, nodes=None, neighborhood_mode="exact", triangle_features=None
+) -> pd.DataFrame:
+    """
+    Degree, clustering, triangle counts and the number of nodes within distance 2 and
+    4 of `nodes` (default: all nodes of `g`). The neighbourhood sizes are counted for
+    all the nodes in one pass (see `neighborhoods.py`), exactly or, with
+    `neighborhood_mode="hyperanf"`, approximately with fixed memory per node.
+
+    The triangle counts are taken from `triangle_features` (the output of
+    `compute_triangle_features`) if given; the pipeline computes them once, in their
+    own stage. Every call still converts `g` to CSR arrays, which takes O(edges) time
+    per node shard. The HyperANF mode propagates counters over the whole graph
+    whatever the nodes, so its stage is not split into shards.
+    """
+    if nodes is None:
+        nodes = list(g.nodes)
+    with instrumentation.span("compute_node_features/csr"):
+        graph = csr_graph.from_networkx(g)
+    with instrumentation.span("compute_node_features/triangles", items=len(nodes)):
+        if triangle_features is None:
+            triangle_features = neighborhoods.triangles_no_others(graph)
+        triangles = triangle_features.loc[nodes]
+    with instrumentation.span(
+        "compute_node_features/neighborhood_sizes", items=len(nodes)
+    ):
+        depths = neighborhoods.neighborhood_sizes(
+            graph, depths=(2, 4), nodes=nodes, mode=neighborhood_mode
         )
-        n_depth_4[node] = len(
-            set(nx.single_source_shortest_path_length(g, node, cutoff=4))
+    with instrumentation.span("compute_node_features/clustering", items=len(nodes)):
+        ret = pd.DataFrame(
+            {
+                "degree": dict(g.degree(nodes)),
+                "clustering": nx.clustering(g, nodes),
+            }
         )
-    ret = pd.DataFrame(
-        {
-            "degree": degrees,
-            "clustering": clustering,
-            "triangles": triangles,
-            "triangles_no_others": triangles_no_others,
-            "n_depth_2": n_depth_2,
-            "n_depth_4": n_depth_4,
-        }
-    )
-    return ret
-
-
-def _get_betweenness_centrality(g):
-    return nx.betweenness_centrality(g)
-
-
-def _get_closeness_centrality(g):
-    return nx.closeness_centrality(g)
-
-
-def compute_centrality_features(g) -> pd.DataFrame:
-    # approx 8 minutes of computation time on the full dataset.
-    # 1 minute on a 1-percent edge sample
-    betweenness_centrality = _get_betweenness_centrality(g)
-    closeness_centrality = _get_closeness_centrality(g)
-    ret = pd.DataFrame(
-        {
-            "betweenness_centrality": betweenness_centrality,
-            "closeness_centrality": closeness_centrality,
-            # "katz": nx.katz_centrality(g),
-        }
+    return pd.concat([ret, triangles, depths], axis=1)
+
+
+@instrumentation.instrumented(items=_n_nodes)
+def compute_centrality_features(
+    g, mode="exact", n_pivots=1000, n_jobs=1, seed=42
+) -> pd.DataFrame:
+    """
+    Betweenness and closeness centrality, from one BFS per source (see
+    `centrality.py`). `mode` is "exact", "sampled" (`n_pivots` sources per connected
+    component) or "parallel" (exact, in `n_jobs` processes).
+
+    In the sampled mode, `ret.attrs["max_half_width"]` holds the largest 95%
+    confidence half-width of every column; it is kept in the Parquet checkpoint.
+    """
+    ret, half_width = centrality.betweenness_closeness(
+        csr_graph.from_networkx(g),
+        mode=mode,
+        n_pivots=n_pivots,
+        n_jobs=n_jobs,
+        seed=seed,
     )
+    if mode == "sampled":
+        ret.attrs["max_half_width"] = half_width.max().to_dict()
     return ret
 
 
-def compute_community_features(g) -> pd.DataFrame:
-    # about 1 minute of computation time
+@instrumentation.instrumented(items=_n_nodes)
+def compute_community_features(g, seed=42, n_jobs=1) -> pd.DataFrame:
+    """
+    Louvain communities at 10 resolutions (in `n_jobs` processes, see
+    `community_sweep.py`), and how each node's community relates to its neighbors'.
+    """
     resolutions = np.round(np.linspace(0.01, 4, 10), 2)
-    for res in tqdm(resolutions, desc="Community features"):
-        communities = nx.community.louvain_communities(g, resolution=res)
-        sizes = [len(c) for c in communities]
-        sizes.sort(key=lambda x: -x)
-        # assign `community_{res}` attribute to the nodes
-        for i, c in enumerate(communities):
-            for n in c:
-                g.nodes[n][f"community_{res:.2f}"] = f"community@{res:.2f}_{i:03d}"
-
-    ret = []
-    for n in g.nodes:
-        neighbors = set(g.neighbors(n))
-        curr = {"node_id": n}
-        for res in resolutions:
-            community_this = g.nodes[n][f"community_{res:.2f}"]
-            neighbors_in_community = [
-                g.nodes[nb][f"community_{res:.2f}"] == community_this
-                for nb in neighbors
-            ]
-            neighboring_communities = set(
-                [g.nodes[nb][f"community_{res:.2f}"] for nb in neighbors]
-            )
-            n_neighboring_communities = len(neighboring_communities)
-            curr[f"same_community@{res:.2f}"] = sum(neighbors_in_community) / len(
-                neighbors
-            )
-            curr[f"n_neighboring_communities@{res:.2f}"] = n_neighboring_communities
-        ret.append(curr)
-    df_community_fraction = pd.DataFrame(ret).set_index("node_id")
-    cols_same = [c for c in df_community_fraction.columns if "same_community" in c]
-    cols_neighboring = [
-        c for c in df_community_fraction.columns if "n_neighboring" in c
-    ]
-    mean_same = df_community_fraction[cols_same].mean(axis=1)
-    mean_neighboring = df_community_fraction[cols_neighboring].mean(axis=1)
-    df_community_fraction["mean_same"] = mean_same
-    df_community_fraction["mean_neighboring"] = mean_neighboring
-    for perc in [10, 25, 75, 90]:
-        df_community_fraction[f"percentile_same_{perc}"] = df_community_fraction[
-            cols_same
-        ].apply(lambda x: np.percentile(x, perc), axis=1)
-        df_community_fraction[f"percentile_neighboring_{perc}"] = df_community_fraction[
-            cols_neighboring
-        ].apply(lambda x: np.percentile(x, perc), axis=1)
-
-    return df_community_fraction
+    with instrumentation.span(
+        "compute_community_features/louvain_sweep", items=len(resolutions)
+    ):
+        labels = community_sweep.louvain_sweep(g, resolutions, seed=seed, n_jobs=n_jobs)
+    with instrumentation.span(
+        "compute_community_features/community_features", items=len(labels)
+    ):
+        return community_sweep.community_features(
+            csr_graph.from_networkx(g), labels, resolutions
+        )
 
 
 def compute_ego_graph_features_node(g, n):
@@ -172,12 +184,100 @@ def compute_ego_graph_features_node(g, n):
     return curr
 
 
-def compute_ego_graph_features(g):
-    results = Parallel(n_jobs=8)(
-        delayed(compute_ego_graph_features_node)(g, n)
-        for n in tqdm(g.nodes, desc="Ego-related features", total=len(g.nodes))
+_attached_graphs = dict()
+
+
+def _attach_shared_graph(directory):
+    # every worker process maps the exported arrays once and reuses them; the
+    # mapping of an earlier call is dropped, or its shared memory would stay
+    # allocated for as long as the (reused) worker lives
+    if directory not in _attached_graphs:
+        _attached_graphs.clear()
+        _attached_graphs[directory], _ = csr_graph.load(directory, mmap_mode="r")
+    return _attached_graphs[directory]
+
+
+def _csr_ego_graph(graph, i):
+    """The radius-1 ego graph of node position `i`, labeled by node positions."""
+    members = np.union1d(graph.neighbors(i), [i])
+    ego = nx.Graph()
+    ego.add_nodes_from(members.tolist())
+    for u in members.tolist():
+        row = graph.neighbors(u)
+        ego.add_edges_from((u, v) for v in row[np.isin(row, members)].tolist())
+    return ego
+
+
+def _compute_ego_graph_features_chunk(directory, positions):
+    graph = _attach_shared_graph(directory)
+    return [
+        compute_ego_graph_features_node(_csr_ego_graph(graph, i), i) for i in positions
+    ]
+
+
+@instrumentation.instrumented(items=_n_nodes)
+def compute_ego_graph_features(
+    g, nodes=None, method="vectorised", n_jobs=1, chunk_size=256
+):
+    """
+    Ego-network features of `nodes` (default: all nodes of `g`).
+
+    The default `method="vectorised"` computes the features of all the nodes at once
+    from the CSR adjacency (see `ego_features.py`). `method="networkx"` builds every
+    ego graph and runs `compute_ego_graph_features_node` on it; with `n_jobs != 1`,
+    the graph is exported once as CSR arrays to shared memory
+    (/dev/shm where available), the worker processes memory-map them, and the nodes
+    are processed in chunks of `chunk_size` nodes per task.
+    """
+    if nodes is None:
+        nodes = list(g.nodes)
+    if method == "vectorised":
+        return ego_features.ego_graph_features(csr_graph.from_networkx(g), nodes)
+    if n_jobs == 1:
+        results = [
+            compute_ego_graph_features_node(g, n)
+            for n in tqdm(nodes, desc="Ego-related features", leave=False)
+        ]
+        return pd.DataFrame(results).set_index("node_id")
+
+    graph = csr_graph.from_networkx(g)
+    positions = np.array([graph.node_index[n] for n in nodes], dtype=np.int64)
+    chunks = [
+        positions[i : i + chunk_size] for i in range(0, len(positions), chunk_size)
+    ]
+    shared_dir = tempfile.mkdtemp(
+        prefix="ego_features_", dir="/dev/shm" if os.path.isdir("/dev/shm") else None
+    )
+    try:
+        # node ids stay in this process; the workers only need the adjacency
+        csr_graph.save(
+            csr_graph.CSRGraph(
+                graph.indptr, graph.indices, np.arange(graph.number_of_nodes)
+            ),
+            shared_dir,
+        )
+        results = Parallel(n_jobs=n_jobs)(
+            delayed(_compute_ego_graph_features_chunk)(shared_dir, chunk)
+            for chunk in tqdm(chunks, desc="Ego-related features", leave=False)
+        )
+    finally:
+        shutil.rmtree(shared_dir, ignore_errors=True)
+    ret = pd.DataFrame([curr for chunk in results for curr in chunk])
+    ret["node_id"] = graph.nodes[ret["node_id"].to_numpy()]
+    return ret.set_index("node_id")
+
+
+def combine_features(
+    g, egograph_features, centrality_features, community_features
+) -> pd.DataFrame:
+    return pd.concat(
+        [
+            egograph_features,
+            centrality_features,
+            community_features,
+        ],
+        axis=1,
     )
-    return pd.DataFrame(results).set_index("node_id")
 
 
 def get_graph():
@@ -215,65 +315,188 @@ def get_graph():
     # add `scrambled` attribute to the nodes
     for node in ret.nodes:
         ret.nodes[node]["scrambled"] = node.startswith("scrambled")
-    g_scrambled_full = data_utils.get_connected_component_subgraphs(ret)[0]
+    (g_scrambled_full,) = graph_views.ConnectedComponents(ret).largest_k(1, copy=False)
     print(
         f"The largest connected component that has {g_scrambled_full.number_of_nodes():,} nodes and {g_scrambled_full.number_of_edges():,} edges"
     )
     return ret
 
 
-g_scrambled_full = get_graph()
-
-# now we will compute the features on the full dataset
-fn = "zdf_node_features_full.csv"
-if not os.path.exists(fn):
-    df_node_features_full = compute_node_features(g_scrambled_full)
-    df_node_features_full.reset_index().to_csv(fn)
-else:
-    df_node_features_full = pd.read_csv(fn).set_index("index")
-    df_node_features_full = df_node_features_full[
-        [c for c in df_node_features_full.columns if "Unnamed" not in c]
-    ].copy()
-
-fn = "zdf_centrality_features_full.csv"
-if not os.path.exists(fn):
-    df_centrality_features_full = compute_centrality_features(g_scrambled_full)
-    df_centrality_features_full.reset_index().to_csv(fn)
-else:
-    df_centrality_features_full = pd.read_csv(fn).set_index("index")
-    df_centrality_features_full = df_centrality_features_full[
-        [c for c in df_centrality_features_full.columns if "Unnamed" not in c]
-    ].copy()
-
-fn = "zdf_community_features_full.csv"
-if not os.path.exists(fn):
-    df_community_features_full = compute_community_features(g_scrambled_full)
-    df_community_features_full.reset_index().to_csv(fn)
-else:
-    df_community_features_full = pd.read_csv(fn).set_index("node_id")
-    df_community_features_full = df_community_features_full[
-        [c for c in df_community_features_full.columns if "Unnamed" not in c]
-    ].copy()
-
-fn = "zdf_egograph_features_full.csv"
-if not os.path.exists(fn):
-    df_egograph_features_full = compute_ego_graph_features(g_scrambled_full)
-    df_egograph_features_full.reset_index().to_csv(fn)
-else:
-    df_egograph_features_full = pd.read_csv(fn).set_index("node_id")
-    df_egograph_features_full = df_egograph_features_full[
-        [c for c in df_egograph_features_full.columns if "Unnamed" not in c]
-    ].copy()
-
-df_all_full = pd.concat(
-    [
-        df_egograph_features_full,
-        df_centrality_features_full,
-        df_community_features_full,
-    ],
-    axis=1,
-)
+def stage_n_jobs(pipeline_n_jobs=None) -> int:
+    """
+    Processes for the parallel parts of a stage (the Louvain sweep and the parallel
+    centrality mode), so that they and the `pipeline_n_jobs` pipeline workers
+    (default: all CPUs) together use each CPU once.
+    """
+    if pipeline_n_jobs is None:
+        pipeline_n_jobs = available_cpus()
+    return max(1, available_cpus() // pipeline_n_jobs)
+
+
+def get_stages(
+    centrality_mode="exact", n_pivots=1000, n_jobs=1, neighborhood_mode="exact"
+):
+    return [
+        Stage(
+            "triangle_features",
+            compute_triangle_features,
+            deps=(csr_graph, neighborhoods),
+        ),
+        Stage(
+            "node_features",
+            compute_node_features,
+            inputs=("triangle_features",),
+            sharded=neighborhood_mode == "exact",
+            params=dict(neighborhood_mode=neighborhood_mode),
+            deps=(csr_graph, neighborhoods),
+        ),
+        Stage(
+            "centrality_features",
+            compute_centrality_features,
+            params=dict(mode=centrality_mode, n_pivots=n_pivots, n_jobs=n_jobs),
+            deps=(csr_graph, centrality),
+        ),
+        Stage(
+            "community_features",
+            compute_community_features,
+            params=dict(n_jobs=n_jobs),
+            deps=(csr_graph, community_sweep),
+        ),
+        Stage(
+            "egograph_features",
+            compute_ego_graph_features,
+            sharded=True,
+            deps=(
+                csr_graph,
+                ego_features,
+                compute_ego_graph_features_node,
+                _csr_ego_graph,
+                _compute_ego_graph_features_chunk,
+            ),
+        ),
+        Stage(
+            "all_features",
+            combine_features,
+            inputs=("egograph_features", "centrality_features", "community_features"),
+        ),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    stage_names = [stage.name for stage in get_stages()]
+    parser.add_argument(
+        "--stages",
+        nargs="+",
+        choices=stage_names,
+        default=["node_features", "all_features"],
+        help="Stages whose outputs are wanted; their inputs are computed as needed",
+    )
+    parser.add_argument(
+        "--force",
+        nargs="+",
+        choices=stage_names,
+        default=[],
+        help="Stages to recompute even if they have a valid checkpoint",
+    )
+    parser.add_argument("--checkpoint-dir", default="feature_checkpoints")
+    parser.add_argument(
+        "--n-jobs",
+        type=int,
+        default=None,
+        help="Worker processes of the pipeline (default: all CPUs)",
+    )
+    parser.add_argument(
+        "--stage-n-jobs",
+        type=int,
+        default=None,
+        help="Processes of the Louvain sweep and the parallel centrality mode within "
+        "their stages (default: the CPUs left per pipeline worker, 1 by default)",
+    )
+    parser.add_argument(
+        "--n-shards", type=int, default=None, help="Node shards of node-level stages"
+    )
+    parser.add_argument(
+        "--centrality-mode", choices=["exact", "sampled", "parallel"], default="exact"
+    )
+    parser.add_argument(
+        "--n-pivots",
+        type=int,
+        default=1000,
+        help="BFS sources per connected component in the sampled centrality mode",
+    )
+    parser.add_argument(
+        "--neighborhood-mode",
+        choices=["exact", "hyperanf"],
+        default="exact",
+        help="Count the nodes within distance 2 and 4 exactly, or estimate them with "
+        "HyperANF (fixed memory per node)",
+    )
+    parser.add_argument("--output", default="df_all_features_full.csv")
+    parser.add_argument(
+        "--status",
+        action="store_true",
+        help="Only list the stages and whether their checkpoints are valid",
+    )
+    parser.add_argument(
+        "--profile",
+        default=None,
+        help="Record the time and memory of every step and write them to "
+        "PROFILE.json and PROFILE.trace.json (for chrome://tracing or Perfetto)",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Trace the peak allocations of every step (slower)",
+    )
+    args = parser.parse_args()
+    if args.profile:
+        instrumentation.enable(memory=args.profile_memory)
+
+    with instrumentation.span("get_graph"):
+        g_scrambled_full = get_graph()
+    stages = get_stages(
+        args.centrality_mode,
+        args.n_pivots,
+        n_jobs=args.stage_n_jobs or stage_n_jobs(args.n_jobs),
+        neighborhood_mode=args.neighborhood_mode,
+    )
 
-fn = "df_all_features_full.csv"
-df_all_full.to_csv(fn)
-print(f"Saved full features to {fn}")
+    if args.status:
+        keys = stage_keys(stages, graph_fingerprint(g_scrambled_full))
+        for name, key in keys.items():
+            fn = os.path.join(args.checkpoint_dir, f"{name}-{key}.parquet")
+            status = "valid" if os.path.exists(fn) else "missing"
+            print(f"{name:<20s} {key} {status}")
+        return
+
+    frames, _ = run_pipeline(
+        g_scrambled_full,
+        stages,
+        checkpoint_dir=args.checkpoint_dir,
+        targets=args.stages,
+        force=args.force,
+        n_jobs=args.n_jobs,
+        n_shards=args.n_shards,
+    )
+    widths = frames.get("centrality_features", pd.DataFrame()).attrs.get(
+        "max_half_width"
+    )
+    if widths:
+        print(
+            "Largest 95% confidence half-widths: "
+            + ", ".join(f"{c} ±{v:.2g}" for c, v in widths.items())
+        )
+    if "all_features" in frames:
+        frames["all_features"].to_csv(args.output)
+        print(f"Saved full features to {args.output}")
+    if args.profile:
+        print(instrumentation.summary().to_string())
+        instrumentation.export_json(args.profile + ".json")
+        instrumentation.export_chrome_trace(args.profile + ".trace.json")
+        print(f"Saved the profile to {args.profile}.json and {args.profile}.trace.json")
+
+
+if __name__ == "__main__":
+    main()
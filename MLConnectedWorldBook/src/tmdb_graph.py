@@ -1,23 +1,29 @@
+import hashlib
 import json
+import os
 from collections import defaultdict
 from datetime import timedelta
 
 import networkx as nx
 import numpy as np
 import pandas as pd
-from cachier import cachier
+from joblib import Parallel, delayed
 from yake import yake
 from tqdm.auto import tqdm
 
+import caching
+import graph_views
+import instrumentation
 
-@cachier(stale_after=timedelta(days=1))
-def build_movies_and_keywords_graph(
-    df: pd.DataFrame,
-    n_grams: int = 2,
-    top: int = 10,
-) -> nx.Graph:
+# the store of the extracted keywords, one entry per text; defaults to the result
+# cache of `caching`, whose size cap it shares
+keyword_cache = None
+keyword_cache_stats = caching.CacheStats()
+_keyword_namespace = "tmdb_graph.extract_keywords"
 
-    kw_extractor = yake.KeywordExtractor(
+
+def _keyword_extractor(n_grams: int, top: int) -> yake.KeywordExtractor:
+    return yake.KeywordExtractor(
         lan="en",
         n=n_grams,  # up to n-grams
         dedupLim=0.9,  # two words are considered the same if the similarity is higher than this
@@ -26,121 +32,302 @@ def build_movies_and_keywords_graph(
         top=top,  # number of keywords to extract
         features=None,  # list of features to extract. If None, it uses all the features. Options are: ngram, sif, first, freq
     )
+
+
+def _extract_keywords_batch(overviews: list, n_grams: int, top: int) -> list:
+    kw_extractor = _keyword_extractor(n_grams, top)
+    return [kw_extractor.extract_keywords(overview) for overview in overviews]
+
+
+def _keyword_store() -> caching.ResultCache:
+    return keyword_cache or caching.default_cache()
+
+
+def clear_keyword_cache():
+    """Delete the cached keywords of `extract_keywords`."""
+    _keyword_store().clear(_keyword_namespace)
+
+
+def extract_keywords(
+    overviews: list, n_grams: int = 2, top: int = 10, n_jobs: int = -1, batch_size=64
+) -> list:
+    """
+    YAKE keywords of every text, as lists of (keyword, score) pairs.
+
+    The texts are processed in batches in `n_jobs` worker processes. Results are
+    cached on disk, one entry per hash of the text and `n_grams` (see
+    `keyword_cache`), so that concurrent runs add to the cache without overwriting
+    each other: YAKE's top-k keywords are a prefix of its top-(k+1) keywords, so a
+    cached result also serves smaller `top`.
+    """
+    store = _keyword_store()
+    keys = [
+        hashlib.sha1(f"{n_grams}\0{overview}".encode()).hexdigest()
+        for overview in overviews
+    ]
+    cache = {}
+    for key in dict.fromkeys(keys):
+        entry = store.get(_keyword_namespace, key, float("inf"), keyword_cache_stats)
+        if entry is not None:
+            cache[key] = entry[1]
+
+    def cached(key):
+        # a cached result with fewer keywords than requested is all there is
+        if key not in cache:
+            return False
+        cached_top, keywords = cache[key]
+        return cached_top >= top or len(keywords) < cached_top
+
+    missing = [key for key in dict.fromkeys(keys) if not cached(key)]
+    if missing:
+        texts = dict(zip(keys, overviews))
+        batches = [
+            missing[i : i + batch_size] for i in range(0, len(missing), batch_size)
+        ]
+        results = Parallel(n_jobs=n_jobs)(
+            delayed(_extract_keywords_batch)([texts[k] for k in batch], n_grams, top)
+            for batch in tqdm(batches, desc="Extracting keywords", leave=False)
+        )
+        for batch, batch_keywords in zip(batches, results):
+            for key, keywords in zip(batch, batch_keywords):
+                cache[key] = (top, keywords)
+                store.put(_keyword_namespace, key, cache[key], keyword_cache_stats)
+    return [cache[key][1][:top] for key in keys]
+
+
+@caching.cached(stale_after=timedelta(days=1))
+@instrumentation.instrumented(items=lambda df, *args, **kwargs: len(df))
+def build_movies_and_keywords_graph(
+    df: pd.DataFrame,
+    n_grams: int = 2,
+    top: int = 10,
+    n_jobs: int = -1,
+) -> nx.Graph:
+    # rows without an overview are skipped
+    df = df.loc[[bool(overview) for overview in df["overview"]], ["title", "overview"]]
+    overviews = [str(overview).lower() for overview in df["overview"]]
+    with instrumentation.span(
+        "build_movies_and_keywords_graph/extract_keywords", items=len(overviews)
+    ):
+        keywords = extract_keywords(overviews, n_grams=n_grams, top=top, n_jobs=n_jobs)
+
+    # Originally, keywords are (keyword, score) pairs. The lower the score, the more important the keyword
+    # We will convert the scores to weights by taking the log of the inverse of the score
+    n_keywords = [len(k) for k in keywords]
+    df_edges = pd.DataFrame(
+        {
+            "row": np.repeat(np.arange(len(df)), n_keywords),
+            "title": np.repeat(df["title"].to_numpy(), n_keywords),
+            "keyword": [k[0] for row in keywords for k in row],
+            "weight": np.log10(1 / np.array([k[1] for row in keywords for k in row])),
+        }
+    )
+    # now, we will build a graph:
+    # - movies (titles) are MOVIE nodes and keywords are KEYWORD nodes; the `count`
+    #   attribute of a node is the number of times it appears (a movie once per row,
+    #   a keyword once per movie overview it was extracted from)
+    # - the weight of a movie-keyword edge is the sum of the keyword's weights
+    # Nodes and edges are added in the order in which they first appear.
+    df_appearances = pd.concat(
+        [
+            pd.DataFrame(
+                {"row": np.arange(len(df)), "order": -1, "node": df["title"].to_numpy()}
+            ).assign(type="MOVIE"),
+            pd.DataFrame(
+                {
+                    "row": df_edges["row"],
+                    "order": df_edges.groupby("row").cumcount(),
+                    "node": df_edges["keyword"],
+                }
+            ).assign(type="KEYWORD"),
+        ]
+    ).sort_values(["row", "order"], kind="stable")
+    df_nodes = df_appearances.groupby("node", sort=False).agg(
+        type=("type", "first"), count=("row", "size")
+    )
+    df_edge_weights = df_edges.groupby(["title", "keyword"], sort=False)["weight"].sum()
+
     g_movies_and_keywords = nx.Graph()
-    for _, row in tqdm(
-        df.iterrows(), total=len(df), desc="Building graph", leave=False
+    with instrumentation.span(
+        "build_movies_and_keywords_graph/add_to_graph", items=len(df_edge_weights)
     ):
-        movie_title = row["title"]
-        overview = row["overview"]
-        if not overview:
-            continue
-        overview = str(overview).lower()
-        keywords = kw_extractor.extract_keywords(overview)
-        # Originally, keywords are (keyword, score) pairs. The lower the score, the more important the keyword
-        # We will convert the scores to weights by taking the log of the inverse of the score
-        keywords = [(k[0], np.log10(1 / k[1])) for k in keywords]
-        # now, we will build a graph:
-        # if the movie is not in the graph, we add a node with the title as the label and the movie_id as the id
-        # and MOVIE as the type. We will initialize the `count` attribute to 1
-        # if the movie is already in the graph, we increment the `count` attribute
-        # for each keyword:
-        # - if the keyword is not in the graph, we add a node with the keyword as the label and the keyword as the id
-        # and KEYWORD as the type. We will initialize the `count` attribute to 1
-        # - if the keyword is already in the graph, we increment the `count` attribute
-        # - if the edge between the movie and the keyword exists, we increment the weight of the edge
-        # - if the edge does not exist, we add the edge with the weight
-        if movie_title not in g_movies_and_keywords:
-            g_movies_and_keywords.add_node(
-                movie_title, label=movie_title, type="MOVIE", count=1
+        g_movies_and_keywords.add_nodes_from(
+            (node, {"label": node, "type": node_type, "count": count})
+            for node, node_type, count in zip(
+                df_nodes.index, df_nodes["type"], df_nodes["count"].tolist()
             )
-        else:
-            g_movies_and_keywords.nodes[movie_title]["count"] += 1
-        for keyword, weight in keywords:
-            if keyword not in g_movies_and_keywords:
-                g_movies_and_keywords.add_node(
-                    keyword, label=keyword, type="KEYWORD", count=1
-                )
-            else:
-                g_movies_and_keywords.nodes[keyword]["count"] += 1
-            if g_movies_and_keywords.has_edge(movie_title, keyword):
-                g_movies_and_keywords.edges[movie_title, keyword]["weight"] += weight
-            else:
-                g_movies_and_keywords.add_edge(movie_title, keyword, weight=weight)
+        )
+        g_movies_and_keywords.add_edges_from(
+            (title, keyword, {"weight": weight})
+            for (title, keyword), weight in zip(
+                df_edge_weights.index, df_edge_weights.tolist()
+            )
+        )
     return g_movies_and_keywords
 
 
+credits_cache_dir = os.environ.get(
+    "MLCW_CREDITS_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "MLConnectedWorld", "credits"),
+)
+
+CREW_JOBS = ["Director", "Producer", "Writer", "Screenplay"]
+
+
+def _explode_json_column(df_credits: pd.DataFrame, column: str, fields: list):
+    # one json.loads call for the whole column instead of one per row
+    entries = json.loads("[" + ",".join(df_credits[column]) + "]")
+    lengths = [len(e) for e in entries]
+    ret = pd.DataFrame.from_records(
+        [c for e in entries for c in e], columns=fields, nrows=sum(lengths)
+    )
+    ret.insert(0, "movie", np.repeat(np.arange(len(df_credits)), lengths))
+    ret.insert(1, "title", np.repeat(df_credits["title"].to_numpy(), lengths))
+    return ret
+
+
+def parse_credits(df_credits: pd.DataFrame) -> pd.DataFrame:
+    """
+    Flat table of the cast and crew of every movie, in the order of `df_credits`
+    (a movie's cast, then its crew): title, name, role ("cast" or "crew"), the cast
+    `order` (-1 for crew members) and the crew `job` (None for cast members).
+
+    The table is cached as Parquet, keyed by a hash of the credits' contents.
+    """
+    columns = ["title", "cast", "crew"]
+    key = hashlib.sha1(
+        pd.util.hash_pandas_object(df_credits[columns], index=False).to_numpy()
+    ).hexdigest()
+    fn = os.path.join(credits_cache_dir, f"credits-{key}.parquet")
+    if os.path.exists(fn):
+        return pd.read_parquet(fn)
+
+    cast = _explode_json_column(df_credits, "cast", ["name", "order"])
+    crew = _explode_json_column(df_credits, "crew", ["name", "job"])
+    ret = (
+        pd.concat(
+            [
+                cast.assign(role="cast", job=None),
+                crew.assign(role="crew", order=-1),
+            ],
+            ignore_index=True,
+        )
+        .sort_values("movie", kind="stable")
+        .reset_index(drop=True)
+    )
+    ret = ret[["title", "name", "role", "order", "job"]]
+    os.makedirs(credits_cache_dir, exist_ok=True)
+    ret.to_parquet(fn + ".tmp", engine="pyarrow")
+    os.replace(fn + ".tmp", fn)
+    return ret
+
+
+@instrumentation.instrumented(
+    items=lambda g, df_credits, *args, **kwargs: len(df_credits)
+)
 def get_graph_with_credit_info(
     g_movies_and_keywords: nx.Graph,
     df_credits: pd.DataFrame,
     top_n_cast: int = 20,
 ) -> nx.MultiGraph:
-
-    credit_edges = []
-    # Process credits to extract relevant information
-    for _, row in tqdm(
-        df_credits.iterrows(), total=len(df_credits), desc="Processing credits"
+    with instrumentation.span(
+        "get_graph_with_credit_info/parse_credits", items=len(df_credits)
     ):
-        cast = json.loads(row.cast)
-        for c in cast:
-            if c["order"] > top_n_cast:
-                continue
-            credit_edges.append(
-                {
-                    "MOVIE": row["title"],
-                    "PERSON": c["name"],
-                    "type": "PARTICIPATED_IN",
-                }
-            )
-        crew = json.loads(row.crew)
-        for c in crew:
-            job = c["job"]
-            if job not in ["Director", "Producer", "Writer", "Screenplay"]:
-                continue
-            credit_edges.append(
-                {"MOVIE": row["title"], "PERSON": c["name"], "type": "WORKED_ON"}
-            )
-
-    df_credit_edges = pd.DataFrame(credit_edges)
+        df_credits_flat = parse_credits(df_credits)
+    # the top cast members (PARTICIPATED_IN) and the main creative crew (WORKED_ON)
+    is_cast = (df_credits_flat["role"] == "cast") & (
+        df_credits_flat["order"] <= top_n_cast
+    )
+    is_crew = (df_credits_flat["role"] == "crew") & df_credits_flat["job"].isin(
+        CREW_JOBS
+    )
+    df_credit_edges = pd.DataFrame(
+        {
+            "MOVIE": df_credits_flat["title"],
+            "PERSON": df_credits_flat["name"],
+            "type": np.where(is_cast, "PARTICIPATED_IN", "WORKED_ON"),
+        }
+    )[is_cast | is_crew]
+    # an edge is added once per movie, person and type (in either direction); the
+    # names are compared by integer codes, since they need not be strings (a
+    # malformed credit has a missing name)
+    codes, _ = pd.factorize(
+        pd.concat([df_credit_edges["MOVIE"], df_credit_edges["PERSON"]]),
+        use_na_sentinel=False,
+    )
+    movie, person = codes[: len(df_credit_edges)], codes[len(df_credit_edges) :]
+    df_credit_edges = df_credit_edges[
+        ~pd.DataFrame(
+            {
+                "first": np.minimum(movie, person),
+                "second": np.maximum(movie, person),
+                "type": df_credit_edges["type"].to_numpy(),
+            }
+        )
+        .duplicated()
+        .to_numpy()
+    ]
 
     g_multi = nx.MultiGraph()
 
-    # Preserve node attributes including type
-    for node, data in g_movies_and_keywords.nodes(data=True):
-        g_multi.add_node(node, **data)
-
-    for u, v, data in g_movies_and_keywords.edges(data=True):
-        g_multi.add_edge(u, v, key="HAS_KEYWORD", **data)
-
-    # Add the edges to the graph, and add nodes if they don't exist
-    for _, row in tqdm(
-        df_credit_edges.iterrows(), total=len(df_credit_edges), desc="Adding edges"
+    with instrumentation.span(
+        "get_graph_with_credit_info/copy_keyword_graph",
+        items=g_movies_and_keywords.number_of_edges(),
     ):
-        movie = row["MOVIE"]
-        person = row["PERSON"]
-        edge_type = row["type"]
+        # Preserve node attributes including type
+        g_multi.add_nodes_from(g_movies_and_keywords.nodes(data=True))
+        g_multi.add_edges_from(
+            (u, v, "HAS_KEYWORD", data)
+            for u, v, data in g_movies_and_keywords.edges(data=True)
+        )
 
-        if movie not in g_multi.nodes:
-            g_multi.add_node(movie, type="MOVIE")
-        if person not in g_multi.nodes:
-            g_multi.add_node(person, type="PERSON")
+    # Add the nodes that are not in the graph yet, in the order they first appear
+    movies = df_credit_edges["MOVIE"].tolist()
+    persons = df_credit_edges["PERSON"].tolist()
+    new_nodes = {}
+    for movie, person in zip(movies, persons):
+        if movie not in new_nodes:
+            new_nodes[movie] = "MOVIE"
+        if person not in new_nodes:
+            new_nodes[person] = "PERSON"
+    g_multi.add_nodes_from(
+        (node, {"type": node_type})
+        for node, node_type in new_nodes.items()
+        if node not in g_multi
+    )
+    with instrumentation.span(
+        "get_graph_with_credit_info/add_credit_edges", items=len(movies)
+    ):
+        # (u, v, key, data): a 3-tuple would be read as (u, v, data)
+        g_multi.add_edges_from(
+            (movie, person, edge_type, {})
+            for movie, person, edge_type in zip(
+                movies, persons, df_credit_edges["type"].tolist()
+            )
+        )
+    return g_multi
 
-        # Check if the edge already exists with the same type before adding
-        if not g_multi.has_edge(movie, person, key=edge_type):
-            g_multi.add_edge(movie, person, key=edge_type)
 
-    return g_multi
+def _filtered(selection: graph_views.GraphFilter, copy: bool) -> nx.Graph:
+    return selection.materialize() if copy else selection.view()
 
 
-def remove_isolated_nodes(graph: nx.Graph):
-    nodes_to_remove = [n for n in graph.nodes if graph.degree(n) == 0]
-    ret = graph.copy()
-    ret.remove_nodes_from(nodes_to_remove)
-    return ret
+def remove_isolated_nodes(graph: nx.Graph, copy: bool = True):
+    """
+    The graph without its isolated nodes: a copy, or with `copy=False` a read-only
+    view that shares the data of `graph`.
+    """
+    return _filtered(graph_views.as_filter(graph).remove_isolated_nodes(), copy)
 
 
-def get_largest_connected_component_graph(graph: nx.Graph) -> nx.Graph:
-    largest_connected_component = max(nx.connected_components(graph), key=len)
-    return graph.subgraph(largest_connected_component).copy()
+def get_largest_connected_component_graph(
+    graph: nx.Graph, copy: bool = True
+) -> nx.Graph:
+    """
+    The largest connected component: a copy, or with `copy=False` a read-only view
+    that shares the data of `graph`.
+    """
+    return _filtered(graph_views.as_filter(graph).largest_connected_component(), copy)
 
 
 def cleanup_nodes_by_percentile(
@@ -148,14 +335,17 @@ def cleanup_nodes_by_percentile(
     node_attr: str = "count",
     percentile: float = 1.0,
     node_type: str = None,
+    copy: bool = True,
 ):
-    if node_type:
-        nodes = [n for n, d in graph.nodes(data=True) if d["type"] == node_type]
-    else:
-        nodes = list(graph.nodes)
-    counts = np.array([graph.nodes[n][node_attr] for n in nodes])
-    threshold = np.percentile(counts, 100 - percentile)
-    nodes_to_remove = [n for n in nodes if graph.nodes[n][node_attr] < threshold]
-    ret = graph.copy()
-    ret.remove_nodes_from(nodes_to_remove)
-    return ret
+    """
+    The graph without the nodes (of `node_type`, if given) whose `node_attr` is below
+    the `100 - percentile` percentile: a copy, or with `copy=False` a read-only view
+    that shares the data of `graph`.
+
+    To chain several cleanup steps with a single copy at the end, use
+    `graph_views.GraphFilter` directly.
+    """
+    selection = graph_views.as_filter(graph).keep_top_percentile(
+        node_attr, percentile, node_type
+    )
+    return _filtered(selection, copy)
@@ -0,0 +1,77 @@
+"""
+Cost of a cache hit with a large DataFrame argument: cachier versus `caching`.
+
+A cached function takes a DataFrame of `--rows` rows (integer, float and string
+columns) and returns a small result. Timed per call, after the first (cold) call:
+cachier, which pickles and hashes the whole argument and reads its pickle store;
+`caching` from its memory tier and from its disk tier; and the fingerprint alone.
+
+Usage:
+    python benchmarks/bench_caching.py [--rows 1000000] [--repeat 5]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from cachier import cachier
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import caching
+
+
+def summarize(df):
+    return df.describe()
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    df = pd.DataFrame(
+        {
+            "id": np.arange(args.rows),
+            "value": rng.random(args.rows),
+            "label": rng.choice(["alpha", "beta", "gamma", "delta"], args.rows),
+        }
+    )
+    print(f"== DataFrame {df.shape}, {df.memory_usage(deep=True).sum() / 2**20:.0f} MB")
+
+    with tempfile.TemporaryDirectory() as directory:
+        old = cachier(stale_after=timedelta(days=1), cache_dir=directory)(summarize)
+        old(df)
+        seconds = timed(lambda: old(df), args.repeat)
+        print(f"{'cachier hit':<28s} {seconds * 1000:8.1f} ms")
+
+        cache = caching.ResultCache(directory, max_bytes=1 << 30)
+        new = caching.cached(stale_after=timedelta(days=1), cache=cache)(summarize)
+        new(df)
+        seconds = timed(lambda: new(df), args.repeat)
+        print(f"{'caching memory hit':<28s} {seconds * 1000:8.1f} ms")
+        cache.memory_bytes = 0
+        cache._memory.clear()
+        seconds = timed(lambda: new(df), args.repeat)
+        print(f"{'caching disk hit':<28s} {seconds * 1000:8.1f} ms")
+        seconds = timed(lambda: caching.fingerprint(df), args.repeat)
+        print(f"{'caching.fingerprint':<28s} {seconds * 1000:8.1f} ms")
+        print(caching.cache_stats().to_string())
+
+
+if __name__ == "__main__":
+    main()
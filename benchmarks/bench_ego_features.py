@@ -0,0 +1,101 @@
+"""
+Throughput of `compute_ego_graph_features` versus the number of worker processes.
+
+Compares the original transport, where joblib ships the networkx graph with every
+per-node task, with the shared-memory CSR transport that exports the graph once and
+processes the nodes in chunks, and with the vectorised engine of `ego_features.py`.
+All results are checked against the sequential networkx implementation.
+
+Usage:
+    python benchmarks/bench_ego_features.py [--dataset ca-HepPh] [--workers 1 2 4 8]
+    python benchmarks/bench_ego_features.py --synthetic 12000  # offline
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "MLConnectedWorldBook"
+    )
+)
+import data_utils
+import generate_node_based_dataset as gen
+
+
+def per_node_transport(g, nodes, n_jobs):
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(gen.compute_ego_graph_features_node)(g, n) for n in nodes
+    )
+    return pd.DataFrame(results).set_index("node_id")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dataset", default="ca-HepPh")
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=None,
+        help="Use a clustered power-law graph with this many nodes instead",
+    )
+    parser.add_argument("--n-nodes", type=int, default=3000, help="Nodes to process")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        g = nx.powerlaw_cluster_graph(args.synthetic, 10, 0.5, seed=args.seed)
+        name = f"powerlaw_cluster({args.synthetic:,})"
+    else:
+        g = data_utils.get_graph(args.dataset)
+        name = args.dataset
+    print(f"== {name}: {g.number_of_nodes():,} nodes, {g.number_of_edges():,} edges")
+    rng = np.random.default_rng(args.seed)
+    nodes = list(g.nodes)
+    nodes = [nodes[i] for i in rng.choice(len(nodes), args.n_nodes, replace=False)]
+
+    start = time.perf_counter()
+    reference = gen.compute_ego_graph_features(g, nodes, method="networkx")
+    elapsed = time.perf_counter() - start
+    print(f"{'sequential':<12s} {1:>3d} workers {len(nodes) / elapsed:>9.0f} nodes/s")
+
+    start = time.perf_counter()
+    df = gen.compute_ego_graph_features(g, nodes)
+    elapsed = time.perf_counter() - start
+    pd.testing.assert_frame_equal(df, reference, rtol=1e-12, check_index_type=False)
+    print(f"{'vectorised':<12s} {1:>3d} workers {len(nodes) / elapsed:>9.0f} nodes/s")
+
+    for n_jobs in args.workers:
+        for transport in ["per-node", "shared CSR"]:
+            start = time.perf_counter()
+            if transport == "per-node":
+                df = per_node_transport(g, nodes, n_jobs)
+            else:
+                df = gen.compute_ego_graph_features(
+                    g,
+                    nodes,
+                    method="networkx",
+                    n_jobs=n_jobs,
+                    chunk_size=args.chunk_size,
+                )
+            elapsed = time.perf_counter() - start
+            # equal up to the summation order of floating point sums
+            pd.testing.assert_frame_equal(df, reference, rtol=1e-12)
+            print(
+                f"{transport:<12s} {n_jobs:>3d} workers "
+                f"{len(nodes) / elapsed:>9.0f} nodes/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
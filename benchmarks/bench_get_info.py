@@ -0,0 +1,73 @@
+"""
+Compare the networkx and CSR backends of `data_utils.get_info` on the SNAP
+collaboration graphs.
+
+The SNAP ca-* graphs are not connected, so the benchmark runs on the largest
+connected component of each graph (otherwise no path lengths are computed).
+The networkx backend is skipped for path lengths on components larger than
+`--max-networkx-nodes` nodes, because all-pairs BFS in pure Python takes tens of
+minutes there.
+
+Usage:
+    python benchmarks/bench_get_info.py [--datasets ca-GrQc ca-HepTh ...]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import data_utils
+
+
+def time_call(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--datasets",
+        nargs="+",
+        default=["ca-GrQc", "ca-HepTh", "ca-HepPh", "ca-CondMat", "ca-AstroPh"],
+    )
+    parser.add_argument("--max-networkx-nodes", type=int, default=10_000)
+    parser.add_argument("--n-path-sources", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for dataset in args.datasets:
+        G = data_utils.get_connected_component_subgraphs(data_utils.get_graph(dataset))[
+            0
+        ]
+        G.name = f"{dataset} (largest component)"
+        print(
+            f"== {G.name}: {G.number_of_nodes():,} nodes, {G.number_of_edges():,} edges"
+        )
+
+        info_csr, t_csr = time_call(data_utils.get_info, G, backend="csr")
+        print(f"csr exact:    {t_csr:8.2f}s")
+        info_sampled, t_sampled = time_call(
+            data_utils.get_info,
+            G,
+            backend="csr",
+            n_path_sources=args.n_path_sources,
+            seed=args.seed,
+        )
+        print(f"csr sampled:  {t_sampled:8.2f}s  {info_sampled.splitlines()[-1]}")
+        if G.number_of_nodes() <= args.max_networkx_nodes:
+            info_nx, t_nx = time_call(data_utils.get_info, G)
+            print(f"networkx:     {t_nx:8.2f}s  speedup x{t_nx / t_csr:.1f}")
+            if info_nx != info_csr:
+                print("WARNING: reports differ")
+                print(info_nx)
+        else:
+            print("networkx:     skipped (component too large)")
+        print(info_csr)
+
+
+if __name__ == "__main__":
+    main()
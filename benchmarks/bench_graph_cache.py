@@ -0,0 +1,132 @@
+"""
+Compare graph load time and memory of the binary CSR cache with the previous
+pickle-based (cachier) path.
+
+Every loader runs in a fresh Python process, which reports its wall time and the
+growth of its peak resident set size (RSS) while loading. The source is either a
+SNAP dataset (`--dataset`, requires network access on first use) or a seeded
+synthetic graph (`--synthetic-nodes`).
+
+Usage:
+    python benchmarks/bench_graph_cache.py --dataset ca-AstroPh.txt.gz
+    python benchmarks/bench_graph_cache.py --synthetic-nodes 200000
+"""
+
+import argparse
+import gzip
+import json
+import os
+import pickle
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+dir_project = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(dir_project)
+
+LOADERS = ["edgelist", "pickle", "mmap", "mmap+networkx"]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss survives exec() and would report the peak of the parent process,
+    # so prefer the per-process high-water mark of Linux
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 2**10
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+
+
+def run_loader(loader: str, fn_edgelist: str, fn_pickle: str, dir_cache: str):
+    import networkx as nx
+    import csr_graph
+
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    if loader == "edgelist":
+        G = nx.read_edgelist(fn_edgelist, nodetype=int)
+    elif loader == "pickle":
+        with open(fn_pickle, "rb") as f:
+            G = pickle.load(f)
+    elif loader == "mmap":
+        G, _ = csr_graph.load(dir_cache)
+    elif loader == "mmap+networkx":
+        G = csr_graph.load(dir_cache)[0].to_networkx()
+    elapsed = time.perf_counter() - start
+    return {"loader": loader, "seconds": elapsed, "rss_mb": peak_rss_mb() - rss_before}
+
+
+def write_synthetic_edgelist(fn: str, n_nodes: int, seed: int):
+    import networkx as nx
+
+    G = nx.barabasi_albert_graph(n_nodes, 5, seed=seed)
+    with gzip.open(fn, "wt") as f:
+        for u, v in G.edges():
+            f.write(f"{u}\t{v}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--dataset", default=None)
+    source.add_argument("--synthetic-nodes", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--worker", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_loader(*args.worker)))
+        return
+
+    import data_utils
+    import csr_graph
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        if args.dataset:
+            data_utils.load_graph_from_web(args.dataset, lazy=True)
+            fn_edgelist = os.path.join(
+                data_utils.dir_graph_cache, "web", args.dataset, args.dataset
+            )
+        else:
+            fn_edgelist = os.path.join(tmpdirname, "graph.txt.gz")
+            write_synthetic_edgelist(fn_edgelist, args.synthetic_nodes, args.seed)
+        graph = data_utils._read_snap_edgelist(fn_edgelist)
+        dir_cache = os.path.join(tmpdirname, "csr")
+        csr_graph.save(graph, dir_cache)
+        fn_pickle = os.path.join(tmpdirname, "graph.pkl")
+        with open(fn_pickle, "wb") as f:
+            pickle.dump(graph.to_networkx(), f)
+        print(
+            f"{graph.number_of_nodes:,} nodes, {graph.number_of_edges:,} edges; "
+            f"pickle {os.path.getsize(fn_pickle) / 2**20:.1f} MB"
+        )
+
+        for loader in LOADERS:
+            output = subprocess.run(
+                [
+                    sys.executable,
+                    __file__,
+                    "--worker",
+                    loader,
+                    fn_edgelist,
+                    fn_pickle,
+                    dir_cache,
+                ],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            result = json.loads(output)
+            print(
+                f"{result['loader']:>15s}: {result['seconds']:8.3f}s  "
+                f"peak RSS +{result['rss_mb']:8.1f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Peak memory and runtime of a cleanup chain, with copies versus lazy views.
+
+The chain is the one applied to the TMDB multigraph: drop the rare keywords, drop the
+nodes that became isolated and keep the largest connected component. It runs with
+the copy at every step of the original functions, with `copy=False` views between the
+steps and one copy at the end, and as a `graph_views.GraphFilter` that is either
+materialised once or only viewed. The graph is a synthetic movie-keyword-person
+multigraph of about the size of the TMDB one.
+
+Memory is the peak of the Python allocations during the chain (tracemalloc), above
+what was allocated before it, measured in a second, untimed run.
+
+Usage:
+    python benchmarks/bench_graph_views.py [--n-movies 4800] [--percentile 50]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import networkx as nx
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import graph_views
+from MLConnectedWorldBook.src import tmdb_graph
+
+
+def synthetic_tmdb_graph(n_movies: int, seed: int) -> nx.MultiGraph:
+    rng = np.random.default_rng(seed)
+    n_keywords, n_persons = 4 * n_movies, 10 * n_movies
+    g = nx.MultiGraph()
+    # keyword and person popularity are heavy-tailed
+    keyword = rng.zipf(1.5, size=(n_movies, 10)) % n_keywords
+    person = rng.zipf(1.3, size=(n_movies, 25)) % n_persons
+    counts = np.bincount(keyword.ravel(), minlength=n_keywords)
+    g.add_nodes_from((f"movie {i}", {"type": "MOVIE"}) for i in range(n_movies))
+    g.add_nodes_from(
+        (f"keyword {k}", {"type": "KEYWORD", "count": int(c)})
+        for k, c in enumerate(counts)
+    )
+    for i in range(n_movies):
+        for k in keyword[i]:
+            g.add_edge(f"movie {i}", f"keyword {k}", key="HAS_KEYWORD", weight=1.0)
+        for p in person[i]:
+            g.add_edge(f"movie {i}", f"person {p}", key="PARTICIPATED_IN")
+    for node, data in g.nodes(data=True):
+        data.setdefault("type", "PERSON")
+    return g
+
+
+def copies(g, percentile):
+    g = tmdb_graph.cleanup_nodes_by_percentile(
+        g, percentile=percentile, node_type="KEYWORD"
+    )
+    g = tmdb_graph.remove_isolated_nodes(g)
+    return tmdb_graph.get_largest_connected_component_graph(g)
+
+
+def views_then_copy(g, percentile):
+    g = tmdb_graph.cleanup_nodes_by_percentile(
+        g, percentile=percentile, node_type="KEYWORD", copy=False
+    )
+    g = tmdb_graph.remove_isolated_nodes(g, copy=False)
+    return tmdb_graph.get_largest_connected_component_graph(g)
+
+
+def graph_filter(g, percentile):
+    return (
+        graph_views.GraphFilter(g)
+        .keep_top_percentile("count", percentile, node_type="KEYWORD")
+        .remove_isolated_nodes()
+        .largest_connected_component()
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--n-movies", type=int, default=4800)
+    parser.add_argument("--percentile", type=float, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    g = synthetic_tmdb_graph(args.n_movies, args.seed)
+    print(f"== {g.number_of_nodes():,} nodes, {g.number_of_edges():,} edges")
+    chains = {
+        "copy at every step": lambda: copies(g, args.percentile),
+        "views, one copy": lambda: views_then_copy(g, args.percentile),
+        "GraphFilter, materialised": lambda: graph_filter(
+            g, args.percentile
+        ).materialize(),
+        "GraphFilter, view only": lambda: graph_filter(g, args.percentile).view(),
+    }
+    reference = None
+    for label, chain in chains.items():
+        start = time.perf_counter()
+        result = chain()
+        elapsed = time.perf_counter() - start
+        del result
+        # a second run for the memory, since tracing slows the chain down
+        tracemalloc.start()
+        result = chain()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if reference is None:
+            reference = result
+        assert set(result) == set(reference)
+        assert result.number_of_edges() == reference.number_of_edges()
+        print(f"{label:<28s} {elapsed:7.2f}s {peak / 2**20:9.1f} MB peak")
+        del result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Startup time of `import graph_utils` and of the first triad census plot.
+
+Every measurement runs in a fresh interpreter, so that module imports and the
+in-process image caches start empty. The first plot is timed with a cold and with a
+warm on-disk triad atlas.
+
+Usage:
+    python benchmarks/bench_import.py [--repeat 5]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+project_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+IMPORT = """
+import time
+start = time.perf_counter()
+import graph_utils
+print(time.perf_counter() - start)
+"""
+
+FIRST_PLOT = """
+import time
+import matplotlib
+matplotlib.use("Agg")
+import networkx as nx
+import graph_utils
+g = nx.gnp_random_graph(60, 0.05, directed=True, seed=1)
+start = time.perf_counter()
+graph_utils.plot_triad_census(g)
+print(time.perf_counter() - start)
+"""
+
+
+def run(code: str, env: dict) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=project_dir,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, MLCW_TRIAD_CACHE=cache_dir, MPLBACKEND="Agg")
+        times = [run(IMPORT, env) for _ in range(args.repeat)]
+        print(f"import graph_utils:          {np.median(times):6.3f}s (median)")
+        cold = run(FIRST_PLOT, env)
+        print(f"first plot, cold atlas:      {cold:6.3f}s")
+        times = [run(FIRST_PLOT, env) for _ in range(args.repeat)]
+        print(f"first plot, warm atlas:      {np.median(times):6.3f}s (median)")
+
+
+if __name__ == "__main__":
+    main()
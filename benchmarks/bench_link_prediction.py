@@ -0,0 +1,99 @@
+"""
+Runtime of link-prediction scoring: the chapter's per-pair loop versus
+`link_prediction.link_prediction_scores`.
+
+The per-pair loop (networkx generators, one pair at a time, as in the link-prediction
+chapter) runs on a sample of the candidate pairs and is extrapolated to all of them.
+The candidates are all the pairs at distance 2 of a SNAP collaboration graph (or,
+offline, of a synthetic graph of about the same size).
+
+Usage:
+    python benchmarks/bench_link_prediction.py [--dataset ca-HepPh]
+    python benchmarks/bench_link_prediction.py --synthetic 12000  # offline
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import networkx as nx
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import data_utils
+import link_prediction
+
+
+def chapter_loop(g, pairs):
+    rows = []
+    for u, v in pairs:
+        rows.append(
+            (
+                len(list(nx.common_neighbors(g, u, v))),
+                list(nx.jaccard_coefficient(g, [(u, v)]))[0][-1],
+                list(nx.adamic_adar_index(g, [(u, v)]))[0][-1],
+                list(nx.resource_allocation_index(g, [(u, v)]))[0][-1],
+                list(nx.preferential_attachment(g, [(u, v)]))[0][-1],
+            )
+        )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dataset", default="ca-HepPh")
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=None,
+        help="Use a clustered power-law graph with this many nodes instead",
+    )
+    parser.add_argument("--n-loop-pairs", type=int, default=20000)
+    parser.add_argument("--max-entries", type=int, default=1 << 22)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        g = nx.powerlaw_cluster_graph(args.synthetic, 10, 0.5, seed=args.seed)
+        name = f"powerlaw_cluster({args.synthetic:,})"
+    else:
+        g, name = data_utils.get_graph(args.dataset), args.dataset
+    print(f"== {name}: {g.number_of_nodes():,} nodes, {g.number_of_edges():,} edges")
+
+    start = time.perf_counter()
+    pairs = link_prediction.distance_two_pairs(g, max_entries=args.max_entries)
+    print(f"{len(pairs):,} pairs at distance 2 in {time.perf_counter() - start:.2f}s")
+
+    rng = np.random.default_rng(args.seed)
+    sample = pairs[rng.choice(len(pairs), min(args.n_loop_pairs, len(pairs)), False)]
+    start = time.perf_counter()
+    chapter_loop(g, sample.tolist())
+    loop = (time.perf_counter() - start) * len(pairs) / len(sample)
+    print(f"{'per-pair loop (extrapolated)':<32s} {loop:8.1f}s")
+
+    for label, kwargs in [
+        ("scores of given pairs", dict(pairs=pairs)),
+        ("scores of all 2-hop pairs", {}),
+    ]:
+        start = time.perf_counter()
+        df = link_prediction.link_prediction_scores(
+            g, max_entries=args.max_entries, **kwargs
+        )
+        elapsed = time.perf_counter() - start
+        del df
+        tracemalloc.start()
+        df = link_prediction.link_prediction_scores(
+            g, max_entries=args.max_entries, **kwargs
+        )
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(
+            f"{label:<32s} {elapsed:8.1f}s {peak / 2**20:8.1f} MB peak "
+            f"({len(df) / elapsed:,.0f} pairs/s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
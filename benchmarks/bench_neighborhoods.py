@@ -0,0 +1,87 @@
+"""
+Runtime of the multi-hop neighbourhood sizes: per-node BFS versus `neighborhoods`.
+
+The per-node loop (`nx.single_source_shortest_path_length` with cutoffs 2 and 4, as
+in `compute_node_features` before) runs on a sample of the nodes and is extrapolated
+to all of them. `neighborhoods.neighborhood_sizes` is timed in the exact and the
+HyperANF modes, with the peak memory and the error of the estimates. The graph is the
+SNAP ca-HepPh collaboration graph (or, offline, a synthetic graph of about the same
+size).
+
+Usage:
+    python benchmarks/bench_neighborhoods.py [--dataset ca-HepPh] [--n-jobs 1 4]
+    python benchmarks/bench_neighborhoods.py --synthetic 12000  # offline
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import networkx as nx
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import csr_graph
+import data_utils
+import neighborhoods
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dataset", default="ca-HepPh")
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=None,
+        help="Use a clustered power-law graph with this many nodes instead",
+    )
+    parser.add_argument("--n-loop-nodes", type=int, default=300)
+    parser.add_argument("--n-jobs", type=int, nargs="+", default=[1])
+    parser.add_argument("--precision", type=int, nargs="+", default=[6, 8, 10])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        g = nx.powerlaw_cluster_graph(args.synthetic, 10, 0.5, seed=args.seed)
+        name = f"powerlaw_cluster({args.synthetic:,})"
+    else:
+        g, name = data_utils.get_graph(args.dataset), args.dataset
+    print(f"== {name}: {g.number_of_nodes():,} nodes, {g.number_of_edges():,} edges")
+
+    rng = np.random.default_rng(args.seed)
+    nodes = list(g)
+    sample = [nodes[i] for i in rng.choice(len(nodes), args.n_loop_nodes, False)]
+    start = time.perf_counter()
+    for node in sample:
+        len(set(nx.single_source_shortest_path_length(g, node, cutoff=2)))
+        len(set(nx.single_source_shortest_path_length(g, node, cutoff=4)))
+    loop = (time.perf_counter() - start) * len(nodes) / len(sample)
+    print(f"{'per-node BFS (extrapolated)':<28s} {loop:8.1f}s")
+
+    graph = csr_graph.from_networkx(g)
+    runs = [(f"exact n_jobs={n_jobs}", dict(n_jobs=n_jobs)) for n_jobs in args.n_jobs]
+    runs += [
+        (f"hyperanf precision={b}", dict(mode="hyperanf", precision=b))
+        for b in args.precision
+    ]
+    exact = None
+    for label, kwargs in runs:
+        tracemalloc.start()
+        start = time.perf_counter()
+        sizes = neighborhoods.neighborhood_sizes(graph, **kwargs)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        line = f"{label:<28s} {elapsed:8.1f}s {peak / 2**20:8.1f} MB peak"
+        if exact is None:
+            exact = sizes
+        else:
+            error = (sizes / exact - 1).abs().mean()
+            line += f"  mean relative error {error['n_depth_4']:.3f} (depth 4)"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Runtime of the random-graph generators of `null_models` against networkx.
+
+Every generator is timed against its networkx counterpart, and G(n, p) and the
+configuration model also against the Markov-graph chapter's `create_erdos_renyi_graph`
+(a coin flip per pair) and `make_ERGM_like_graph` (configuration model, then
+nx.Graph). Then the metrics of an ensemble of configuration-model replicas are timed
+against the same loop with networkx.
+
+Usage:
+    python benchmarks/bench_null_models.py [--n 100000] [--degree 10]
+"""
+
+import argparse
+import itertools
+import os
+import sys
+import time
+
+import networkx as nx
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import null_models
+
+
+def create_erdos_renyi_graph(n, p):
+    # the chapter's generator
+    G = nx.Graph()
+    G.add_nodes_from(range(n))
+    for e in itertools.combinations(range(n), 2):
+        if np.random.rand() < p:
+            G.add_edge(*e)
+    return G
+
+
+def make_ERGM_like_graph(degree_sequence):
+    # the chapter's erased configuration model
+    G = nx.Graph(nx.configuration_model(degree_sequence))
+    G.remove_edges_from(nx.selfloop_edges(G))
+    return G
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def report(name, rows):
+    print(f"{name:<34s}" + "  ".join(f"{label} {t:7.3f}s" for label, t in rows))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--n", type=int, default=100_000, help="Number of nodes")
+    parser.add_argument("--degree", type=int, default=10, help="Average degree")
+    parser.add_argument(
+        "--chapter-n",
+        type=int,
+        default=3000,
+        help="Number of nodes of the chapter's G(n, p), which loops over all pairs",
+    )
+    parser.add_argument("--n-replicas", type=int, default=5)
+    parser.add_argument("--n-jobs", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    n, k, seed = args.n, args.degree, args.seed
+    p = k / (n - 1)
+    np.random.seed(seed)
+
+    print(f"== {n:,} nodes, average degree {k}")
+    chapter_p = k / (args.chapter_n - 1)
+    report(
+        f"G(n, p), n = {args.chapter_n:,}",
+        [
+            ("chapter", timed(create_erdos_renyi_graph, args.chapter_n, chapter_p)),
+            (
+                "null_models",
+                timed(null_models.gnp_random_graph, args.chapter_n, chapter_p),
+            ),
+        ],
+    )
+    report(
+        "G(n, p)",
+        [
+            ("networkx", timed(nx.fast_gnp_random_graph, n, p, seed=seed)),
+            ("null_models", timed(null_models.gnp_random_graph, n, p, seed=seed)),
+        ],
+    )
+
+    degree = np.random.default_rng(seed).zipf(2.5, n)
+    degree = np.minimum(degree * k // 2, n // 10)
+    degree[0] += degree.sum() % 2
+    report(
+        "configuration model",
+        [
+            ("chapter", timed(make_ERGM_like_graph, degree.tolist())),
+            ("null_models", timed(null_models.configuration_model, degree, seed=seed)),
+        ],
+    )
+
+    G = nx.fast_gnp_random_graph(n, p, seed=seed)
+    n_swaps = G.number_of_edges()
+    report(
+        f"edge swaps ({n_swaps:,})",
+        [
+            (
+                "networkx",
+                timed(
+                    nx.double_edge_swap,
+                    G.copy(),
+                    nswap=n_swaps,
+                    max_tries=100 * n_swaps,
+                    seed=seed,
+                ),
+            ),
+            (
+                "null_models",
+                timed(
+                    null_models.degree_preserving_rewire, G, n_swaps=n_swaps, seed=seed
+                ),
+            ),
+        ],
+    )
+    report(
+        "Watts-Strogatz",
+        [
+            ("networkx", timed(nx.watts_strogatz_graph, n, k, 0.1, seed=seed)),
+            (
+                "null_models",
+                timed(null_models.watts_strogatz_graph, n, k, 0.1, seed=seed),
+            ),
+        ],
+    )
+
+    # metrics of an ensemble on a graph small enough for exact path lengths
+    observed = nx.powerlaw_cluster_graph(2000, 4, 0.5, seed=seed)
+    sequence = [d for _, d in observed.degree()]
+
+    def networkx_ensemble():
+        for _ in range(args.n_replicas):
+            R = make_ERGM_like_graph(sequence)
+            nx.average_clustering(R)
+            sum(nx.triangles(R).values())
+            nx.average_shortest_path_length(
+                R.subgraph(max(nx.connected_components(R), key=len))
+            )
+
+    report(
+        f"ensemble of {args.n_replicas} replicas",
+        [
+            ("networkx", timed(networkx_ensemble)),
+            (
+                "null_models",
+                timed(
+                    null_models.null_model_ensemble,
+                    observed,
+                    "configuration",
+                    n_replicas=args.n_replicas,
+                    seed=seed,
+                    n_jobs=args.n_jobs,
+                ),
+            ),
+        ],
+    )
+
+
+if __name__ == "__main__":
+    main()
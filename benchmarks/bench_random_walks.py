@@ -0,0 +1,141 @@
+"""
+Throughput of Node2Vec random walks: the `node2vec` package's approach versus
+`random_walks`.
+
+The `node2vec` package (used in the embeddings chapter) precomputes an alias table
+for every directed edge in Python dicts, then walks one step at a time in Python. Its
+preprocessing is timed on a sample of the edges and extrapolated; its walks are timed
+with a per-step Python loop on a sample of the walks (the tables of every edge do not
+fit in the time budget), also extrapolated. `random_walks` is timed on all the walks,
+in memory and streamed to a file. The graph is the SNAP ca-HepPh collaboration graph
+(or, offline, a synthetic graph of about the same size).
+
+Usage:
+    python benchmarks/bench_random_walks.py [--dataset ca-HepPh] [--n-jobs 1 4]
+    python benchmarks/bench_random_walks.py --synthetic 12000  # offline
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import networkx as nx
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import csr_graph
+import data_utils
+import random_walks
+
+
+def edge_transition_probabilities(G, t, v, p, q):
+    # what the node2vec package stores for every directed edge (t, v)
+    bias = [
+        G[v][x].get("weight", 1) * (1 / p if x == t else 1 if x in G[t] else 1 / q)
+        for x in G[v]
+    ]
+    total = sum(bias)
+    return [b / total for b in bias]
+
+
+def python_walk(G, start, walk_length, p, q):
+    walk = [start]
+    while len(walk) < walk_length:
+        neighbors = list(G[walk[-1]])
+        if not neighbors:
+            break
+        if len(walk) == 1:
+            walk.append(random.choice(neighbors))
+        else:
+            weights = edge_transition_probabilities(G, walk[-2], walk[-1], p, q)
+            walk.append(random.choices(neighbors, weights)[0])
+    return walk
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dataset", default="ca-HepPh")
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=None,
+        help="Use a clustered power-law graph with this many nodes instead",
+    )
+    parser.add_argument("--walk-length", type=int, default=80)
+    parser.add_argument("--num-walks", type=int, default=10)
+    parser.add_argument("--p", type=float, default=0.5)
+    parser.add_argument("--q", type=float, default=2.0)
+    parser.add_argument("--n-jobs", type=int, nargs="+", default=[1])
+    parser.add_argument("--n-sample", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        G = nx.powerlaw_cluster_graph(args.synthetic, 10, 0.5, seed=args.seed)
+        name = f"powerlaw_cluster({args.synthetic:,})"
+    else:
+        G, name = data_utils.get_graph(args.dataset), args.dataset
+    print(f"== {name}: {G.number_of_nodes():,} nodes, {G.number_of_edges():,} edges")
+    n_walks = args.num_walks * G.number_of_nodes()
+    walk_kwargs = dict(
+        walk_length=args.walk_length,
+        num_walks=args.num_walks,
+        p=args.p,
+        q=args.q,
+        seed=args.seed,
+    )
+
+    degree = np.array([d for _, d in G.degree()])
+    print(f"per-edge alias tables: {int((degree**2).sum()):,} entries")
+    rng = random.Random(args.seed)
+    edges = list(G.edges())
+    sample = rng.sample(edges, min(args.n_sample, len(edges)))
+    start = time.perf_counter()
+    for u, v in sample:
+        edge_transition_probabilities(G, u, v, args.p, args.q)
+        edge_transition_probabilities(G, v, u, args.p, args.q)
+    preprocessing = (time.perf_counter() - start) * len(edges) / len(sample)
+    print(f"{'node2vec preprocessing (extrap.)':<34s} {preprocessing:8.1f}s")
+
+    random.seed(args.seed)
+    nodes = list(G)
+    starts = rng.choices(nodes, k=min(args.n_sample, n_walks))
+    start = time.perf_counter()
+    for node in starts:
+        python_walk(G, node, args.walk_length, args.p, args.q)
+    loop = (time.perf_counter() - start) * n_walks / len(starts)
+    print(f"{'per-step Python walks (extrap.)':<34s} {loop:8.1f}s")
+
+    graph = csr_graph.from_networkx(G)
+    for n_jobs in args.n_jobs:
+        start = time.perf_counter()
+        n_steps = 0
+        for batch in random_walks.random_walk_batches(
+            graph, n_jobs=n_jobs, **walk_kwargs
+        ):
+            n_steps += int((batch >= 0).sum())
+        elapsed = time.perf_counter() - start
+        label = f"random_walks n_jobs={n_jobs}"
+        print(
+            f"{label:<34s} {elapsed:8.1f}s ({n_walks / elapsed:,.0f} walks/s, "
+            f"{n_steps / elapsed:,.0f} steps/s)"
+        )
+
+    with tempfile.TemporaryDirectory() as d:
+        start = time.perf_counter()
+        random_walks.write_walks(
+            graph, os.path.join(d, "walks.txt"), n_jobs=args.n_jobs[-1], **walk_kwargs
+        )
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(os.path.join(d, "walks.txt"))
+    print(
+        f"{'write_walks':<34s} {elapsed:8.1f}s ({n_walks / elapsed:,.0f} walks/s, "
+        f"{size / 2**20:,.0f} MB)"
+    )
+
+
+if __name__ == "__main__":
+    main()
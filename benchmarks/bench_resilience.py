@@ -0,0 +1,116 @@
+"""
+Runtime of node-removal attacks with `resilience.simulate_attack`.
+
+On the small Montagna graphs, the simulator is compared with the resilience chapter's
+loop, which removes one node at a time and recomputes the ranking and every metric
+from scratch with networkx. On the SNAP collaboration graphs (or, offline, on a
+synthetic graph of the same size) only the simulator runs, with sampled path metrics.
+
+Usage:
+    python benchmarks/bench_resilience.py [--datasets ca-GrQc ca-HepPh]
+    python benchmarks/bench_resilience.py --synthetic 12000  # offline
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import networkx as nx
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import csr_graph
+import data_utils
+import resilience
+
+MONTAGNA = ["Montagna_meetings_edgelist.csv", "Montagna_phonecalls_edgelist.csv"]
+
+
+def chapter_loop(G, strategy):
+    # one removal at a time, with the chapter's ranking and metrics
+    graph = G.copy()
+    for _ in range(G.number_of_nodes() - 2):
+        if strategy == "degree":
+            scores = nx.degree_centrality(graph)
+        else:
+            scores = nx.betweenness_centrality(graph)
+        graph.remove_node(max(scores, key=scores.get))
+        giant = graph.subgraph(max(nx.connected_components(graph), key=len))
+        if giant.number_of_nodes() > 1:
+            nx.average_shortest_path_length(giant)
+            nx.diameter(giant)
+        nx.global_efficiency(graph)
+        nx.average_clustering(graph)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--datasets", nargs="+", default=["ca-GrQc", "ca-HepPh"])
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=None,
+        help="Use a clustered power-law graph with this many nodes instead",
+    )
+    parser.add_argument("--n-path-sources", type=int, default=100)
+    parser.add_argument("--n-pivots", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for dataset in MONTAGNA:
+        G = data_utils.load_graph_from_local(dataset)
+        print(f"== {dataset}: {G.number_of_nodes():,} nodes")
+        for strategy in ["degree", "betweenness"]:
+            start = time.perf_counter()
+            chapter_loop(G, strategy)
+            loop = time.perf_counter() - start
+            start = time.perf_counter()
+            resilience.simulate_attack(G, strategy, metrics_every=1)
+            simulator = time.perf_counter() - start
+            print(
+                f"{strategy:<22s} chapter loop {loop:7.2f}s  "
+                f"simulator {simulator:7.2f}s"
+            )
+
+    if args.synthetic:
+        G = nx.powerlaw_cluster_graph(args.synthetic, 10, 0.5, seed=args.seed)
+        graphs = {f"powerlaw_cluster({args.synthetic:,})": csr_graph.from_networkx(G)}
+    else:
+        graphs = {name: data_utils.get_graph(name, lazy=True) for name in args.datasets}
+    for name, graph in graphs.items():
+        print(
+            f"== {name}: {graph.number_of_nodes:,} nodes, "
+            f"{graph.number_of_edges:,} edges"
+        )
+        for strategy in resilience.STRATEGIES:
+            kwargs = {}
+            if strategy == "betweenness":
+                # sampled betweenness, re-ranked after every 1% of the nodes, for
+                # the first 10% of the removals
+                kwargs = dict(
+                    n_steps=graph.number_of_nodes // 10,
+                    batch_size=max(1, graph.number_of_nodes // 100),
+                    n_pivots=args.n_pivots,
+                )
+            start = time.perf_counter()
+            df = resilience.simulate_attack(
+                graph,
+                strategy,
+                n_path_sources=args.n_path_sources,
+                seed=args.seed,
+                **kwargs,
+            )
+            elapsed = time.perf_counter() - start
+            half = np.flatnonzero(
+                df["largest_cc_size"] <= df["largest_cc_size"].iloc[0] / 2
+            )
+            halved = f"{df['fraction_removed'].iloc[half[0]]:.3f}" if len(half) else "-"
+            print(
+                f"{strategy:<22s} {len(df) - 1:>7,d} removals {elapsed:7.2f}s  "
+                f"giant halved at {halved}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,576 @@
+"""
+Offline benchmark suite of data_utils, graph_utils, tmdb_graph and the node features.
+
+Every case runs a public function on bundled data and on seeded synthetic inputs of
+growing size, with no network access. For every input it records the best wall time
+of up to `--repeat` calls and the largest peak resident set size (RSS) of the calls,
+as the increase over the RSS before the call (on Linux the peak is reset before every
+call; elsewhere only growth beyond the peak of the process so far is seen). Worker
+processes are not counted, so all the cases run with `n_jobs=1`. The scaling
+exponent of a case is the slope of log(time) (and of log(memory)) against log(size)
+over its synthetic inputs: 1 is linear, 2 quadratic.
+
+Every run is appended to a JSON history file. If a baseline file exists, the run is
+compared with it and the inputs whose time or memory grew by more than `--threshold`
+(and by more than a noise floor), and the cases whose scaling exponent grew by more
+than `--exponent-threshold`, are reported as regressions, with exit status 1.
+`--save-baseline` stores the run as the new baseline. The caches of the functions
+(graphs, keywords, credits, results) are redirected to a temporary directory.
+
+Usage:
+    python benchmarks/bench_suite.py [--cases get_info triadic] [--scale 0.5]
+    python benchmarks/bench_suite.py --save-baseline
+    python benchmarks/bench_suite.py --list
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable
+
+import matplotlib
+
+matplotlib.use("Agg")
+import networkx as nx
+import numpy as np
+import pandas as pd
+from matplotlib import pyplot as plt
+
+project_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(project_dir)
+sys.path.append(os.path.join(project_dir, "MLConnectedWorldBook"))
+import caching
+import data_utils
+import generate_node_based_dataset
+import graph_utils
+from MLConnectedWorldBook.src import tmdb_graph
+
+results_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+@dataclass
+class Case:
+    """
+    A benchmarked function. `inputs(sizes, seed)` yields (label, size, call) for the
+    bundled inputs and for the synthetic inputs of `sizes`; `call()` runs the function
+    once, and the inputs are built before it is timed.
+    """
+
+    name: str
+    inputs: Callable
+    sizes: tuple
+
+
+_graphs = {}
+
+
+def _synthetic_graph(kind: str, n: int, seed: int) -> nx.Graph:
+    """A seeded synthetic graph with `n` nodes, shared by the cases."""
+    key = (kind, n, seed)
+    if key not in _graphs:
+        if kind == "clustered":
+            G = nx.powerlaw_cluster_graph(n, 4, 0.3, seed=seed)
+        elif kind == "sparse":
+            # many small components
+            G = nx.gnm_random_graph(n, n // 2, seed=seed)
+        elif kind == "directed":
+            G = nx.gnm_random_graph(n, 4 * n, seed=seed, directed=True)
+        else:
+            raise ValueError(f"Unknown kind {kind}")
+        G.name = f"{kind}({n})"
+        _graphs[key] = G
+    return _graphs[key]
+
+
+def _bundled_graphs():
+    for dataset in ["Montagna_meetings_edgelist", "Montagna_phonecalls_edgelist"]:
+        yield dataset, data_utils.load_graph_from_local(dataset)
+
+
+def _graph_inputs(func, kind="clustered", bundled=True, **kwargs):
+    """Inputs of a function of one graph: the bundled graphs and synthetic graphs."""
+
+    def inputs(sizes, seed):
+        if bundled:
+            for dataset, G in _bundled_graphs():
+                yield dataset, G.number_of_nodes(), lambda G=G: func(G, **kwargs)
+        for n in sizes:
+            G = _synthetic_graph(kind, n, seed)
+            yield G.name, n, lambda G=G: func(G, **kwargs)
+
+    return inputs
+
+
+def _load_graph_from_local_inputs(sizes, seed):
+    # parsing and caching from scratch: the graph cache is emptied before every call
+    def load(dataset):
+        cache_dir = tempfile.mkdtemp(dir=data_utils.dir_graph_cache)
+        data_utils.dir_graph_cache, old = cache_dir, data_utils.dir_graph_cache
+        try:
+            return data_utils.load_graph_from_local(dataset)
+        finally:
+            data_utils.dir_graph_cache = old
+
+    for dataset in ["Montagna_meetings_edgelist", "Montagna_phonecalls_edgelist"]:
+        n = data_utils.load_graph_from_local(dataset).number_of_nodes()
+        yield dataset, n, lambda d=dataset: load(d)
+    for n in sizes:
+        G = _synthetic_graph("clustered", n, seed)
+        dataset = os.path.join(data_utils.dir_graph_cache, f"edges_{n}_{seed}")
+        nx.to_pandas_edgelist(G, "src", "dst").assign(weight=1.0).to_csv(
+            dataset + ".csv", index=False
+        )
+        # an absolute path joined to `dir_data` is the path itself
+        yield f"edge list({n})", n, lambda d=dataset: load(d)
+
+
+def _plot_triad_census(G):
+    ax = graph_utils.plot_triad_census(G)
+    plt.close(ax.figure)
+
+
+def _plot_triad_census_inputs(sizes, seed):
+    G = data_utils.get_graph("rabbi_quotation_data")
+    yield "rabbi_quotation_data", G.number_of_nodes(), lambda: _plot_triad_census(G)
+    for n in sizes:
+        G = _synthetic_graph("directed", n, seed)
+        yield G.name, n, lambda G=G: _plot_triad_census(G)
+
+
+def _movies() -> pd.DataFrame:
+    return pd.read_csv(
+        os.path.join(data_utils.dir_data, "tmdb_5000_movies.csv.zip")
+    ).dropna(subset=["overview"])
+
+
+def _build_movies_and_keywords_graph_inputs(sizes, seed):
+    # with an empty keyword cache: the keyword extraction dominates
+    def build(df):
+        tmdb_graph.clear_keyword_cache()
+        return tmdb_graph.build_movies_and_keywords_graph(
+            df, n_jobs=1, cachier__skip_cache=True
+        )
+
+    df = _movies()
+    for n in sizes:
+        sample = df.sample(min(n, len(df)), random_state=seed)
+        yield f"tmdb movies({len(sample)})", len(sample), lambda d=sample: build(d)
+
+
+def _synthetic_credits(titles, seed) -> pd.DataFrame:
+    """Credits in the format of tmdb_5000_credits.csv, for `titles`."""
+    rng = np.random.default_rng(seed)
+    names = [f"person {i}" for i in range(max(10, len(titles) * 5))]
+    jobs = ["Director", "Producer", "Writer", "Screenplay", "Editor", "Sound"]
+    rows = []
+    for title in titles:
+        cast = [
+            {"name": names[i], "order": order, "character": "x"}
+            for order, i in enumerate(rng.integers(0, len(names), 30).tolist())
+        ]
+        crew = [
+            {"name": names[i], "job": jobs[j]}
+            for i, j in zip(
+                rng.integers(0, len(names), 15).tolist(),
+                rng.integers(0, len(jobs), 15).tolist(),
+            )
+        ]
+        rows.append(
+            {
+                "movie_id": len(rows),
+                "title": title,
+                "cast": json.dumps(cast),
+                "crew": json.dumps(crew),
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def _movies_and_keywords_graph(titles, seed) -> nx.Graph:
+    """A graph like `build_movies_and_keywords_graph`, with random keywords."""
+    rng = np.random.default_rng(seed)
+    g = nx.Graph()
+    for title in titles:
+        g.add_node(title, label=title, type="MOVIE", count=1)
+        for keyword in rng.integers(0, 5 * len(titles), 10).tolist():
+            g.add_node(f"keyword {keyword}", type="KEYWORD")
+            g.add_edge(title, f"keyword {keyword}", weight=float(rng.random()))
+    return g
+
+
+def _get_graph_with_credit_info_inputs(sizes, seed):
+    # the credits are parsed from scratch: the parsed-credits cache is emptied
+    def build(g, df_credits):
+        for fn in os.listdir(tmdb_graph.credits_cache_dir):
+            os.unlink(os.path.join(tmdb_graph.credits_cache_dir, fn))
+        return tmdb_graph.get_graph_with_credit_info(g, df_credits)
+
+    titles = _movies()["title"].drop_duplicates()
+    os.makedirs(tmdb_graph.credits_cache_dir, exist_ok=True)
+    for n in sizes:
+        sample = titles.sample(min(n, len(titles)), random_state=seed).tolist()
+        g = _movies_and_keywords_graph(sample, seed)
+        df_credits = _synthetic_credits(sample, seed)
+        yield (
+            f"tmdb movies({len(sample)})",
+            len(sample),
+            lambda g=g, d=df_credits: build(g, d),
+        )
+
+
+CASES = [
+    Case(
+        "data_utils.get_info[networkx]",
+        _graph_inputs(data_utils.get_info),
+        (250, 500, 1000),
+    ),
+    Case(
+        "data_utils.get_info[csr]",
+        _graph_inputs(data_utils.get_info, backend="csr"),
+        (500, 1000, 2000),
+    ),
+    Case(
+        "data_utils.load_graph_from_local",
+        _load_graph_from_local_inputs,
+        (10_000, 20_000, 40_000, 80_000),
+    ),
+    Case(
+        "data_utils.get_connected_component_subgraphs",
+        _graph_inputs(data_utils.get_connected_component_subgraphs, "sparse"),
+        (2500, 5000, 10_000),
+    ),
+    Case(
+        "graph_utils.triadic_metrics_undirected",
+        _graph_inputs(graph_utils.triadic_metrics_undirected),
+        (10_000, 20_000, 40_000, 80_000),
+    ),
+    Case(
+        "graph_utils.plot_triad_census",
+        _plot_triad_census_inputs,
+        (10_000, 20_000, 40_000, 80_000),
+    ),
+    Case(
+        "tmdb_graph.build_movies_and_keywords_graph",
+        _build_movies_and_keywords_graph_inputs,
+        (50, 100, 200),
+    ),
+    Case(
+        "tmdb_graph.get_graph_with_credit_info",
+        _get_graph_with_credit_info_inputs,
+        (500, 1000, 2000, 4000),
+    ),
+    Case(
+        "generate_node_based_dataset.compute_node_features",
+        _graph_inputs(generate_node_based_dataset.compute_node_features),
+        (2000, 4000, 8000, 16_000),
+    ),
+    Case(
+        "generate_node_based_dataset.compute_centrality_features",
+        _graph_inputs(generate_node_based_dataset.compute_centrality_features),
+        (500, 1000, 2000),
+    ),
+    Case(
+        "generate_node_based_dataset.compute_community_features",
+        _graph_inputs(generate_node_based_dataset.compute_community_features),
+        (500, 1000, 2000),
+    ),
+    Case(
+        "generate_node_based_dataset.compute_ego_graph_features",
+        _graph_inputs(generate_node_based_dataset.compute_ego_graph_features),
+        (2000, 4000, 8000, 16_000),
+    ),
+]
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the peak RSS of this process (Linux); whether it was reset."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _rss_mb() -> tuple:
+    """The current and the peak resident set size of this process, in MB."""
+    try:
+        with open("/proc/self/status") as f:
+            status = dict(line.split(":", 1) for line in f if ":" in line)
+        return (
+            int(status["VmRSS"].split()[0]) / 1024,
+            int(status["VmHWM"].split()[0]) / 1024,
+        )
+    except (OSError, KeyError):
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, kilobytes elsewhere
+        peak /= 2**20 if sys.platform == "darwin" else 1024
+        return peak, peak
+
+
+def measure(call: Callable, repeat: int, max_seconds: float) -> dict:
+    """
+    Time `call` up to `repeat` times, stopping early after `max_seconds` in total.
+
+    Returns:
+    dict: The best and the median wall time in seconds, the number of calls, the
+        peak RSS during the call with the most memory (in MB), and its increase
+        over the RSS before that call.
+    """
+    times, peaks, increases = [], [], []
+    while len(times) < repeat and (not times or sum(times) < max_seconds):
+        gc.collect()
+        _reset_peak_rss()
+        before, peak_before = _rss_mb()
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+        _, peak = _rss_mb()
+        peaks.append(peak)
+        # without a reset, only the growth beyond the previous peak is seen
+        increases.append(max(0.0, peak - max(before, peak_before)))
+    worst = int(np.argmax(increases))
+    return {
+        "seconds": min(times),
+        "seconds_median": float(np.median(times)),
+        "calls": len(times),
+        "peak_rss_mb": peaks[worst],
+        "rss_increase_mb": increases[worst],
+    }
+
+
+def scaling_exponents(results: list) -> dict:
+    """
+    The slopes of log(seconds) and log(rss_increase_mb) against log(size) over the
+    synthetic inputs of every case (None with fewer than two sizes).
+    """
+    exponents = {}
+    df = pd.DataFrame(results)
+    for case, group in df[df["synthetic"]].groupby("case", sort=False):
+        exponents[case] = {}
+        for key, column in [("time", "seconds"), ("memory", "rss_increase_mb")]:
+            points = group[group[column] > 0]
+            if points["size"].nunique() < 2:
+                exponents[case][key] = None
+                continue
+            slope, _ = np.polyfit(np.log(points["size"]), np.log(points[column]), 1)
+            exponents[case][key] = float(slope)
+    return exponents
+
+
+def compare(
+    run: dict,
+    baseline: dict,
+    threshold: float,
+    min_seconds: float,
+    min_rss_mb: float,
+    exponent_threshold: float,
+) -> list:
+    """
+    The regressions of `run` against `baseline`: inputs whose time or memory grew by
+    more than `threshold` (relative) and by more than `min_seconds` or `min_rss_mb`,
+    and cases whose time scaling exponent grew by more than `exponent_threshold` (the
+    memory exponents are too noisy to compare).
+
+    Returns:
+    list: One message per regression.
+    """
+    base = {(r["case"], r["input"]): r for r in baseline["results"]}
+    regressions = []
+    for r in run["results"]:
+        b = base.get((r["case"], r["input"]))
+        if b is None:
+            continue
+        for column, floor, unit in [
+            ("seconds", min_seconds, "s"),
+            ("rss_increase_mb", min_rss_mb, " MB"),
+        ]:
+            if (
+                r[column] > b[column] * (1 + threshold)
+                and r[column] - b[column] > floor
+            ):
+                regressions.append(
+                    f"{r['case']} on {r['input']}: {column} {b[column]:.4g}{unit} "
+                    f"-> {r[column]:.4g}{unit} (+{r[column] / max(b[column], 1e-12) - 1:.0%})"
+                )
+    for case, exponents in run["scaling"].items():
+        value = exponents["time"]
+        old = baseline["scaling"].get(case, {}).get("time")
+        if value is not None and old is not None and value - old > exponent_threshold:
+            regressions.append(
+                f"{case}: time scaling exponent {old:.2f} -> {value:.2f}"
+            )
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=project_dir,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _write_json(fn: str, data):
+    os.makedirs(os.path.dirname(os.path.abspath(fn)), exist_ok=True)
+    # write and rename, so that an interrupted run never leaves a partial file
+    with open(fn + ".tmp", "w") as f:
+        json.dump(data, f, indent=1)
+    os.replace(fn + ".tmp", fn)
+
+
+def run_cases(cases: list, scale: float, seed: int, repeat: int, max_seconds: float):
+    """Measure every input of `cases`; the result rows."""
+    results = []
+    for case in cases:
+        sizes = sorted({max(1, int(round(n * scale))) for n in case.sizes})
+        print(f"== {case.name}")
+        for label, size, call in case.inputs(sizes, seed):
+            result = {
+                "case": case.name,
+                "input": label,
+                "size": int(size),
+                "synthetic": label not in _bundled_labels,
+                **measure(call, repeat, max_seconds),
+            }
+            results.append(result)
+            print(
+                f"{label:<28s} {result['seconds']:9.4f}s "
+                f"{result['peak_rss_mb']:8.1f} MB peak "
+                f"{result['rss_increase_mb']:+8.1f} MB"
+            )
+    return results
+
+
+_bundled_labels = {
+    "Montagna_meetings_edgelist",
+    "Montagna_phonecalls_edgelist",
+    "rabbi_quotation_data",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--cases",
+        nargs="+",
+        default=None,
+        help="Run the cases whose name contains one of these strings (default: all)",
+    )
+    parser.add_argument("--list", action="store_true", help="List the cases and exit")
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Multiply the synthetic sizes"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=2.0,
+        help="Stop repeating an input after this much time",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--history", default=os.path.join(results_dir, "history.json"))
+    parser.add_argument(
+        "--baseline", default=os.path.join(results_dir, "baseline.json")
+    )
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--min-seconds", type=float, default=0.01)
+    parser.add_argument("--min-rss-mb", type=float, default=16.0)
+    parser.add_argument("--exponent-threshold", type=float, default=0.3)
+    args = parser.parse_args()
+
+    cases = [
+        case
+        for case in CASES
+        if args.cases is None or any(name in case.name for name in args.cases)
+    ]
+    if args.list:
+        for case in CASES:
+            print(f"{case.name:<60s} sizes {case.sizes}")
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        # keep the caches of the user out of the measurements
+        data_utils.dir_graph_cache = os.path.join(directory, "graphs")
+        os.makedirs(data_utils.dir_graph_cache)
+        tmdb_graph.credits_cache_dir = os.path.join(directory, "credits")
+        caching.cache_dir = os.path.join(directory, "results")
+        results = run_cases(cases, args.scale, args.seed, args.repeat, args.max_seconds)
+
+    run = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.node(),
+        "cpu_count": os.cpu_count(),
+        "scale": args.scale,
+        "seed": args.seed,
+        "results": results,
+        "scaling": scaling_exponents(results),
+    }
+    print("== scaling exponents (time, memory)")
+    for case, exponents in run["scaling"].items():
+        values = [
+            "   n/a" if v is None else f"{v:6.2f}"
+            for v in (exponents["time"], exponents["memory"])
+        ]
+        print(f"{case:<60s} {values[0]} {values[1]}")
+
+    try:
+        with open(args.history) as f:
+            history = json.load(f)
+    except FileNotFoundError:
+        history = []
+    history.append(run)
+    _write_json(args.history, history)
+    print(f"== {len(history)} runs in {args.history}")
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if (baseline["machine"], baseline["scale"]) != (run["machine"], run["scale"]):
+            print(
+                f"warning: the baseline is from {baseline['machine']} "
+                f"at scale {baseline['scale']}"
+            )
+        regressions = compare(
+            run,
+            baseline,
+            args.threshold,
+            args.min_seconds,
+            args.min_rss_mb,
+            args.exponent_threshold,
+        )
+        print(
+            f"== {len(regressions)} regressions against the baseline of "
+            f"{baseline['timestamp']} ({baseline['commit']})"
+        )
+        for regression in regressions:
+            print(regression)
+    if args.save_baseline:
+        _write_json(args.baseline, run)
+        print(f"== baseline saved to {args.baseline}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Runtime of time-sliced graph metrics: rebuilding every snapshot versus
+`data_utils.TemporalGraph`.
+
+The baseline follows the chapters: for every cutoff day, filter the event DataFrame,
+aggregate it into edges, build a networkx graph and compute its metrics. The temporal
+graph sorts the events once and updates the metrics between consecutive cutoffs
+(`TemporalGraph.sweep`); single snapshots are built by binary search on the times.
+The events are those of the SNAP email-Eu-core-temporal network (or, offline, a
+synthetic event stream of about the same size).
+
+Usage:
+    python benchmarks/bench_temporal.py [--window 30] [--step 1]
+    python benchmarks/bench_temporal.py --synthetic 330000  # offline
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import data_utils
+
+
+def rebuild(df, cutoff, window):
+    sel = df["time"] < cutoff
+    if window is not None:
+        sel &= df["time"] >= cutoff - window
+    df_edges = df[sel].groupby(["source", "target"]).size().reset_index(name="weight")
+    G = nx.from_pandas_edgelist(df_edges, "source", "target", edge_attr=True)
+    n_nodes, n_edges = G.number_of_nodes(), G.number_of_edges()
+    G.remove_edges_from(nx.selfloop_edges(G))
+    return (
+        n_nodes,
+        n_edges,
+        sum(nx.triangles(G).values()) // 3,
+        nx.transitivity(G),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=None,
+        help="Use this many random events (1,000 nodes, 800 days) instead",
+    )
+    parser.add_argument("--window", type=int, default=None, help="In days")
+    parser.add_argument("--step", type=int, default=1, help="Days between cutoffs")
+    parser.add_argument(
+        "--n-rebuilds",
+        type=int,
+        default=50,
+        help="Rebuild this many cutoffs and extrapolate to all of them",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.synthetic:
+        rng = np.random.default_rng(args.seed)
+        df = pd.DataFrame(
+            {
+                "source": rng.zipf(1.8, args.synthetic) % 1000,
+                "target": rng.zipf(1.8, args.synthetic) % 1000,
+                "time": rng.integers(0, 800, args.synthetic),
+            }
+        )
+        tg = data_utils.temporal_graph_from_edgelist(df, name="synthetic")
+    else:
+        tg = data_utils.load_temporal_graph()
+        df = pd.DataFrame({"source": tg.source, "target": tg.target, "time": tg.time})
+    print(
+        f"== {tg.name}: {len(df):,} events, {len(tg.nodes):,} nodes, "
+        f"loaded and sorted in {time.perf_counter() - start:.2f}s"
+    )
+    # an undirected graph: one orientation per pair, as in the snapshots
+    df[["source", "target"]] = np.sort(df[["source", "target"]].values)
+
+    cutoffs = np.arange(tg.time.min() + args.step, tg.time.max() + 2, args.step)
+    sample = cutoffs[:: max(1, len(cutoffs) // args.n_rebuilds)]
+    start = time.perf_counter()
+    expected = [rebuild(df, cutoff, args.window) for cutoff in sample]
+    loop = (time.perf_counter() - start) * len(cutoffs) / len(sample)
+    print(f"{'rebuild per cutoff (extrapolated)':<36s} {loop:8.2f}s")
+
+    start = time.perf_counter()
+    sweep = tg.sweep(cutoffs, window=args.window)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{'TemporalGraph.sweep':<36s} {elapsed:8.2f}s "
+        f"({len(cutoffs):,} cutoffs, {loop / elapsed:.0f}x)"
+    )
+    columns = ["n_nodes", "n_edges", "n_triangles", "transitivity"]
+    np.testing.assert_allclose(sweep.loc[sample, columns].values, expected)
+
+    middle = cutoffs[len(cutoffs) // 2]
+    start = time.perf_counter()
+    G = tg.snapshot(middle)
+    print(
+        f"{'snapshot at day ' + str(middle):<36s} "
+        f"{time.perf_counter() - start:8.2f}s ({G.number_of_edges():,} edges)"
+    )
+
+
+if __name__ == "__main__":
+    main()
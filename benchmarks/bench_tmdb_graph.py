@@ -0,0 +1,58 @@
+"""
+Time `tmdb_graph.build_movies_and_keywords_graph` on the bundled TMDB movies.
+
+Compares the original row-by-row construction with the batched one, with a cold
+and a warm keyword cache, and checks that the graphs are the same.
+
+Usage:
+    python benchmarks/bench_tmdb_graph.py [--n-movies 1000] [--n-jobs -1]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+project_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(project_dir)
+import caching
+from MLConnectedWorldBook.src import tmdb_graph
+from tests.test_tmdb_graph import _assert_graphs_equal, _build_graph_row_by_row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--n-movies", type=int, default=None, help="Default: all")
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    df = pd.read_csv(
+        os.path.join(
+            project_dir, "MLConnectedWorldBook", "data", "tmdb_5000_movies.csv.zip"
+        )
+    )
+    if args.n_movies:
+        df = df.head(args.n_movies)
+    print(f"== {len(df):,} movies")
+
+    start = time.perf_counter()
+    expected = _build_graph_row_by_row(df, top=args.top)
+    print(f"row by row:          {time.perf_counter() - start:8.2f}s")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        tmdb_graph.keyword_cache = caching.ResultCache(cache_dir, caching.max_bytes)
+        for label in ["batched, cold cache", "batched, warm cache"]:
+            start = time.perf_counter()
+            g = tmdb_graph.build_movies_and_keywords_graph(
+                df, top=args.top, n_jobs=args.n_jobs, cachier__skip_cache=True
+            )
+            print(f"{label + ':':<20s} {time.perf_counter() - start:8.2f}s")
+            _assert_graphs_equal(g, expected)
+
+
+if __name__ == "__main__":
+    main()
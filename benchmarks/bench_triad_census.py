@@ -0,0 +1,78 @@
+"""
+Runtime of the directed triadic census: networkx versus `triad_census`.
+
+The graphs are the rabbi quotation network and a synthetic directed scale-free graph.
+networkx is skipped on graphs above `--nx-max-edges` edges. The per-node profile
+(`triad_census.triad_profile`) is timed too, and checked against the census. The
+sampling estimator runs on the largest graph, with its largest relative confidence
+interval reported.
+
+Usage:
+    python benchmarks/bench_triad_census.py [--sizes 10000 100000] [--n-jobs 1 4]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import networkx as nx
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import csr_graph
+import data_utils
+import triad_census
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10000, 100000, 1000000]
+    )
+    parser.add_argument("--n-jobs", type=int, nargs="+", default=[1])
+    parser.add_argument("--nx-max-edges", type=int, default=20000)
+    parser.add_argument("--n-sampled-edges", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    graphs = {"rabbi_quotation_data": data_utils.get_graph("rabbi_quotation_data")}
+    for n in args.sizes:
+        G = nx.DiGraph(nx.scale_free_graph(n, seed=args.seed))
+        graphs[f"scale_free_graph({n:,})"] = G
+    for name, G in graphs.items():
+        print(
+            f"== {name}: {G.number_of_nodes():,} nodes, {G.number_of_edges():,} edges"
+        )
+        expected = None
+        if G.number_of_edges() <= args.nx_max_edges:
+            start = time.perf_counter()
+            expected = nx.triadic_census(G)
+            print(f"{'networkx':<24s} {time.perf_counter() - start:8.2f}s")
+        graph = csr_graph.from_networkx(G)
+        for n_jobs in args.n_jobs:
+            start = time.perf_counter()
+            census = triad_census.triadic_census(graph, n_jobs=n_jobs)
+            label = f"triad_census n_jobs={n_jobs}"
+            print(f"{label:<24s} {time.perf_counter() - start:8.2f}s")
+            assert expected is None or census == expected
+            start = time.perf_counter()
+            profile = triad_census.triad_profile(graph, n_jobs=n_jobs)
+            label = f"triad_profile n_jobs={n_jobs}"
+            print(f"{label:<24s} {time.perf_counter() - start:8.2f}s")
+            assert (profile.sum() == 3 * pd.Series(census)).all()
+
+    start = time.perf_counter()
+    df = triad_census.sampled_triadic_census(
+        graph, n_edges=args.n_sampled_edges, seed=args.seed
+    )
+    elapsed = time.perf_counter() - start
+    relative = (df["half_width"] / df["estimate"].clip(lower=1)).max()
+    print(
+        f"{'sampled estimate':<24s} {elapsed:8.2f}s  "
+        f"largest relative 95% half-width {relative:.3f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
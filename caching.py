@@ -0,0 +1,372 @@
+"""
+A size-bounded, content-addressed cache for the results of slow functions.
+
+`@cached(stale_after=...)` caches the return value of a function under a key that
+hashes the function's code and its arguments. Arguments are hashed by content with a
+cheap fingerprint (`fingerprint`): DataFrames by their shape, columns and dtypes and
+the content of every column (the raw bytes of NumPy and Arrow columns, the vectorised
+`pd.util.hash_pandas_object` of the others), arrays by their bytes, graphs by their
+nodes, edges and attributes, and everything else by its pickle.
+
+Results live in two tiers:
+
+- a disk store, one pickle file per entry under `cache_dir/<function>/`, capped at
+  `max_bytes` in total: when the cap is exceeded, the least recently used entries
+  (by file modification time, which is refreshed on every hit) are deleted;
+- an in-process memory tier of the pickled bytes of the most recently used entries,
+  so that repeated calls skip the disk but still return independent copies.
+
+Entries are written to a temporary file and renamed into place, and a reader treats a
+file that disappeared (evicted by another process) as a miss, so joblib workers can
+share the disk store without locks. Every decorated function counts its hits, misses
+and bytes read and written in its `stats`; `cache_stats()` tabulates them.
+"""
+
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import re
+import tempfile
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import csr_graph
+
+cache_dir = os.environ.get(
+    "MLCW_RESULT_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "MLConnectedWorld", "results"),
+)
+max_bytes = int(os.environ.get("MLCW_RESULT_CACHE_MB", 2048)) * 2**20
+
+
+def _update(h, value):
+    """Feed the content of `value` into the hash `h`."""
+    if value is None or isinstance(value, (bool, int, float, complex, str, bytes)):
+        h.update(f"{type(value).__name__}:{value!r};".encode())
+    elif isinstance(value, (tuple, list)):
+        h.update(f"{type(value).__name__}[{len(value)}]".encode())
+        for item in value:
+            _update(h, item)
+    elif isinstance(value, dict):
+        h.update(f"dict[{len(value)}]".encode())
+        for key in sorted(value, key=repr):
+            _update(h, key)
+            _update(h, value[key])
+    elif isinstance(value, np.ndarray):
+        h.update(f"ndarray{value.shape}{value.dtype.str}".encode())
+        if value.dtype.hasobject:
+            _update(h, pd.Series(value.ravel()))
+        else:
+            h.update(np.ascontiguousarray(value).data)
+    elif isinstance(value, pd.DataFrame):
+        h.update(f"DataFrame{value.shape}".encode())
+        _update(h, value.index)
+        for i, (name, dtype) in enumerate(value.dtypes.items()):
+            _update(h, (name, str(dtype)))
+            _update(h, value.iloc[:, i].reset_index(drop=True))
+    elif isinstance(value, pd.RangeIndex):
+        h.update(
+            f"RangeIndex{value.start, value.stop, value.step, value.name}".encode()
+        )
+    elif isinstance(value, (pd.Series, pd.Index)):
+        h.update(f"{type(value).__name__}[{len(value)}]{value.dtype}".encode())
+        _update(h, value.name)
+        if isinstance(value, pd.Series):
+            _update(h, value.index)
+        values = value.array
+        if isinstance(value.dtype, np.dtype) and not value.dtype.hasobject:
+            h.update(np.ascontiguousarray(value.to_numpy()).data)
+        elif hasattr(values, "__arrow_array__"):
+            # the Arrow buffers as they are; the offsets select the values
+            for chunk in pa.chunked_array(values.__arrow_array__()).chunks:
+                h.update(f"chunk{chunk.offset, len(chunk)}".encode())
+                for buffer in chunk.buffers():
+                    h.update(b"-" if buffer is None else memoryview(buffer))
+        else:
+            try:
+                hashes = pd.util.hash_pandas_object(
+                    value, index=False, categorize=False
+                )
+                h.update(hashes.to_numpy().data)
+            except (TypeError, ValueError):
+                # unhashable items, such as lists
+                h.update(pickle.dumps(value.tolist(), protocol=pickle.HIGHEST_PROTOCOL))
+    elif isinstance(value, nx.Graph):
+        h.update(f"{type(value).__name__}:{value.graph!r}".encode())
+        h.update(repr(list(value.nodes(data=True))).encode())
+        h.update(repr(list(value.edges(data=True))).encode())
+    elif isinstance(value, csr_graph.CSRGraph):
+        h.update(f"CSRGraph:{value.directed}:{value.name!r}".encode())
+        _update(h, [value.indptr, value.indices, value.nodes, value.edge_attrs])
+    else:
+        h.update(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def fingerprint(value) -> str:
+    """
+    A content hash of `value`, cheap for DataFrames, arrays and graphs.
+
+    Parameters:
+    value: Any picklable value; containers are hashed item by item.
+
+    Returns:
+    str: A hex digest; equal contents give equal digests.
+    """
+    # SHA-256 has hardware support on most CPUs: faster than blake2b or MD5
+    h = hashlib.sha256()
+    _update(h, value)
+    return h.hexdigest()[:40]
+
+
+@dataclass
+class CacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    evictions: int = 0
+
+
+class ResultCache:
+    """
+    A disk store of pickled results capped at `max_bytes`, with least-recently-used
+    eviction, in front of which sits a memory tier of up to `memory_bytes`.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, memory_bytes: int = 2**28):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        # an estimate of the size of the disk store; scanned when it exceeds the cap
+        self._disk_size = None
+
+    def _path(self, namespace: str, key: str) -> str:
+        return os.path.join(self.directory, namespace, key + ".pkl")
+
+    def _remember(self, path: str, payload: bytes):
+        if len(payload) > self.memory_bytes:
+            return
+        if path in self._memory:
+            self._memory_size -= len(self._memory.pop(path))
+        self._memory[path] = payload
+        self._memory_size += len(payload)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def get(self, namespace: str, key: str, stale_after: float, stats: CacheStats):
+        """The cached (created, value) of `key`, or None if missing or stale."""
+        path = self._path(namespace, key)
+        payload = self._memory.get(path)
+        if payload is not None:
+            self._memory.move_to_end(path)
+            created, value = pickle.loads(payload)
+            if time.time() - created <= stale_after:
+                stats.memory_hits += 1
+                return created, value
+        try:
+            with open(path, "rb") as f:
+                payload = f.read()
+            # refresh the modification time, which orders the eviction
+            os.utime(path)
+        except FileNotFoundError:
+            stats.misses += 1
+            return None
+        try:
+            created, value = pickle.loads(payload)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # a damaged entry or one from incompatible code
+            stats.misses += 1
+            return None
+        if time.time() - created > stale_after:
+            stats.misses += 1
+            return None
+        stats.disk_hits += 1
+        stats.bytes_read += len(payload)
+        self._remember(path, payload)
+        return created, value
+
+    def put(self, namespace: str, key: str, value, stats: CacheStats):
+        path = self._path(namespace, key)
+        payload = pickle.dumps((time.time(), value), protocol=pickle.HIGHEST_PROTOCOL)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write and rename, so that readers never see a partial entry
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        stats.bytes_written += len(payload)
+        self._remember(path, payload)
+        if self._disk_size is None:
+            self._disk_size = sum(size for *_, size in self._entries())
+        else:
+            self._disk_size += len(payload)
+        if self._disk_size > self.max_bytes:
+            stats.evictions += self.evict()
+
+    def _entries(self) -> list:
+        """(mtime, path, size) of every entry on disk."""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for namespace in os.scandir(self.directory):
+            if not namespace.is_dir():
+                continue
+            for entry in os.scandir(namespace.path):
+                if not entry.name.endswith(".pkl"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def evict(self) -> int:
+        """Delete the least recently used entries down to `max_bytes`; their number."""
+        entries = sorted(self._entries())
+        total = sum(size for *_, size in entries)
+        n_evicted = 0
+        for _, path, size in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+                n_evicted += 1
+            except FileNotFoundError:
+                # evicted by another process
+                pass
+            total -= size
+            if path in self._memory:
+                self._memory_size -= len(self._memory.pop(path))
+        self._disk_size = total
+        return n_evicted
+
+    def clear(self, namespace: str = None):
+        """Delete the entries of `namespace` (all entries by default)."""
+        for _, path, _ in self._entries():
+            if (
+                namespace is None
+                or os.path.basename(os.path.dirname(path)) == namespace
+            ):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                if path in self._memory:
+                    self._memory_size -= len(self._memory.pop(path))
+        self._disk_size = None
+
+
+_default_cache = None
+_stats = {}
+
+
+def default_cache() -> ResultCache:
+    """The cache of the `cache_dir` and `max_bytes` settings of this module."""
+    global _default_cache
+    if (
+        _default_cache is None
+        or _default_cache.directory != cache_dir
+        or _default_cache.max_bytes != max_bytes
+    ):
+        _default_cache = ResultCache(cache_dir, max_bytes)
+    return _default_cache
+
+
+def _code_hash(func) -> str:
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        source = func.__code__.co_code.hex()
+    return hashlib.sha1(source.encode()).hexdigest()
+
+
+def cached(stale_after: timedelta = None, cache: ResultCache = None):
+    """
+    Cache the results of a function by the content of its arguments.
+
+    The decorated function takes two more keyword arguments: `cache__skip=True`
+    computes the result without reading or writing the cache, `cache__overwrite=True`
+    computes it and replaces the cached entry. The cachier spellings
+    `cachier__skip_cache` and `cachier__overwrite_cache` are accepted as well, so
+    that callers of the former cachier decorators keep working. It has a `stats`
+    attribute (a `CacheStats`) and a `clear_cache()` method.
+
+    Parameters:
+    stale_after (datetime.timedelta): Entries older than this are recomputed.
+        Defaults to never.
+    cache (ResultCache): The cache. Defaults to `default_cache()`.
+
+    Returns:
+    Callable: The decorator.
+    """
+    max_age = float("inf") if stale_after is None else stale_after.total_seconds()
+
+    def decorator(func):
+        signature = inspect.signature(func)
+        namespace = re.sub(r"[^\w.]", "_", f"{func.__module__}.{func.__qualname__}")
+        code_hash = _code_hash(func)
+        stats = _stats.setdefault(namespace, CacheStats())
+
+        @functools.wraps(func)
+        def wrapper(
+            *args,
+            cache__skip=False,
+            cache__overwrite=False,
+            cachier__skip_cache=False,
+            cachier__overwrite_cache=False,
+            **kwargs,
+        ):
+            cache__skip = cache__skip or cachier__skip_cache
+            cache__overwrite = cache__overwrite or cachier__overwrite_cache
+            if cache__skip:
+                return func(*args, **kwargs)
+            store = cache or default_cache()
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = fingerprint((code_hash, dict(bound.arguments)))
+            if not cache__overwrite:
+                entry = store.get(namespace, key, max_age, stats)
+                if entry is not None:
+                    return entry[1]
+            else:
+                stats.misses += 1
+            value = func(*args, **kwargs)
+            store.put(namespace, key, value, stats)
+            return value
+
+        wrapper.stats = stats
+        wrapper.clear_cache = lambda: (cache or default_cache()).clear(namespace)
+        return wrapper
+
+    return decorator
+
+
+def cache_stats() -> pd.DataFrame:
+    """
+    The hit, miss and byte counts of the cached functions in this process.
+
+    Returns:
+    pandas.DataFrame: One row per cached function, indexed by its qualified name.
+    """
+    columns = list(asdict(CacheStats()))
+    rows = {name: asdict(stats) for name, stats in _stats.items()}
+    return pd.DataFrame.from_dict(rows, orient="index", columns=columns)
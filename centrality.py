@@ -0,0 +1,240 @@
+"""
+Betweenness and closeness centrality from shared breadth-first searches.
+
+Both centralities are computed from the same BFS per source (Brandes, 2001): the BFS
+distances give the closeness of every node, and the shortest-path counts and the
+backward dependency accumulation give the betweenness. BFS runs for a batch of
+sources at once, as sparse-matrix by dense-matrix products over the CSR adjacency.
+
+Three modes are available:
+
+- "exact": every node is a source; the values equal networkx's
+  `betweenness_centrality` and `closeness_centrality` (up to floating-point rounding);
+- "parallel": the same, with the sources split between `n_jobs` worker processes;
+- "sampled": in every connected component larger than `n_pivots` nodes, only
+  `n_pivots` uniformly sampled pivots are sources, and the centralities are estimated
+  from them, with confidence intervals. Smaller components are computed exactly.
+
+The confidence intervals of the sampled mode are either normal approximations per node
+(finite-population corrected), which are tight but can be too narrow for nodes whose
+centrality comes from a few sources, or Hoeffding-Serfling bounds, which hold for
+every node with the requested probability but are much wider.
+"""
+
+from typing import Literal
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from joblib import Parallel, delayed, effective_n_jobs
+from scipy import stats
+from scipy.sparse import csgraph
+
+import csr_graph
+
+
+def _brandes(indptr, indices, sources, batch_size):
+    """
+    Dependency and distance sums of BFS from `sources` in an unweighted graph.
+
+    Returns:
+    tuple: Sum and sum of squares over the sources of the dependency of every node
+        (Brandes' delta), and of the distance from the sources to every node
+        (unreachable sources contribute 0), and the total distance from every source
+        to the nodes it reaches and its eccentricity.
+    """
+    n = len(indptr) - 1
+    A = sp.csr_array(
+        (np.ones(len(indices)), indices, indptr), shape=(n, n), dtype=np.float64
+    )
+    dependency_sum = np.zeros(n)
+    dependency_sq = np.zeros(n)
+    distance_sum = np.zeros(n)
+    distance_sq = np.zeros(n)
+    source_distance = np.zeros(len(sources))
+    source_eccentricity = np.zeros(len(sources))
+    for start in range(0, len(sources), batch_size):
+        batch = sources[start : start + batch_size]
+        columns = np.arange(len(batch))
+        distance = np.full((n, len(batch)), -1, dtype=np.int32)
+        distance[batch, columns] = 0
+        # number of shortest paths from the source of every column
+        sigma = np.zeros((n, len(batch)))
+        sigma[batch, columns] = 1
+        frontier = sigma.copy()
+        level = 0
+        while True:
+            reached = A @ frontier
+            new = (reached > 0) & (distance < 0)
+            if not new.any():
+                break
+            level += 1
+            distance[new] = level
+            frontier = np.where(new, reached, 0.0)
+            sigma += frontier
+        # dependencies, accumulated from the farthest level back to the sources
+        delta = np.zeros((n, len(batch)))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for current in range(level, 0, -1):
+                successors = np.where(distance == current, (1 + delta) / sigma, 0.0)
+                delta = np.where(
+                    distance == current - 1, sigma * (A @ successors), delta
+                )
+        delta[batch, columns] = 0
+        dependency_sum += delta.sum(axis=1)
+        dependency_sq += (delta**2).sum(axis=1)
+        reachable = np.maximum(distance, 0).astype(np.float64)
+        distance_sum += reachable.sum(axis=1)
+        distance_sq += (reachable**2).sum(axis=1)
+        source_distance[start : start + batch_size] = reachable.sum(axis=0)
+        source_eccentricity[start : start + batch_size] = level
+    return (
+        dependency_sum,
+        dependency_sq,
+        distance_sum,
+        distance_sq,
+        source_distance,
+        source_eccentricity,
+    )
+
+
+def betweenness_closeness(
+    graph: csr_graph.CSRGraph,
+    mode: Literal["exact", "sampled", "parallel"] = "exact",
+    n_pivots: int = 1000,
+    seed: int = 42,
+    n_jobs: int = 1,
+    confidence: float = 0.95,
+    interval: Literal["normal", "hoeffding"] = "normal",
+    memory_budget_mb: int = 256,
+):
+    """
+    Normalized betweenness centrality and closeness centrality of every node.
+
+    Parameters:
+    graph (csr_graph.CSRGraph): An undirected graph; edge weights are ignored.
+    mode (str): "exact", "sampled" or "parallel" (exact, in `n_jobs` processes).
+    n_pivots (int): Sources per connected component in the sampled mode.
+    seed (int): Seed of the pivot sampling.
+    n_jobs (int): Worker processes (joblib semantics, -1 for all CPUs). Defaults to 1,
+        or to all CPUs in the parallel mode.
+    confidence (float): Confidence level of the intervals in the sampled mode.
+    interval (str): "normal" (approximate) or "hoeffding" (guaranteed) intervals.
+    memory_budget_mb (int): Approximate memory for the per-batch BFS matrices.
+
+    Returns:
+    tuple: (centrality, half_width): DataFrames indexed by node id with the columns
+        `betweenness_centrality` and `closeness_centrality`, holding the values and
+        the half-widths of their confidence intervals (0 for exact values).
+    """
+    if graph.directed:
+        raise nx.NetworkXNotImplemented("not implemented for directed type")
+    if mode not in ("exact", "sampled", "parallel"):
+        raise ValueError(f"Unknown mode {mode}")
+    if interval not in ("normal", "hoeffding"):
+        raise ValueError(f"Unknown interval {interval}")
+    if mode == "parallel" and n_jobs == 1:
+        n_jobs = -1
+    n = graph.number_of_nodes
+    A = graph.adjacency()
+    n_components, labels = csgraph.connected_components(A, directed=False)
+    sizes = np.bincount(labels, minlength=n_components)
+
+    # sources of every component
+    rng = np.random.default_rng(seed)
+    order = np.argsort(labels, kind="stable")
+    members = np.split(order, np.cumsum(sizes)[:-1])
+    is_source = np.zeros(n, dtype=bool)
+    n_sources = sizes.copy()
+    for c, nodes in enumerate(members):
+        if mode == "sampled" and len(nodes) > n_pivots:
+            is_source[rng.choice(nodes, n_pivots, replace=False)] = True
+            n_sources[c] = n_pivots
+        else:
+            is_source[nodes] = True
+    sources = np.flatnonzero(is_source)
+
+    batch_size = max(1, int(memory_budget_mb * 2**20 / (48 * max(n, 1))))
+    n_tasks = 1 if n_jobs == 1 else 4 * effective_n_jobs(n_jobs)
+    tasks = [chunk for chunk in np.array_split(sources, n_tasks) if len(chunk)]
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_brandes)(A.indptr, A.indices, chunk, batch_size) for chunk in tasks
+    )
+    dependency_sum, dependency_sq, distance_sum, distance_sq = np.zeros((4, n))
+    source_distance = np.zeros(n)
+    eccentricity = np.full(n, np.inf)
+    for chunk, (dep_sum, dep_sq, dist_sum, dist_sq, source_dist, source_ecc) in zip(
+        tasks, results
+    ):
+        dependency_sum += dep_sum
+        dependency_sq += dep_sq
+        distance_sum += dist_sum
+        distance_sq += dist_sq
+        source_distance[chunk] = source_dist
+        eccentricity[chunk] = source_ecc
+    # twice the smallest eccentricity of the sources bounds the component diameter
+    diameter_bound = np.full(n_components, np.inf)
+    np.minimum.at(diameter_bound, labels, 2 * eccentricity)
+
+    # per node: the size of its component and the number of its sources
+    size = sizes[labels].astype(np.float64)
+    k = n_sources[labels].astype(np.float64)
+    z = stats.norm.ppf(0.5 + confidence / 2)
+
+    log_term = np.log(2 / (1 - confidence))
+
+    def estimate(total, total_sq, count, population, value_range):
+        # mean over the sampled sources with a confidence interval, scaled to the
+        # population total
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = total / count
+            if interval == "normal":
+                variance = (
+                    np.maximum(total_sq / count - mean**2, 0) * count / (count - 1)
+                )
+                correction = (population - count) / np.maximum(population - 1, 1)
+                half_width = z * np.sqrt(variance / count * correction)
+            else:
+                # Serfling's inequality: Hoeffding's for sampling without replacement
+                correction = 1 - (count - 1) / population
+                half_width = value_range * np.sqrt(correction * log_term / (2 * count))
+        mean = np.where(count > 0, mean, 0.0)
+        half_width = np.where((count > 1) & (count < population), half_width, 0.0)
+        return mean * population, half_width * population
+
+    # betweenness: the dependencies of all the sources of the component
+    betweenness, betweenness_hw = estimate(
+        dependency_sum, dependency_sq, k, size, size - 2
+    )
+    scale = 1 / ((n - 1) * (n - 2)) if n > 2 else 1.0
+    betweenness, betweenness_hw = betweenness * scale, betweenness_hw * scale
+
+    # closeness: the distances to the other nodes of the component; a source's own
+    # BFS gives its exact distances, which are symmetric
+    others = k - is_source
+    total_distance, total_distance_hw = estimate(
+        distance_sum, distance_sq, others, size - 1, diameter_bound[labels]
+    )
+    total_distance[is_source] = source_distance[is_source]
+    total_distance_hw[is_source] = 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        closeness = (size - 1) / total_distance * (size - 1) / max(n - 1, 1)
+        # first-order propagation of the interval of the total distance
+        closeness_hw = closeness * total_distance_hw / total_distance
+    closeness = np.where(total_distance > 0, closeness, 0.0)
+    closeness_hw = np.where(total_distance > 0, closeness_hw, 0.0)
+
+    index = pd.Index(graph.nodes)
+    centrality = pd.DataFrame(
+        {"betweenness_centrality": betweenness, "closeness_centrality": closeness},
+        index=index,
+    )
+    half_width = pd.DataFrame(
+        {
+            "betweenness_centrality": betweenness_hw,
+            "closeness_centrality": closeness_hw,
+        },
+        index=index,
+    )
+    return centrality, half_width
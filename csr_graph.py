@@ -0,0 +1,516 @@
+"""
+Array-backed graphs in compressed sparse row (CSR) form.
+
+A `CSRGraph` stores the adjacency of a graph as two integer arrays (`indptr` and
+`indices`) plus a table of the original node ids, so that whole-graph metrics can be
+computed with NumPy/SciPy instead of walking networkx's adjacency dicts. Undirected
+graphs are stored symmetrically: every edge appears once in the row of each of its
+endpoints (self-loops appear once). An optional `edge_order` array, aligned with
+`indices`, remembers the position of every edge in its source (e.g. the row of an
+edge list), so that `to_networkx` can rebuild the neighbour order of a networkx graph
+read from that source.
+"""
+
+import json
+import os
+import tempfile
+from dataclasses import dataclass, field
+from functools import cached_property
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy import stats
+from scipy.sparse import csgraph
+
+
+@dataclass
+class CSRGraph:
+    indptr: np.ndarray
+    indices: np.ndarray
+    nodes: np.ndarray
+    directed: bool = False
+    name: str = ""
+    edge_attrs: dict = field(default_factory=dict)
+    edge_order: np.ndarray = None
+
+    @property
+    def number_of_nodes(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def number_of_edges(self) -> int:
+        if self.directed:
+            return len(self.indices)
+        rows = np.repeat(np.arange(self.number_of_nodes), np.diff(self.indptr))
+        n_self_loops = int(np.count_nonzero(rows == self.indices))
+        return (len(self.indices) + n_self_loops) // 2
+
+    @cached_property
+    def node_index(self) -> dict:
+        """Mapping from the original node id to its row in the arrays."""
+        return {node: i for i, node in enumerate(self.nodes.tolist())}
+
+    def degree(self) -> np.ndarray:
+        """Out-degree (degree for undirected graphs) of every node, in index order."""
+        return np.diff(self.indptr)
+
+    def neighbors(self, i: int) -> np.ndarray:
+        """Indices of the (out-)neighbours of the node at index `i`."""
+        return self.indices[self.indptr[i] : self.indptr[i + 1]]
+
+    def adjacency(self, self_loops: bool = False) -> sp.csr_array:
+        """Binary adjacency matrix; parallel edges are collapsed into one entry."""
+        n = self.number_of_nodes
+        A = sp.csr_array(
+            (np.ones(len(self.indices), dtype=np.int64), self.indices, self.indptr),
+            shape=(n, n),
+        )
+        if not self_loops:
+            A.setdiag(0)
+            A.eliminate_zeros()
+        A.sum_duplicates()
+        A.data[:] = 1
+        return A
+
+    def to_networkx(self) -> nx.Graph:
+        """
+        Materialise the graph as a networkx (Di)Graph with the original node ids.
+
+        The edges are added in `edge_order` if the graph has one, and otherwise in
+        index order, and the neighbours of every node follow the same order; parallel
+        entries collapse into one edge, with the attributes of the last.
+        """
+        G = nx.DiGraph() if self.directed else nx.Graph()
+        if self.name:
+            G.name = self.name
+        n = self.number_of_nodes
+        indptr = np.asarray(self.indptr)
+        rows = np.repeat(np.arange(n), np.diff(indptr))
+        cols = np.asarray(self.indices, dtype=np.int64)
+        # every undirected edge once, from the row of its smaller end: adding the
+        # edges in this order puts every node's neighbours in index order
+        keep = np.arange(len(cols)) if self.directed else np.flatnonzero(rows <= cols)
+        if self.edge_order is not None:
+            keep = keep[np.argsort(np.asarray(self.edge_order)[keep], kind="stable")]
+        node_ids = np.asarray(self.nodes, dtype=object)
+        ends = [node_ids[rows[keep]].tolist(), node_ids[cols[keep]].tolist()]
+        attr_names = list(self.edge_attrs)
+        if attr_names:
+            values = [np.asarray(self.edge_attrs[a])[keep].tolist() for a in attr_names]
+            edges = zip(*ends, (dict(zip(attr_names, v)) for v in zip(*values)))
+        else:
+            edges = zip(*ends)
+        G.add_nodes_from(node_ids.tolist())
+        G.add_edges_from(edges)
+        return G
+
+
+def from_edge_arrays(
+    src: np.ndarray,
+    dst: np.ndarray,
+    nodes,
+    directed: bool = False,
+    name: str = "",
+    edge_attrs: dict = None,
+    edge_order: np.ndarray = None,
+) -> CSRGraph:
+    """
+    Build a CSRGraph from parallel arrays of source and target node indices.
+
+    Parameters:
+    src, dst (np.ndarray): Integer node indices (rows of `nodes`) of the edge ends.
+    nodes (sequence): The original node ids, in index order.
+    directed (bool): If False, every edge is stored in both directions.
+    name (str): The graph name.
+    edge_attrs (dict): Optional attribute name -> array aligned with `src`/`dst`.
+    edge_order (np.ndarray): Optional rank of every edge, aligned with `src`/`dst`,
+        in which `to_networkx` adds the edges (see `CSRGraph`).
+
+    Returns:
+    CSRGraph: The graph with the neighbours of every row sorted by index.
+    """
+    nodes = np.asarray(nodes)
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    edge_attrs = {k: np.asarray(v) for k, v in (edge_attrs or {}).items()}
+    if edge_order is not None:
+        edge_order = np.asarray(edge_order, dtype=np.int64)
+    if not directed:
+        mirror = src != dst
+        src, dst = (
+            np.concatenate([src, dst[mirror]]),
+            np.concatenate([dst, src[mirror]]),
+        )
+        edge_attrs = {k: np.concatenate([v, v[mirror]]) for k, v in edge_attrs.items()}
+        if edge_order is not None:
+            edge_order = np.concatenate([edge_order, edge_order[mirror]])
+    order = np.lexsort((dst, src))
+    n = len(nodes)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+    index_dtype = np.int32 if n < np.iinfo(np.int32).max else np.int64
+    return CSRGraph(
+        indptr=indptr,
+        indices=dst[order].astype(index_dtype),
+        nodes=nodes,
+        directed=directed,
+        name=name,
+        edge_attrs={k: v[order] for k, v in edge_attrs.items()},
+        edge_order=None if edge_order is None else edge_order[order],
+    )
+
+
+def from_networkx(G: nx.Graph, edge_attrs=(), nodelist=None) -> CSRGraph:
+    """
+    Convert a networkx graph to a CSRGraph.
+
+    Parameters:
+    G (networkx.Graph): The input graph. Parallel edges of multigraphs are kept.
+    edge_attrs (iterable of str): Numeric edge attributes to carry over; missing
+        values become NaN.
+    nodelist (list): Optional node order. Defaults to the order of G.nodes().
+
+    Returns:
+    CSRGraph: The array-backed graph.
+    """
+    nodes = list(G.nodes()) if nodelist is None else list(nodelist)
+    index = {node: i for i, node in enumerate(nodes)}
+    m = G.number_of_edges()
+    ends = np.fromiter(
+        (index[node] for edge in G.edges() for node in edge[:2]),
+        dtype=np.int64,
+        count=2 * m,
+    ).reshape(-1, 2)
+    attrs = {
+        a: np.fromiter(
+            (d.get(a, np.nan) for *_, d in G.edges(data=True)), dtype=float, count=m
+        )
+        for a in edge_attrs
+    }
+    node_ids = np.fromiter(nodes, dtype=object, count=len(nodes))
+    if all(isinstance(node, (int, np.integer)) for node in nodes):
+        node_ids = node_ids.astype(np.int64)
+    return from_edge_arrays(
+        ends[:, 0],
+        ends[:, 1],
+        node_ids,
+        directed=G.is_directed(),
+        name=G.name,
+        edge_attrs=attrs,
+    )
+
+
+def triangles(A: sp.csr_array) -> np.ndarray:
+    """Number of triangles through every node of a binary symmetric adjacency matrix."""
+    # (A @ A)[v, u] counts the common neighbours of v and u; keeping only the
+    # entries where v and u are adjacent and summing counts each triangle twice
+    return np.asarray((A @ A).multiply(A).sum(axis=1)).ravel() // 2
+
+
+def average_clustering(graph: CSRGraph) -> float:
+    """Same value as `nx.average_clustering`, computed with sparse matrix products."""
+    A = graph.adjacency()
+    if not graph.directed:
+        degree = np.asarray(A.sum(axis=1)).ravel()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            clustering = np.where(
+                degree > 1, 2 * triangles(A) / (degree * (degree - 1)), 0.0
+            )
+        # summed in node order, like networkx, so that the value is identical
+        return sum(clustering.tolist()) / len(clustering)
+    # directed clustering (Fagiolo, 2007), as implemented by networkx
+    S = A + A.T
+    directed_triangles = np.asarray((S @ S).multiply(S.T).sum(axis=1)).ravel()
+    total_degree = np.asarray(S.sum(axis=1)).ravel()
+    reciprocal_degree = np.asarray(A.multiply(A.T).sum(axis=1)).ravel()
+    denominator = 2 * (total_degree * (total_degree - 1) - 2 * reciprocal_degree)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        clustering = np.where(
+            directed_triangles > 0, directed_triangles / denominator, 0.0
+        )
+    return sum(clustering.tolist()) / len(clustering)
+
+
+def is_connected(graph: CSRGraph) -> bool:
+    """Same semantics as `nx.is_connected`."""
+    if graph.directed:
+        raise nx.NetworkXNotImplemented("not implemented for directed type")
+    if graph.number_of_nodes == 0:
+        raise nx.NetworkXPointlessConcept(
+            "Connectivity is undefined for the null graph."
+        )
+    n_components, _ = csgraph.connected_components(graph.adjacency(), directed=False)
+    return n_components == 1
+
+
+def _source_distance_sums(
+    A: sp.csr_array, sources: np.ndarray, chunk_size: int
+) -> np.ndarray:
+    """Sum of BFS distances from each source to every other node."""
+    sums = np.empty(len(sources), dtype=np.float64)
+    for start in range(0, len(sources), chunk_size):
+        chunk = sources[start : start + chunk_size]
+        distances = csgraph.shortest_path(
+            A, method="D", directed=False, unweighted=True, indices=chunk
+        )
+        sums[start : start + chunk_size] = distances.sum(axis=1)
+    return sums
+
+
+def average_shortest_path_length(
+    graph: CSRGraph,
+    n_sources: int = None,
+    seed: int = None,
+    chunk_size: int = 256,
+    confidence: float = 0.95,
+):
+    """
+    Average shortest path length of a connected undirected graph via sparse BFS.
+
+    Parameters:
+    graph (CSRGraph): The input graph; must be connected.
+    n_sources (int): If given, estimate the average from this many randomly
+        sampled BFS sources instead of running BFS from every node.
+    seed (int): Seed for the source sampling.
+    chunk_size (int): Number of BFS sources processed at once; bounds memory at
+        `chunk_size * number_of_nodes` distances.
+    confidence (float): Confidence level of the interval for the sampled estimate.
+
+    Returns:
+    tuple: (average, half_width). `half_width` is 0.0 for the exact computation,
+        otherwise the half-width of the normal-approximation confidence interval.
+    """
+    n = graph.number_of_nodes
+    if n < 2:
+        return 0.0, 0.0
+    A = graph.adjacency()
+    if n_sources is None or n_sources >= n:
+        total = _source_distance_sums(A, np.arange(n), chunk_size).sum()
+        return float(total / (n * (n - 1))), 0.0
+    rng = np.random.default_rng(seed)
+    sources = rng.choice(n, size=n_sources, replace=False)
+    # every source reaches the same number (n - 1) of targets, so the overall
+    # average is the mean over sources of the per-source averages
+    per_source = _source_distance_sums(A, sources, chunk_size) / (n - 1)
+    finite_population = np.sqrt((n - n_sources) / (n - 1))
+    standard_error = per_source.std(ddof=1) / np.sqrt(n_sources) * finite_population
+    z = stats.norm.ppf(0.5 + confidence / 2)
+    return float(per_source.mean()), float(z * standard_error)
+
+
+def save(graph: CSRGraph, directory: str, metadata: dict = None):
+    """
+    Write a CSRGraph to `directory` as one .npy file per array plus `meta.json`.
+
+    Node ids that are neither numbers nor strings are stored as a pickled object
+    array, which cannot be memory-mapped on load.
+    """
+    os.makedirs(directory, exist_ok=True)
+    arrays = {
+        "nodes.npy": graph.nodes,
+        "indptr.npy": graph.indptr,
+        "indices.npy": graph.indices,
+        **{f"edge_attr.{a}.npy": v for a, v in graph.edge_attrs.items()},
+    }
+    if graph.edge_order is not None:
+        arrays["edge_order.npy"] = graph.edge_order
+    for fn, values in arrays.items():
+        _save_array(os.path.join(directory, fn), values)
+    meta = {
+        "directed": graph.directed,
+        "name": graph.name,
+        "edge_attrs": list(graph.edge_attrs),
+        "edge_order": graph.edge_order is not None,
+    }
+    # meta.json is written last: its presence marks a complete cache entry
+    update_metadata(directory, {**meta, **(metadata or {})})
+
+
+def _save_array(path: str, values):
+    values = np.asarray(values)
+    if values.dtype == object and all(isinstance(v, str) for v in values.tolist()):
+        values = values.astype(str)
+    # write next to the target and rename, so that arrays of a previous
+    # version that are still memory-mapped are never overwritten in place
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, values, allow_pickle=True)
+    os.replace(path + ".tmp", path)
+
+
+def update_metadata(directory: str, metadata: dict):
+    """Replace the metadata of a saved graph without rewriting its arrays."""
+    fn = os.path.join(directory, "meta.json")
+    with open(fn + ".tmp", "w") as f:
+        json.dump(metadata, f)
+    os.replace(fn + ".tmp", fn)
+
+
+def load(directory: str, mmap_mode: str = "r"):
+    """
+    Open a CSRGraph written by `save`.
+
+    The arrays are memory-mapped (`np.memmap`) unless `mmap_mode` is None, so
+    opening even a large graph only reads the small metadata file.
+
+    Returns:
+    tuple: (CSRGraph, metadata dict)
+    """
+    with open(os.path.join(directory, "meta.json")) as f:
+        meta = json.load(f)
+
+    def load_array(name):
+        path = os.path.join(directory, name)
+        try:
+            return np.load(path, mmap_mode=mmap_mode)
+        except ValueError:
+            # object arrays are pickled and cannot be memory-mapped
+            return np.load(path, allow_pickle=True)
+
+    graph = CSRGraph(
+        indptr=load_array("indptr.npy"),
+        indices=load_array("indices.npy"),
+        nodes=load_array("nodes.npy"),
+        directed=meta["directed"],
+        name=meta["name"],
+        edge_attrs={a: load_array(f"edge_attr.{a}.npy") for a in meta["edge_attrs"]},
+        edge_order=load_array("edge_order.npy") if meta.get("edge_order") else None,
+    )
+    return graph, meta
+
+
+def _read_blocks(path: str, block_size: int, dtype=np.int64):
+    """Read a raw binary file in blocks (plain reads, so no pages stay mapped)."""
+    with open(path, "rb") as f:
+        while True:
+            block = np.fromfile(f, dtype=dtype, count=block_size)
+            if len(block) == 0:
+                return
+            yield block
+
+
+def _unique_sorted_keys(path: str, max_entries: int):
+    """
+    Yield the sorted unique int64 keys of a binary file, in increasing order, holding
+    at most about `max_entries` keys in memory at a time.
+
+    Keys are `row << 32 | col`. A file that is too large is split by row range into
+    smaller files, which are processed recursively.
+    """
+    n_keys = os.path.getsize(path) // np.dtype(np.int64).itemsize
+    if n_keys <= max_entries:
+        yield np.unique(np.fromfile(path, dtype=np.int64))
+        return
+    row_lo = min(int(b.min()) >> 32 for b in _read_blocks(path, max_entries))
+    row_hi = max(int(b.max()) >> 32 for b in _read_blocks(path, max_entries))
+    if row_lo == row_hi:
+        # a single row with more entries than the budget; nothing left to split
+        yield np.unique(np.fromfile(path, dtype=np.int64))
+        return
+    row_mid = (row_lo + row_hi + 1) // 2
+    for part, (lo, hi) in enumerate([(row_lo, row_mid), (row_mid, row_hi + 1)]):
+        path_part = f"{path}.{part}"
+        with open(path_part, "wb") as f:
+            for block in _read_blocks(path, max_entries):
+                rows = block >> 32
+                block[(rows >= lo) & (rows < hi)].tofile(f)
+        yield from _unique_sorted_keys(path_part, max_entries)
+        os.remove(path_part)
+
+
+def from_edge_chunks(
+    chunks,
+    directory: str,
+    directed: bool = False,
+    name: str = "",
+    max_entries: int = 1 << 22,
+    bucket_rows: int = 1 << 16,
+) -> CSRGraph:
+    """
+    Build a CSRGraph on disk from a stream of edge chunks, in bounded memory.
+
+    Node ids are mapped to a dense index in order of first appearance, duplicate
+    edges are dropped and the result is written to `directory` in the format of
+    `save`, without ever holding the whole edge list in memory.
+
+    Parameters:
+    chunks (iterable): Pairs of equally long arrays (source ids, target ids).
+    directory (str): Where to write the graph.
+    directed (bool): If False, every edge is stored in both directions.
+    name (str): The graph name.
+    max_entries (int): Maximal number of adjacency entries sorted at once.
+    bucket_rows (int): Number of consecutive rows whose entries are collected in
+        one temporary bucket file.
+
+    Returns:
+    CSRGraph: The memory-mapped graph.
+    """
+    os.makedirs(directory, exist_ok=True)
+    # node id -> index, in order of first appearance; it grows across the chunks
+    node_index = {}
+    id_dtype = None
+    with tempfile.TemporaryDirectory(dir=directory) as dir_buckets:
+        bucket_files = set()
+        for src_ids, dst_ids in chunks:
+            # interleave the two columns so that nodes are numbered like in networkx
+            ids = np.column_stack([src_ids, dst_ids]).ravel()
+            id_dtype = ids.dtype
+            # only the distinct ids of the chunk are looked up in the table
+            local_codes, uniques = pd.factorize(ids)
+            codes = np.fromiter(
+                (node_index.setdefault(u, len(node_index)) for u in uniques.tolist()),
+                dtype=np.int64,
+                count=len(uniques),
+            )[local_codes]
+            src, dst = codes[0::2].astype(np.int64), codes[1::2].astype(np.int64)
+            if not directed:
+                src, dst = np.concatenate([src, dst]), np.concatenate([dst, src])
+            keys = np.unique((src << 32) | dst)
+            buckets = (keys >> 32) // bucket_rows
+            bounds = np.flatnonzero(np.diff(buckets)) + 1
+            for part in np.split(keys, bounds):
+                bucket = int(part[0] >> 32) // bucket_rows
+                bucket_files.add(bucket)
+                with open(os.path.join(dir_buckets, f"{bucket}.bin"), "ab") as f:
+                    part.tofile(f)
+
+        nodes = np.array(list(node_index), dtype=object)
+        if id_dtype is not None and id_dtype.kind in "biuf":
+            nodes = nodes.astype(id_dtype)
+        n = len(nodes)
+        if n >= 1 << 32:
+            raise ValueError(f"Too many nodes ({n:,}) for 32-bit column keys")
+        # second pass: deduplicate every bucket (in row order) and count degrees
+        index_dtype = np.int32 if n < np.iinfo(np.int32).max else np.int64
+        degree = np.zeros(n, dtype=np.int64)
+        fn_columns = os.path.join(dir_buckets, "columns.bin")
+        with open(fn_columns, "wb") as f:
+            for bucket in sorted(bucket_files):
+                fn_bucket = os.path.join(dir_buckets, f"{bucket}.bin")
+                for keys in _unique_sorted_keys(fn_bucket, max_entries):
+                    rows, counts = np.unique(keys >> 32, return_counts=True)
+                    degree[rows] += counts
+                    (keys & 0xFFFFFFFF).astype(index_dtype).tofile(f)
+                os.remove(fn_bucket)
+
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(degree, out=indptr[1:])
+        # prepend the .npy header to the column indices
+        fn_indices = os.path.join(directory, "indices.npy")
+        with open(fn_indices + ".tmp", "wb") as f:
+            header = {
+                "descr": np.lib.format.dtype_to_descr(np.dtype(index_dtype)),
+                "fortran_order": False,
+                "shape": (int(indptr[-1]),),
+            }
+            np.lib.format.write_array_header_2_0(f, header)
+            for block in _read_blocks(fn_columns, max_entries, dtype=index_dtype):
+                block.tofile(f)
+        os.replace(fn_indices + ".tmp", fn_indices)
+
+    _save_array(os.path.join(directory, "indptr.npy"), indptr)
+    _save_array(os.path.join(directory, "nodes.npy"), nodes)
+    update_metadata(directory, {"directed": directed, "name": name, "edge_attrs": []})
+    graph, _ = load(directory)
+    return graph
@@ -1,16 +1,30 @@
+import hashlib
 import os
-import urllib
+import time
+import urllib.request
+from dataclasses import dataclass
 from datetime import timedelta
-from typing import Union
+from functools import cached_property
+from typing import Literal, Union
 
 import networkx as nx
+import numpy as np
 import pandas as pd
-from cachier import cachier
 import tempfile
 
+import caching
+import csr_graph
+import graph_views
+
 dir_this = os.path.dirname(os.path.abspath(__file__))
 dir_data = os.path.join(dir_this, "MLConnectedWorldBook", "data")
 assert os.path.exists(dir_data), f"Data directory {dir_data} not found"
+dir_graph_cache = os.environ.get(
+    "MLCW_GRAPH_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "MLConnectedWorld", "graphs"),
+)
+# bumped whenever the readers change what they store, so that old caches are rebuilt
+graph_cache_version = 2
 
 
 def get_rabbi_quotation_data() -> nx.DiGraph:
@@ -42,8 +56,17 @@ def get_rabbi_quotation_data() -> nx.DiGraph:
     return G
 
 
-def get_graph(dataset_name: str) -> Union[nx.Graph, list]:
-    """Load a graph from a data collection repository or list available datasets."""
+def get_graph(
+    dataset_name: str, lazy: bool = False, memory_budget_mb: int = None
+) -> Union[nx.Graph, csr_graph.CSRGraph, list]:
+    """Load a graph from a data collection repository or list available datasets.
+
+    With `lazy=True` the graph is returned as a memory-mapped `csr_graph.CSRGraph`;
+    call its `to_networkx()` method when a networkx graph is needed. With
+    `memory_budget_mb`, datasets from the web are ingested with the streaming
+    reader within roughly that much memory (use together with `lazy=True` for
+    graphs that do not fit in memory as networkx objects).
+    """
 
     data_names = {
         "ca-AstroPh": "ca-AstroPh.txt.gz",
@@ -51,6 +74,7 @@ def get_graph(dataset_name: str) -> Union[nx.Graph, list]:
         "ca-GrQc": "ca-GrQc.txt.gz",
         "ca-HepPh": "ca-HepPh.txt.gz",
         "ca-HepTh": "ca-HepTh.txt.gz",
+        "com-LiveJournal": "bigdata/communities/com-lj.ungraph.txt.gz",
         "rabbi_quotation_data": get_rabbi_quotation_data,
     }
 
@@ -58,10 +82,11 @@ def get_graph(dataset_name: str) -> Union[nx.Graph, list]:
         return list(data_names.keys())
 
     if callable(data_names.get(dataset_name, None)):
-        return data_names[dataset_name]()
+        G = data_names[dataset_name]()
+        return csr_graph.from_networkx(G, edge_attrs=["weight"]) if lazy else G
 
     try:
-        return load_graph_from_local(dataset_name)
+        return load_graph_from_local(dataset_name, lazy=lazy)
     except FileNotFoundError:
         pass
 
@@ -69,11 +94,106 @@ def get_graph(dataset_name: str) -> Union[nx.Graph, list]:
         raise ValueError(
             f"Dataset {dataset_name} not available. Choose from {list(data_names.keys())}."
         )
-    return load_graph_from_web(data_names[dataset_name])
+    return load_graph_from_web(
+        data_names[dataset_name], lazy=lazy, memory_budget_mb=memory_budget_mb
+    )
+
+
+def _file_fingerprint(path: str, previous: dict = None) -> dict:
+    """Size, modification time and SHA-1 of a file.
+
+    The hash is only recomputed if the size or mtime differ from `previous`.
+    """
+    stat = os.stat(path)
+    fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if previous and all(previous.get(k) == v for k, v in fingerprint.items()):
+        fingerprint["sha1"] = previous["sha1"]
+        return fingerprint
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha1.update(block)
+    fingerprint["sha1"] = sha1.hexdigest()
+    return fingerprint
+
+
+def _cached_csr_graph(source_path: str, build, cache_dir: str) -> csr_graph.CSRGraph:
+    """Open the binary cache of `source_path`, (re)building it if needed.
+
+    `build(directory)` must write the graph to `directory` (see `csr_graph.save`).
+    The cache is valid as long as it was written by the current readers
+    (`graph_cache_version`) and the source file has the same size and mtime, or, if
+    these changed, the same content hash.
+    """
+    try:
+        graph, meta = csr_graph.load(cache_dir)
+    except (OSError, ValueError, KeyError):
+        # missing or damaged cache entry
+        meta = None
+    if (
+        meta is not None
+        and "source" in meta
+        and meta.get("version") == graph_cache_version
+    ):
+        fingerprint = _file_fingerprint(source_path, meta["source"])
+        if fingerprint["sha1"] == meta["source"]["sha1"]:
+            if fingerprint != meta["source"]:
+                # the file was touched but not changed, remember the new mtime
+                csr_graph.update_metadata(cache_dir, {**meta, "source": fingerprint})
+            return graph
+    else:
+        fingerprint = _file_fingerprint(source_path)
+    build(cache_dir)
+    graph, meta = csr_graph.load(cache_dir)
+    csr_graph.update_metadata(
+        cache_dir, {**meta, "source": fingerprint, "version": graph_cache_version}
+    )
+    return graph
+
+
+def _graph_cache_dir(source_path: str) -> str:
+    path_hash = hashlib.sha1(os.path.abspath(source_path).encode()).hexdigest()[:10]
+    return os.path.join(dir_graph_cache, f"{os.path.basename(source_path)}-{path_hash}")
+
+
+def _read_csv_edgelist(dataset_path: str, directed: bool) -> csr_graph.CSRGraph:
+    df = pd.read_csv(dataset_path)
+    assert "src" in df.columns, f"Column 'src' not found in {dataset_path}"
+    assert "dst" in df.columns, f"Column 'dst' not found in {dataset_path}"
+    edge_attr = [c for c in df.columns if c not in ["src", "dst"]]
+    # nodes are numbered in order of appearance, as nx.from_pandas_edgelist does
+    codes, nodes = pd.factorize(df[["src", "dst"]].to_numpy().ravel())
+    df_edges = pd.DataFrame({"src": codes[0::2], "dst": codes[1::2]})
+    for c in edge_attr:
+        df_edges[c] = df[c].to_numpy()
+    if directed:
+        key = ["src", "dst"]
+    else:
+        df_edges["u"] = df_edges[["src", "dst"]].min(axis=1)
+        df_edges["v"] = df_edges[["src", "dst"]].max(axis=1)
+        key = ["u", "v"]
+    # a repeated edge keeps the attributes of its last row but the neighbour
+    # position of its first, like in networkx
+    df_edges["rank"] = df_edges.groupby(key, sort=False).ngroup()
+    df_edges = df_edges.drop_duplicates(subset=key, keep="last")
+    return csr_graph.from_edge_arrays(
+        df_edges["src"].to_numpy(),
+        df_edges["dst"].to_numpy(),
+        np.asarray(nodes),
+        directed=directed,
+        edge_attrs={c: df_edges[c].to_numpy() for c in edge_attr},
+        edge_order=df_edges["rank"].to_numpy(),
+    )
+
 
+def load_graph_from_local(
+    dataset_name: str, lazy: bool = False
+) -> Union[nx.Graph, csr_graph.CSRGraph]:
+    """Load a graph from a local file.
 
-def load_graph_from_local(dataset_name: str) -> nx.Graph:
-    """Load a graph from a local file."""
+    The parsed graph is cached in a binary, memory-mapped format (see
+    `csr_graph.save`) next to the other graph caches in `dir_graph_cache`.
+    """
 
     for extension in ["", ".csv", ".csv.gz"]:
         dataset_path = os.path.join(dir_data, dataset_name + extension)
@@ -83,34 +203,104 @@ def load_graph_from_local(dataset_name: str) -> nx.Graph:
                 if d in dataset_name:
                     directed = True
                     break
-            df = pd.read_csv(dataset_path)
-            assert "src" in df.columns, f"Column 'src' not found in {dataset_path}"
-            assert "dst" in df.columns, f"Column 'dst' not found in {dataset_path}"
-            edge_attr = [c for c in df.columns if c not in ["src", "dst"]]
-            G = nx.from_pandas_edgelist(
-                df,
-                source="src",
-                target="dst",
-                edge_attr=edge_attr,
-                create_using=nx.DiGraph if directed else nx.Graph,
+            graph = _cached_csr_graph(
+                dataset_path,
+                lambda d: csr_graph.save(_read_csv_edgelist(dataset_path, directed), d),
+                _graph_cache_dir(dataset_path),
             )
-            return G
+            return graph if lazy else graph.to_networkx()
     raise FileNotFoundError("Local dataset file not found")
 
 
-@cachier(stale_after=timedelta(days=100))
-def load_graph_from_web(filename: str) -> nx.Graph:
-    """Download and load a graph from the web."""
+def _read_snap_edgelist(fn: str) -> csr_graph.CSRGraph:
+    df = pd.read_csv(
+        fn, comment="#", sep=r"\s+", header=None, usecols=[0, 1], dtype=np.int64
+    )
+    codes, nodes = pd.factorize(df.to_numpy().ravel())
+    df_edges = pd.DataFrame({"src": codes[0::2], "dst": codes[1::2]})
+    df_edges["u"] = df_edges[["src", "dst"]].min(axis=1)
+    df_edges["v"] = df_edges[["src", "dst"]].max(axis=1)
+    df_edges = df_edges.drop_duplicates(subset=["u", "v"])
+    # the edges are added in the order of the file, like nx.read_edgelist does
+    return csr_graph.from_edge_arrays(
+        df_edges["src"].to_numpy(),
+        df_edges["dst"].to_numpy(),
+        np.asarray(nodes),
+        edge_order=np.arange(len(df_edges)),
+    )
+
+
+def stream_edgelist(
+    fn: str,
+    directory: str,
+    directed: bool = False,
+    memory_budget_mb: int = 512,
+    nodetype=int,
+) -> csr_graph.CSRGraph:
+    """Convert a (possibly gzipped) whitespace-separated edge list to a CSR graph on disk.
+
+    The file is decompressed and parsed in chunks and the graph is written directly
+    to `directory` (see `csr_graph.from_edge_chunks`), so that edge lists larger than
+    the available memory can be loaded. Apart from the node-id table, peak memory
+    stays roughly within `memory_budget_mb`. The node-id table needs about 100
+    bytes per node on top of that. Unlike the in-memory reader, the streamed graph
+    does not remember the order of the edges in the file, so `to_networkx` lists
+    the neighbours of every node in index order.
+    """
+    budget = int(memory_budget_mb * 2**20)
+    # measured peak: about 250 bytes per parsed line (ids, codes and the sorted
+    # keys of both edge directions) and 50 bytes per adjacency entry when
+    # deduplicating
+    reader = pd.read_csv(
+        fn,
+        comment="#",
+        sep=r"\s+",
+        header=None,
+        usecols=[0, 1],
+        dtype=nodetype,
+        chunksize=max(budget // 250, 1024),
+    )
+    chunks = ((df[0].to_numpy(), df[1].to_numpy()) for df in reader)
+    return csr_graph.from_edge_chunks(
+        chunks, directory, directed=directed, max_entries=max(budget // 50, 1024)
+    )
+
+
+def load_graph_from_web(
+    filename: str, lazy: bool = False, memory_budget_mb: int = None
+) -> Union[nx.Graph, csr_graph.CSRGraph]:
+    """Download and load a graph from the web.
+
+    The downloaded file is kept in `dir_graph_cache` and re-downloaded after 100
+    days; the parsed graph is cached in a binary, memory-mapped format. If
+    `memory_budget_mb` is given, the file is parsed with the streaming reader
+    (`stream_edgelist`) instead of being loaded into memory at once.
+    """
     url_base = "https://snap.stanford.edu/data/"
     url = url_base + filename
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        fn = os.path.join(tmpdirname, "graph.txt.gz")
-        urllib.request.urlretrieve(url, fn)
-        G = nx.read_edgelist(fn, nodetype=int)
-    return G
+    cache_dir = os.path.join(dir_graph_cache, "web", filename)
+    fn = os.path.join(cache_dir, os.path.basename(filename))
+    if (
+        not os.path.exists(fn)
+        or time.time() - os.path.getmtime(fn) > timedelta(days=100).total_seconds()
+    ):
+        os.makedirs(cache_dir, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=cache_dir) as tmpdirname:
+            fn_download = os.path.join(tmpdirname, os.path.basename(filename))
+            urllib.request.urlretrieve(url, fn_download)
+            os.replace(fn_download, fn)
 
+    def build(directory):
+        if memory_budget_mb is None:
+            csr_graph.save(_read_snap_edgelist(fn), directory)
+        else:
+            stream_edgelist(fn, directory, memory_budget_mb=memory_budget_mb)
 
-@cachier(stale_after=timedelta(days=100))
+    graph = _cached_csr_graph(fn, build, os.path.join(cache_dir, "csr"))
+    return graph if lazy else graph.to_networkx()
+
+
+@caching.cached(stale_after=timedelta(days=100))
 def load_dataset_from_web(filename: str, sep="\t") -> pd.DataFrame:
     """Download and load a dataset from the web."""
     url_base = "https://snap.stanford.edu/data/"
@@ -142,31 +332,320 @@ def load_dataset_from_local(dataset_name: str) -> pd.DataFrame:
     raise FileNotFoundError("Local dataset file not found. Tried: " + ", ".join(tried))
 
 
-def get_info(G: nx.Graph):
-    """Get info about a graph"""
+def get_info(
+    G: nx.Graph,
+    backend: Literal["networkx", "csr"] = "networkx",
+    n_path_sources: int = None,
+    seed: int = None,
+):
+    """Get info about a graph
+
+    With `backend="csr"` the graph is converted once into a SciPy CSR adjacency
+    matrix and clustering and path lengths are computed with sparse matrix
+    operations. `n_path_sources` (csr backend only) estimates the average shortest
+    path length from that many sampled BFS sources and adds a 95% confidence
+    interval to the report.
+    """
+    if backend == "networkx":
+        average_clustering = nx.average_clustering(G)
+        connected = nx.is_connected(G)
+    elif backend == "csr":
+        G_csr = csr_graph.from_networkx(G)
+        average_clustering = csr_graph.average_clustering(G_csr)
+        connected = csr_graph.is_connected(G_csr)
+    else:
+        raise ValueError(f"Unknown backend {backend}. Choose from networkx, csr.")
+
     ret = []
     ret.append(f"Name: {G.name}. Directed: {G.is_directed()}")
     ret.append(f"Number of nodes: {G.number_of_nodes():,d}")
     ret.append(f"Number of edges: {G.number_of_edges():,d}")
-    ret.append(f"Average clustering: {nx.average_clustering(G)}")
-    if nx.is_connected(G):
-        ret.append(
-            f"Average shortest path length: {nx.average_shortest_path_length(G)}"
-        )
+    ret.append(f"Average clustering: {average_clustering}")
+    if connected:
+        if backend == "networkx":
+            path_length = nx.average_shortest_path_length(G)
+        else:
+            path_length, half_width = csr_graph.average_shortest_path_length(
+                G_csr, n_sources=n_path_sources, seed=seed
+            )
+            if n_path_sources is not None:
+                path_length = f"{path_length} (95% CI \u00b1{half_width:.4f}, {n_path_sources:,d} sampled sources)"
+        ret.append(f"Average shortest path length: {path_length}")
     else:
         ret.append("Graph is not connected")
     return "\n".join(ret)
 
 
-def get_connected_component_subgraphs(G: nx.Graph) -> list:
-    """Get connected components of a graph"""
-    if nx.is_directed(G):
-        tmp = G.to_undirected()
-    else:
-        tmp = G
-    components = [G.subgraph(c).copy() for c in nx.connected_components(tmp)]
-    # sort by node count
-    components.sort(key=lambda x: x.number_of_nodes(), reverse=True)
-    for i in range(len(components)):
-        components[i].name = f"Component {i+1} of {G.name}"
-    return components
+def get_connected_component_subgraphs(G: nx.Graph, copy: bool = True) -> list:
+    """Get connected components of a graph
+
+    The components are sorted by node count, largest first. With `copy=False` they are
+    read-only views that share the data of `G` instead of independent copies. To
+    enumerate components lazily, or to get only the largest ones, use
+    `graph_views.ConnectedComponents`.
+    """
+    components = graph_views.ConnectedComponents(G)
+    return [
+        components.subgraph(i, copy=copy, name=f"Component {i+1} of {G.name}")
+        for i in range(len(components))
+    ]
+
+
+@dataclass
+class TemporalGraph:
+    """
+    A graph of timestamped edge events, sorted by time, that serves snapshots for
+    arbitrary time windows.
+
+    An event links `source` to `target` from `time` on; if it has an end, it lasts
+    until `last` (otherwise `last` equals `time`). The snapshot of a window [start,
+    stop) has an edge for every pair with at least one event that overlaps the window
+    (time < stop and last >= start), so a cumulative snapshot (no start) holds every
+    edge that appeared before `stop`. The events are sorted by time and, lazily, by
+    last time, so the events of a window and the edges that appear or disappear
+    between two windows are found by binary search.
+    """
+
+    source: np.ndarray
+    target: np.ndarray
+    time: np.ndarray
+    last: np.ndarray
+    nodes: np.ndarray
+    directed: bool = False
+    name: str = ""
+
+    @cached_property
+    def _has_ends(self) -> bool:
+        return not np.array_equal(self.time, self.last)
+
+    @cached_property
+    def _by_last(self) -> tuple:
+        """The event indices sorted by last time, and the sorted last times."""
+        order = np.argsort(self.last, kind="stable")
+        return order, self.last[order]
+
+    @cached_property
+    def _pairs(self) -> tuple:
+        """
+        The pair (edge) of every event, and the ends of the pairs, numbered by their
+        first event.
+        """
+        u, v = self.source, self.target
+        if not self.directed:
+            u, v = np.minimum(u, v), np.maximum(u, v)
+        _, first, pair = np.unique(
+            u * len(self.nodes) + v, return_index=True, return_inverse=True
+        )
+        # renumber the pairs in the order of their first event
+        rank = np.empty(len(first), dtype=np.int64)
+        rank[np.argsort(first, kind="stable")] = np.arange(len(first))
+        first = np.sort(first)
+        return rank[pair], u[first], v[first]
+
+    def window(self, start=None, stop=None) -> np.ndarray:
+        """Indices of the events that overlap the window [start, stop), in time order."""
+        hi = len(self.time) if stop is None else np.searchsorted(self.time, stop)
+        if start is None:
+            return np.arange(hi)
+        if not self._has_ends:
+            return np.arange(np.searchsorted(self.time, start), hi)
+        return np.flatnonzero(self.last[:hi] >= start)
+
+    def snapshot(self, stop=None, start=None, lazy: bool = False):
+        """
+        The graph of the events that overlap the window [start, stop).
+
+        Only the nodes with at least one edge in the window are included, in the
+        order of their first event. Edges carry the number of events in the window as
+        `weight` and the time of the first of them as `first_time`.
+
+        Parameters:
+        stop: End of the window (exclusive); defaults to after the last event.
+        start: Start of the window; defaults to before the first event.
+        lazy (bool): Return a `csr_graph.CSRGraph` instead of a networkx graph.
+        """
+        events = self.window(start, stop)
+        pair, pair_u, pair_v = self._pairs
+        pairs, first, weight = np.unique(
+            pair[events], return_index=True, return_counts=True
+        )
+        ends = np.column_stack([pair_u[pairs], pair_v[pairs]]).ravel()
+        node_order = pd.unique(
+            np.column_stack([self.source[events], self.target[events]]).ravel()
+        )
+        index = np.full(len(self.nodes), -1, dtype=np.int64)
+        index[node_order] = np.arange(len(node_order))
+        graph = csr_graph.from_edge_arrays(
+            index[ends[0::2]],
+            index[ends[1::2]],
+            self.nodes[node_order],
+            directed=self.directed,
+            name=self.name,
+            edge_attrs={"weight": weight, "first_time": self.time[events][first]},
+        )
+        return graph if lazy else graph.to_networkx()
+
+    def delta(self, start, stop) -> pd.DataFrame:
+        """
+        The edges whose first event is in [start, stop), in the order of appearance.
+
+        Returns:
+        pd.DataFrame: The columns `source`, `target`, `first_time` and `weight` (the
+            number of events of the edge over the whole time range).
+        """
+        pair, pair_u, pair_v = self._pairs
+        first_time = self.time[np.unique(pair, return_index=True)[1]]
+        lo, hi = np.searchsorted(first_time, [start, stop])
+        return pd.DataFrame(
+            {
+                "source": self.nodes[pair_u[lo:hi]],
+                "target": self.nodes[pair_v[lo:hi]],
+                "first_time": first_time[lo:hi],
+                "weight": np.bincount(pair, minlength=len(pair_u))[lo:hi],
+            }
+        )
+
+    def sweep(self, cutoffs, window=None) -> pd.DataFrame:
+        """
+        Metrics of the snapshots ending at every cutoff, updated incrementally.
+
+        The snapshots are cumulative, or cover [cutoff - window, cutoff) if `window`
+        is given. Between consecutive cutoffs only the events that enter or leave the
+        window are processed, so a sweep over many cutoffs costs about as much as
+        building the last snapshot. The metrics are those of the undirected simple
+        graph of the snapshot (self-loops count as edges but not in triangles).
+
+        Returns:
+        pd.DataFrame: Indexed by cutoff, with the columns n_nodes, n_edges,
+            average_degree, n_triangles, transitivity (as `nx.transitivity`),
+            n_new_edges, n_closing_edges (new edges that closed at least one
+            triangle when they appeared, in time order) and n_removed_edges.
+        """
+        pair, pair_u, pair_v = self._pairs
+        by_last, last_sorted = self._by_last
+        n = len(self.nodes)
+        active = np.zeros(len(pair_u), dtype=np.int64)
+        incident = np.zeros(n, dtype=np.int64)
+        neighbors = [set() for _ in range(n)]
+        n_edges = n_triangles = n_wedges = 0
+        added_to = removed_to = 0
+        rows = []
+        cutoffs = list(cutoffs)
+        if any(b < a for a, b in zip(cutoffs, cutoffs[1:])):
+            raise ValueError("cutoffs must be in ascending order")
+        for cutoff in cutoffs:
+            added_from, added_to = added_to, int(np.searchsorted(self.time, cutoff))
+            removed_from = removed_to
+            if window is not None:
+                removed_to = max(
+                    removed_from, int(np.searchsorted(last_sorted, cutoff - window))
+                )
+            # events that enter and leave the window between two cutoffs are skipped
+            removed = by_last[removed_from:removed_to]
+            added = np.arange(added_from, added_to)
+            if window is not None:
+                added = added[self.last[added] >= cutoff - window]
+            changes = [(removed[removed < added_from], -1), (added, 1)]
+            n_new = n_closing = n_removed = 0
+            for events, sign in changes:
+                pairs, first, counts = np.unique(
+                    pair[events], return_index=True, return_counts=True
+                )
+                before = active[pairs]
+                active[pairs] += sign * counts
+                if sign > 0:
+                    changed = pairs[(before == 0)][np.argsort(first[before == 0])]
+                else:
+                    changed = pairs[active[pairs] == 0]
+                for u, v in zip(pair_u[changed].tolist(), pair_v[changed].tolist()):
+                    n_edges += sign
+                    incident[u] += sign
+                    if u == v:
+                        continue
+                    incident[v] += sign
+                    if sign > 0:
+                        common = len(neighbors[u] & neighbors[v])
+                        n_closing += common > 0
+                        n_wedges += len(neighbors[u]) + len(neighbors[v])
+                        neighbors[u].add(v)
+                        neighbors[v].add(u)
+                    else:
+                        neighbors[u].discard(v)
+                        neighbors[v].discard(u)
+                        common = len(neighbors[u] & neighbors[v])
+                        n_wedges -= len(neighbors[u]) + len(neighbors[v])
+                    n_triangles += sign * common
+                if sign > 0:
+                    n_new = len(changed)
+                else:
+                    n_removed = len(changed)
+            n_nodes = int(np.count_nonzero(incident))
+            rows.append(
+                {
+                    "n_nodes": n_nodes,
+                    "n_edges": n_edges,
+                    "average_degree": 2 * n_edges / n_nodes if n_nodes else 0.0,
+                    "n_triangles": n_triangles,
+                    "transitivity": 3 * n_triangles / n_wedges if n_triangles else 0.0,
+                    "n_new_edges": n_new,
+                    "n_closing_edges": n_closing,
+                    "n_removed_edges": n_removed,
+                }
+            )
+        return pd.DataFrame(rows, index=pd.Index(cutoffs, name="cutoff"))
+
+
+def temporal_graph_from_edgelist(
+    df: pd.DataFrame,
+    source: str = "source",
+    target: str = "target",
+    time: str = "time",
+    end: str = None,
+    directed: bool = False,
+    name: str = "",
+) -> TemporalGraph:
+    """
+    Build a TemporalGraph from a DataFrame of edge events.
+
+    Parameters:
+    df (pd.DataFrame): One row per event.
+    source, target, time (str): The columns of the ends and of the event time
+        (numbers or datetimes).
+    end (str): Optional column of the end times; missing values mean no end.
+    directed (bool): Whether (u, v) and (v, u) are different edges.
+    name (str): The graph name.
+    """
+    codes, nodes = pd.factorize(
+        np.column_stack([df[source].to_numpy(), df[target].to_numpy()]).ravel()
+    )
+    times = df[time]
+    last = times if end is None else np.maximum(times, df[end].fillna(times))
+    order = np.argsort(times.to_numpy(), kind="stable")
+    return TemporalGraph(
+        source=codes[0::2][order].astype(np.int64),
+        target=codes[1::2][order].astype(np.int64),
+        time=times.to_numpy()[order],
+        last=np.asarray(last)[order],
+        nodes=np.asarray(nodes),
+        directed=directed,
+        name=name,
+    )
+
+
+def load_temporal_graph(
+    filename: str = "email-Eu-core-temporal.txt.gz",
+    time_unit: int = 24 * 3600,
+    directed: bool = False,
+) -> TemporalGraph:
+    """
+    Load a SNAP temporal edge list (source, target, timestamp in seconds).
+
+    The times are converted to whole units of `time_unit` seconds (days by default,
+    like the `first_day` of the link-prediction chapter).
+    """
+    df = load_dataset_from_web(filename, sep=" ")
+    df.columns = ["source", "target", "time"]
+    df["time"] = df["time"] // time_unit
+    return temporal_graph_from_edgelist(
+        df, directed=directed, name=filename.split(".")[0]
+    )
@@ -0,0 +1,225 @@
+"""
+Radius-1 ego-network features of every node, computed from CSR arrays.
+
+The ego graph of a node v consists of v, its k neighbours N and the edges among them.
+Every neighbour is adjacent to v, so the ego graph is determined by the adjacency S
+induced among N, and the ego features follow from a few quantities of S:
+
+- closeness of v is 1 (0 for an isolated node);
+- the betweenness of v is the sum over the non-adjacent pairs {a, b} of N of
+  1 / (1 + number of common neighbours of a and b in S), divided by k(k-1)/2;
+- clustering with and without v follows from the degrees and triangle counts in S;
+- density follows from k and the number of edges of S;
+- diameter is 1 if N is a clique and 2 otherwise; without v, it is the diameter of S,
+  which is 2 whenever every non-adjacent pair of S has a common neighbour (exact BFS
+  on S is only needed for the remaining nodes).
+
+The induced adjacencies of all the ego graphs of a batch of nodes are assembled into
+one block-diagonal sparse matrix, whose rows are the entries of the CSR adjacency (the
+pairs (v, u)), so that these quantities are computed with a few sparse matrix products
+for the whole batch.
+"""
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse import csgraph
+
+import csr_graph
+
+EGO_FEATURE_COLUMNS = [
+    "betweenness_ego",
+    "closeness_ego",
+    "delta_clustering_ego",
+    "delta_diameter_ego",
+    "n_components_no_self_ego",
+    "delta_density_ego",
+]
+
+
+def _density(n_edges: np.ndarray, n_nodes: np.ndarray) -> np.ndarray:
+    """`nx.density` of undirected graphs with the given numbers of edges and nodes."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        density = n_edges / (n_nodes * (n_nodes - 1)) * 2
+    return np.where((n_edges == 0) | (n_nodes <= 1), 0.0, density)
+
+
+def _clustering(triangles: np.ndarray, degree: np.ndarray) -> np.ndarray:
+    """`nx.clustering` of nodes with the given triangle counts and degrees."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        clustering = 2 * triangles / (degree * (degree - 1))
+    return np.where(triangles == 0, 0.0, clustering)
+
+
+def _batch_features(A: sp.csr_array, egos: np.ndarray) -> dict:
+    """Per-ego statistics of the induced neighbour adjacencies of `egos`."""
+    n = A.shape[0]
+    indptr = A.indptr.astype(np.int64)
+    k = np.diff(indptr)[egos]
+    n_egos = len(egos)
+
+    # the rows of the block-diagonal matrix: the neighbours of every ego, in order
+    ego_start = np.concatenate([[0], np.cumsum(k)])
+    n_entries = int(ego_start[-1])
+    owner = np.repeat(np.arange(n_egos), k)
+    entry = indptr[egos][owner] + np.arange(n_entries) - ego_start[owner]
+    neighbor = A.indices[entry].astype(np.int64)
+
+    # all pairs of neighbours of the same ego ...
+    rank = np.arange(n_entries) - ego_start[owner]
+    pair_counts = k[owner] - 1 - rank
+    n_pairs = int(pair_counts.sum())
+    first = np.repeat(np.arange(n_entries), pair_counts)
+    pair_start = np.cumsum(pair_counts) - pair_counts
+    second = first + 1 + np.arange(n_pairs) - np.repeat(pair_start, pair_counts)
+    # ... that are adjacent; the keys of the sorted CSR entries are sorted
+    row = np.repeat(np.arange(n, dtype=np.int64), np.diff(indptr))
+    keys = row * n + A.indices
+    pair_keys = neighbor[first] * n + neighbor[second]
+    found = np.minimum(np.searchsorted(keys, pair_keys), len(keys) - 1)
+    adjacent = keys[found] == pair_keys
+    first, second = first[adjacent], second[adjacent]
+    S = sp.csr_array(
+        (
+            np.ones(2 * len(first), dtype=np.int64),
+            (np.concatenate([first, second]), np.concatenate([second, first])),
+        ),
+        shape=(n_entries, n_entries),
+    )
+
+    degree = np.asarray(S.sum(axis=1)).ravel()
+    # (S @ S)[a, b] is the number of common neighbours of a and b within the ego
+    common = S @ S
+    triangles = np.asarray(common.multiply(S).sum(axis=1)).ravel() // 2
+    # common neighbours of the non-adjacent pairs that have at least one
+    non_adjacent = (common - common.multiply(S)).tocsr()
+    non_adjacent.setdiag(0)
+    non_adjacent.eliminate_zeros()
+    non_adjacent_owner = np.repeat(owner, np.diff(non_adjacent.indptr))
+    values = non_adjacent.data.astype(np.float64)
+
+    n_edges = np.bincount(owner, degree, minlength=n_egos).astype(np.int64) // 2
+    n_pairs_at_two = (
+        np.bincount(non_adjacent_owner, minlength=n_egos).astype(np.int64) // 2
+    )
+    # every pair counts twice: (a, b) and (b, a)
+    shared_paths = (
+        np.bincount(non_adjacent_owner, values / (1 + values), minlength=n_egos) / 2
+    )
+
+    _, labels = csgraph.connected_components(S, directed=False)
+    _, first_of_label = np.unique(labels, return_index=True)
+    n_components = np.bincount(owner[first_of_label], minlength=n_egos)
+
+    clustering_with_ego = _clustering(degree + triangles, degree + 1)
+    clustering_without_ego = _clustering(triangles, degree)
+    # the sums run over the neighbours in CSR order, one ego after another
+    sum_with_ego = np.bincount(owner, clustering_with_ego, minlength=n_egos)
+    sum_without_ego = np.bincount(owner, clustering_without_ego, minlength=n_egos)
+
+    n_pairs_total = k * (k - 1) // 2
+    diameter_without_ego = np.where(
+        n_components > 1,
+        k + 1,
+        np.where(
+            k <= 1,
+            0,
+            np.where(
+                n_edges == n_pairs_total,
+                1,
+                np.where(n_pairs_at_two == n_pairs_total - n_edges, 2, -1),
+            ),
+        ),
+    )
+    for i in np.flatnonzero(diameter_without_ego < 0):
+        block = S[ego_start[i] : ego_start[i + 1]][:, ego_start[i] : ego_start[i + 1]]
+        distances = csgraph.shortest_path(block, directed=False, unweighted=True)
+        diameter_without_ego[i] = int(distances.max())
+
+    return dict(
+        k=k,
+        n_edges=n_edges,
+        shared_paths=shared_paths,
+        n_components=n_components,
+        sum_with_ego=sum_with_ego,
+        sum_without_ego=sum_without_ego,
+        diameter_without_ego=diameter_without_ego,
+    )
+
+
+def ego_graph_features(
+    graph: csr_graph.CSRGraph, nodes=None, max_pairs: int = 1 << 22
+) -> pd.DataFrame:
+    """
+    Same features as `compute_ego_graph_features_node` of the node-based dataset
+    script, for `nodes` (default: all nodes) of an undirected graph.
+
+    Parameters:
+    graph (csr_graph.CSRGraph): The graph.
+    nodes (list): Node ids; defaults to all nodes.
+    max_pairs (int): Nodes are processed in batches with about this many pairs of
+        neighbours in total, which bounds the memory use.
+
+    Returns:
+    pandas.DataFrame: One row per node, indexed by `node_id`. The values equal the
+        networkx computation up to the rounding of floating-point sums.
+    """
+    if graph.directed:
+        raise nx.NetworkXNotImplemented("not implemented for directed type")
+    n = graph.number_of_nodes
+    if nodes is None:
+        egos = np.arange(n, dtype=np.int64)
+    else:
+        egos = np.array([graph.node_index[v] for v in nodes], dtype=np.int64)
+
+    A = graph.adjacency()
+    A.sort_indices()
+    # self-loops do not change paths or clustering, but count as edges for density
+    rows = np.repeat(np.arange(n), np.diff(graph.indptr))
+    loops = np.zeros(n, dtype=np.int64)
+    loops[rows[rows == graph.indices]] = 1
+    neighbor_loops = A @ loops
+
+    batches = []
+    cost = np.cumsum(np.diff(A.indptr.astype(np.int64))[egos] ** 2)
+    start = 0
+    while start < len(egos):
+        done = cost[start - 1] if start else 0
+        stop = max(start + 1, int(np.searchsorted(cost, done + max_pairs, "right")))
+        batches.append(_batch_features(A, egos[start:stop]))
+        start = stop
+    if not batches:
+        batches.append(_batch_features(A, egos))
+    stats = {
+        key: np.concatenate([batch[key] for batch in batches]) for key in batches[0]
+    }
+    k = stats["k"]
+    n_edges = stats["n_edges"]
+    n_pairs = k * (k - 1) // 2
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        betweenness = np.where(
+            k > 1, (n_pairs - n_edges - stats["shared_paths"]) / n_pairs, 0.0
+        )
+        clustering_ego = _clustering(n_edges, k)
+        clustering_before = (clustering_ego + stats["sum_with_ego"]) / (k + 1)
+        clustering_after = np.where(k > 0, stats["sum_without_ego"] / k, 0.0)
+    diameter_before = np.where(k == 0, 0, np.where(n_edges == n_pairs, 1, 2))
+    diameter_after = np.where(k == 0, 0, stats["diameter_without_ego"])
+    loops_without_ego = neighbor_loops[egos]
+    density_before = _density(n_edges + k + loops[egos] + loops_without_ego, k + 1)
+    density_after = _density(n_edges + loops_without_ego, k)
+
+    ret = pd.DataFrame(
+        {
+            "betweenness_ego": betweenness,
+            "closeness_ego": np.where(k > 0, 1.0, 0.0),
+            "delta_clustering_ego": clustering_after - clustering_before,
+            "delta_diameter_ego": (diameter_after - diameter_before).astype(np.int64),
+            "n_components_no_self_ego": stats["n_components"].astype(np.int64),
+            "delta_density_ego": density_after - density_before,
+        },
+        index=pd.Index(graph.nodes[egos], name="node_id"),
+    )
+    return ret[EGO_FEATURE_COLUMNS]
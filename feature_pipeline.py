@@ -0,0 +1,356 @@
+"""
+A small runner for graph feature pipelines.
+
+A pipeline is a list of named `Stage`s. Every stage computes a DataFrame indexed by
+node id from the graph and from the outputs of the stages it declares as inputs.
+Stages whose inputs are ready run concurrently in a process pool; stages that work
+node by node are split into node shards that run as separate tasks.
+
+Every result is checkpointed as a Parquet file whose name is a content hash of the
+graph, the stage's code (its function and the functions and modules it declares as
+`deps`) and the hashes of its inputs, so that
+
+- a re-run only recomputes stages whose code or inputs changed, and
+- an interrupted run resumes from the last completed shard.
+
+The shards of a stage are deleted once they are merged into its checkpoint.
+"""
+
+import hashlib
+import inspect
+import os
+import resource
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+import instrumentation
+
+
+@dataclass
+class Stage:
+    """
+    A named pipeline stage.
+
+    `func(g, **inputs, **params)` receives the graph, the output DataFrames of the
+    stages named in `inputs` and the keyword arguments in `params`. A `sharded` stage
+    is also called with `nodes=<list of nodes>` and must return the rows of these
+    nodes only. `deps` lists the functions and modules that `func` calls, whose
+    source is part of the checkpoint key along with that of `func`, so that changing
+    them invalidates the stage's checkpoints. The `params` named in `runtime_params`
+    change how the stage runs but not its output (such as its number of processes)
+    and are left out of the key.
+    """
+
+    name: str
+    func: Callable
+    inputs: tuple = ()
+    sharded: bool = False
+    version: str = "1"
+    params: dict = field(default_factory=dict)
+    deps: tuple = ()
+    runtime_params: tuple = ("n_jobs",)
+
+
+@dataclass
+class StageReport:
+    name: str
+    status: str = "pending"
+    n_shards: int = 1
+    shards_done: int = 0
+    seconds: float = 0.0
+    task_seconds: float = 0.0
+    peak_rss_mb: float = 0.0
+    started: float = None
+
+
+def graph_fingerprint(g: nx.Graph) -> str:
+    """Content hash of a graph's nodes, edges and their attributes."""
+    sha1 = hashlib.sha1()
+    sha1.update(repr(type(g)).encode())
+    for node, data in g.nodes(data=True):
+        sha1.update(repr((node, sorted(data.items()))).encode())
+    for u, v, data in g.edges(data=True):
+        sha1.update(repr((u, v, sorted(data.items()))).encode())
+    return sha1.hexdigest()
+
+
+def _source(obj) -> str:
+    """The source code of a function or module."""
+    try:
+        return inspect.getsource(obj)
+    except (OSError, TypeError):
+        # compiled code
+        return repr(getattr(obj, "__code__", obj))
+
+
+def stage_keys(stages: list, graph_hash: str) -> dict:
+    """
+    Content hash of every stage: graph, stage code and version, the code of its
+    dependencies, and input hashes.
+    """
+    by_name = {s.name: s for s in stages}
+    keys = {}
+
+    def key(stage):
+        if stage.name not in keys:
+            sha1 = hashlib.sha1()
+            sha1.update(graph_hash.encode())
+            sha1.update(stage.name.encode())
+            sha1.update(stage.version.encode())
+            for obj in (stage.func, *stage.deps):
+                sha1.update(_source(obj).encode())
+            params = {
+                k: v for k, v in stage.params.items() if k not in stage.runtime_params
+            }
+            sha1.update(repr(sorted(params.items())).encode())
+            for name in stage.inputs:
+                sha1.update(key(by_name[name]).encode())
+            keys[stage.name] = sha1.hexdigest()[:16]
+        return keys[stage.name]
+
+    for stage in stages:
+        key(stage)
+    return keys
+
+
+def available_cpus() -> int:
+    """Number of CPUs this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count()
+
+
+def _peak_rss_mb() -> float:
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 2**10
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+
+
+def _reset_peak_rss():
+    # Linux resets the VmHWM high-water mark when "5" is written to clear_refs
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+_worker_graph = None
+
+
+def _init_worker(g, profile=None):
+    global _worker_graph
+    _worker_graph = g
+    # the instrumentation settings of the parent; None if it is disabled
+    if profile is not None:
+        instrumentation.enable(memory=profile["memory"])
+
+
+def _run_task(name, func, nodes, inputs, params, fn_out):
+    """
+    Run one stage (or one shard of it) in a worker and checkpoint the result. Returns
+    the wall time, the peak RSS and the instrumentation records of the task.
+    """
+    _reset_peak_rss()
+    start = time.perf_counter()
+    with instrumentation.span(
+        f"stage:{name}", items=None if nodes is None else len(nodes)
+    ):
+        kwargs = {dep: pd.read_parquet(fn) for dep, fn in inputs.items()}
+        kwargs.update(params)
+        if nodes is not None:
+            kwargs["nodes"] = nodes
+        df = func(_worker_graph, **kwargs)
+        _write_parquet(df, fn_out)
+    return time.perf_counter() - start, _peak_rss_mb(), instrumentation.drain()
+
+
+def _write_parquet(df: pd.DataFrame, fn: str):
+    # write and rename, so that an interrupted run never leaves a partial checkpoint
+    df.to_parquet(fn + ".tmp", engine="pyarrow")
+    os.replace(fn + ".tmp", fn)
+
+
+def run_pipeline(
+    g: nx.Graph,
+    stages: list,
+    checkpoint_dir: str,
+    targets: list = None,
+    force: list = (),
+    n_jobs: int = None,
+    n_shards: int = None,
+    verbose: bool = True,
+) -> tuple:
+    """
+    Run the stages needed for `targets` (default: all), reusing valid checkpoints.
+
+    Parameters:
+    g (networkx.Graph): The graph; sent once to every worker process.
+    stages (list of Stage): The pipeline.
+    checkpoint_dir (str): Where the Parquet checkpoints are stored.
+    targets (list of str): Stages whose outputs are wanted.
+    force (list of str): Stages to recompute even if their checkpoint is valid.
+    n_jobs (int): Number of worker processes. Defaults to the number of CPUs
+        available to this process.
+    n_shards (int): Number of node shards of sharded stages. Defaults to
+        4 * n_jobs.
+
+    Returns:
+    tuple: (frames, reports): target name -> output DataFrame and
+        stage name -> StageReport.
+    """
+    by_name = {s.name: s for s in stages}
+    targets = list(targets or by_name)
+    needed = []
+
+    def require(name):
+        if name not in needed:
+            for dep in by_name[name].inputs:
+                require(dep)
+            needed.append(name)
+
+    for name in targets:
+        require(name)
+
+    if n_jobs is None:
+        n_jobs = available_cpus()
+    if n_shards is None:
+        n_shards = 4 * n_jobs
+    keys = stage_keys([by_name[n] for n in needed], graph_fingerprint(g))
+    os.makedirs(checkpoint_dir, exist_ok=True)
+
+    def checkpoint(name):
+        return os.path.join(checkpoint_dir, f"{name}-{keys[name]}.parquet")
+
+    reports = {name: StageReport(name) for name in needed}
+    for name in needed:
+        if name not in force and os.path.exists(checkpoint(name)):
+            reports[name].status = "cached"
+
+    nodes = list(g.nodes)
+    node_shards = [list(s) for s in np.array_split(np.arange(len(nodes)), n_shards)]
+
+    def shard_dir(name):
+        return os.path.join(checkpoint_dir, f"{name}-{keys[name]}.shards{n_shards}")
+
+    def shard_files(name):
+        os.makedirs(shard_dir(name), exist_ok=True)
+        return [
+            os.path.join(shard_dir(name), f"shard_{i:04d}.parquet")
+            for i in range(n_shards)
+        ]
+
+    def finish(name):
+        report = reports[name]
+        if by_name[name].sharded:
+            df = pd.concat([pd.read_parquet(fn) for fn in shard_files(name)])
+            _write_parquet(df, checkpoint(name))
+            # the shards are only needed to resume an interrupted stage
+            shutil.rmtree(shard_dir(name), ignore_errors=True)
+        report.status = "computed"
+        report.seconds = time.perf_counter() - report.started
+        if verbose:
+            print(f"{name}: done in {report.seconds:.1f}s", flush=True)
+
+    running = {}
+    profile = None
+    if instrumentation.is_enabled():
+        profile = {"memory": instrumentation.memory_traced()}
+    with ProcessPoolExecutor(
+        max_workers=n_jobs, initializer=_init_worker, initargs=(g, profile)
+    ) as executor:
+
+        def submit_ready():
+            for name in needed:
+                report = reports[name]
+                stage = by_name[name]
+                if report.status != "pending":
+                    continue
+                if any(
+                    reports[dep].status not in ("cached", "computed")
+                    for dep in stage.inputs
+                ):
+                    continue
+                report.status = "running"
+                report.started = time.perf_counter()
+                inputs = {dep: checkpoint(dep) for dep in stage.inputs}
+                if not stage.sharded:
+                    report.n_shards = 1
+                    future = executor.submit(
+                        _run_task,
+                        name,
+                        stage.func,
+                        None,
+                        inputs,
+                        stage.params,
+                        checkpoint(name),
+                    )
+                    running[future] = name
+                    continue
+                report.n_shards = n_shards
+                for i, fn in enumerate(shard_files(name)):
+                    if os.path.exists(fn) and name not in force:
+                        # resume: this shard was completed by an earlier run
+                        report.shards_done += 1
+                        continue
+                    shard_nodes = [nodes[j] for j in node_shards[i]]
+                    future = executor.submit(
+                        _run_task,
+                        name,
+                        stage.func,
+                        shard_nodes,
+                        inputs,
+                        stage.params,
+                        fn,
+                    )
+                    running[future] = name
+                if report.shards_done == report.n_shards:
+                    finish(name)
+
+        submit_ready()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                task_seconds, peak_rss_mb, span_records = future.result()
+                instrumentation.merge(span_records)
+                report = reports[name]
+                report.shards_done += 1
+                report.task_seconds += task_seconds
+                report.peak_rss_mb = max(report.peak_rss_mb, peak_rss_mb)
+                if report.shards_done == report.n_shards:
+                    finish(name)
+            submit_ready()
+
+    if verbose:
+        print(format_reports(reports))
+    frames = {name: pd.read_parquet(checkpoint(name)) for name in targets}
+    return frames, reports
+
+
+def format_reports(reports: dict) -> str:
+    """Per-stage status, wall time, summed task time and peak worker memory."""
+    lines = [
+        f"{'stage':<20s} {'status':<9s} {'shards':>6s} {'wall [s]':>9s} "
+        f"{'tasks [s]':>9s} {'peak RSS [MB]':>14s}"
+    ]
+    for report in reports.values():
+        lines.append(
+            f"{report.name:<20s} {report.status:<9s} {report.n_shards:>6d} "
+            f"{report.seconds:>9.1f} {report.task_seconds:>9.1f} "
+            f"{report.peak_rss_mb:>14.1f}"
+        )
+    return "\n".join(lines)
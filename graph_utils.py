@@ -1,42 +1,31 @@
-import math
+import functools
+import hashlib
+import os
 import warnings
 from datetime import timedelta
 from io import BytesIO
-from itertools import combinations
 from typing import Literal
 
+import matplotlib
 import matplotlib.offsetbox as offsetbox
 import networkx as nx
 import numpy as np
 import pandas as pd
 import seaborn as sns
 from PIL import Image
-from cachier import cachier
 from matplotlib import pyplot as plt
-from tqdm.auto import tqdm
 
+import caching
+import csr_graph
+import instrumentation
+import triad_census
 
-@cachier(stale_after=timedelta(days=100))
+
+@caching.cached(stale_after=timedelta(days=100))
 def create_triad_image(triad_name, edges):
+    """A PNG of one triad, in a buffer. `plot_triad_census` uses `triad_image`."""
     fig, ax = plt.subplots(figsize=(4, 4), dpi=120)
-    G = nx.DiGraph()
-    G.add_nodes_from([1, 2, 3])
-    G.add_edges_from(edges)
-    layout = {1: (0, 0), 2: (1, 0), 3: (0.5, 1)}
-    nx.draw(
-        G,
-        ax=ax,
-        with_labels=False,
-        node_color="brown",
-        node_size=3500,
-        edge_color="black",
-        width=20,
-        arrows=True,
-        arrowsize=60,
-        pos=layout,
-    )
-    ax.set_axis_off()
-    ax.set_facecolor("none")
+    _draw_triad(ax, edges)
     fig.patch.set_alpha(0)
     # add margin around the plot
     plt.subplots_adjust(left=0.2, right=0.8, top=0.8, bottom=0.2)
@@ -71,14 +60,104 @@ triad_types = [
     ("300 - Full triad", [(1, 2), (2, 3), (3, 1), (1, 3), (3, 2), (2, 1)]),
 ]
 
-# Generate and cache triad images
-for name, edges in triad_types:
-    create_triad_image(name, edges)
+# The triad images are rendered on first use, all at once, into one sprite atlas: a row
+# of square tiles in the order of `triad_types`. The atlas is also stored as a PNG in
+# `triad_cache_dir` (set MLCW_TRIAD_CACHE to an empty string to disable), keyed on the
+# matplotlib version and on the triad definitions.
+triad_cache_dir = os.environ.get(
+    "MLCW_TRIAD_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "MLConnectedWorld", "triads"),
+)
+
+TRIAD_TILE_SIZE = 480
+
+
+def _draw_triad(ax, edges):
+    G = nx.DiGraph()
+    G.add_nodes_from([1, 2, 3])
+    G.add_edges_from(edges)
+    layout = {1: (0, 0), 2: (1, 0), 3: (0.5, 1)}
+    nx.draw(
+        G,
+        ax=ax,
+        with_labels=False,
+        node_color="brown",
+        node_size=3500,
+        edge_color="black",
+        width=20,
+        arrows=True,
+        arrowsize=60,
+        pos=layout,
+    )
+    ax.set_axis_off()
+    ax.set_facecolor("none")
+
+
+def _render_triad_atlas() -> np.ndarray:
+    """All triad images as one RGBA array, rendered in a single figure."""
+    dpi = 120
+    tile = TRIAD_TILE_SIZE / dpi
+    n = len(triad_types)
+    fig = plt.figure(figsize=(tile * n, tile), dpi=dpi)
+    fig.patch.set_alpha(0)
+    for i, (_, edges) in enumerate(triad_types):
+        # the same margins as `create_triad_image`: the middle 60% of every tile
+        ax = fig.add_axes([(i + 0.2) / n, 0.2, 0.6 / n, 0.6])
+        _draw_triad(ax, edges)
+    buf = BytesIO()
+    fig.savefig(buf, format="png", dpi=dpi)
+    plt.close(fig)
+    buf.seek(0)
+    return np.asarray(Image.open(buf).convert("RGBA"))
+
+
+def _triad_atlas_file() -> str:
+    key = hashlib.sha1(
+        repr((matplotlib.__version__, TRIAD_TILE_SIZE, triad_types)).encode()
+    ).hexdigest()[:16]
+    return os.path.join(
+        triad_cache_dir, f"triads-mpl{matplotlib.__version__}-{key}.png"
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def triad_atlas() -> np.ndarray:
+    """
+    The sprite atlas of the triad images: an RGBA array of shape
+    (TRIAD_TILE_SIZE, len(triad_types) * TRIAD_TILE_SIZE, 4).
+
+    Rendered once per process, or read from the on-disk copy in `triad_cache_dir`.
+    """
+    fn = _triad_atlas_file() if triad_cache_dir else None
+    if fn and os.path.exists(fn):
+        atlas = np.asarray(Image.open(fn).convert("RGBA"))
+        if atlas.shape == (TRIAD_TILE_SIZE, len(triad_types) * TRIAD_TILE_SIZE, 4):
+            return atlas
+    atlas = _render_triad_atlas()
+    if fn:
+        os.makedirs(triad_cache_dir, exist_ok=True)
+        # write and rename, so that concurrent processes never read a partial file
+        Image.fromarray(atlas).save(fn + f".{os.getpid()}.tmp", format="png")
+        os.replace(fn + f".{os.getpid()}.tmp", fn)
+    return atlas
+
+
+@functools.lru_cache(maxsize=None)
+def triad_image(triad_key: str) -> np.ndarray:
+    """
+    RGBA image of a triad type, e.g. "021D", cut from the sprite atlas (read-only).
+    """
+    for i, (name, _) in enumerate(triad_types):
+        if name.split(" ")[0] == triad_key:
+            tile = triad_atlas()[:, i * TRIAD_TILE_SIZE : (i + 1) * TRIAD_TILE_SIZE]
+            tile.flags.writeable = False
+            return tile
+    raise KeyError(triad_key)
 
 
 # Function to plot triad census with images as labels
 def plot_triad_census(
-    graph: nx.DiGraph,
+    graph,
     sort_by: Literal["n", "type"] = "n",
     normalize: bool = False,
     top_n: int = None,
@@ -88,33 +167,17 @@ def plot_triad_census(
     ax=None,
 ):
 
-    # List of triad types for directed graphs with descriptions
-    triad_types = [
-        ("003 - No edges", []),
-        ("012 - Single directed edge", [(1, 2)]),
-        ('102 - Two directed edges forming a "V"', [(1, 2), (3, 1)]),
-        ("021D - Directed path", [(1, 2), (2, 3)]),
-        ("021U - Common target", [(1, 2), (3, 2)]),
-        ("021C - Cyclic triad", [(1, 2), (2, 3), (3, 1)]),
-        ("111D - Directed triangle", [(1, 2), (2, 3), (3, 2)]),
-        ("111U - Directed triangle", [(1, 2), (3, 2), (3, 1)]),
-        ("030T - Transitive triad", [(1, 2), (1, 3), (2, 3)]),
-        ("030C - Cyclic triad", [(1, 2), (2, 3), (3, 1)]),
-        ("201 - Transitive triad", [(1, 2), (2, 3), (3, 1), (1, 3)]),
-        ("120D - Directed triangle with mutual dyad", [(1, 2), (2, 3), (3, 2), (1, 3)]),
-        ("120U - Directed triangle with mutual dyad", [(1, 2), (2, 3), (3, 1), (3, 2)]),
-        ("120C - Cyclic triad", [(1, 2), (2, 3), (3, 1), (1, 3)]),
-        (
-            "210 - Transitive triad with extra edge",
-            [(1, 2), (2, 3), (3, 1), (1, 3), (3, 2)],
-        ),
-        ("300 - Full triad", [(1, 2), (2, 3), (3, 1), (1, 3), (3, 2), (2, 1)]),
-    ]
-
     if ax is None:
         fig, ax = plt.subplots(figsize=(12, 8), dpi=120)
 
-    census = nx.triadic_census(graph)
+    # a graph (counted with the CSR census engine) or a precomputed census: a dict, a
+    # Series or the DataFrame of `triad_census.sampled_triadic_census`
+    if isinstance(graph, (nx.Graph, csr_graph.CSRGraph)):
+        census = triad_census.triadic_census(graph)
+    elif isinstance(graph, pd.DataFrame):
+        census = graph["estimate"]
+    else:
+        census = graph
     census = pd.Series(census)
     if normalize:
         total = census.sum()
@@ -149,21 +212,17 @@ def plot_triad_census(
 
     # Add images as labels
     for bar, triad_key in zip(bars, census.index):
-        for name, edges in triad_types:
-            if name.startswith(triad_key):
-                buf = create_triad_image(name, edges)
-                img = Image.open(buf)
-                im = offsetbox.OffsetImage(img, zoom=label_scale)
-                ab = offsetbox.AnnotationBbox(
-                    im,
-                    (bar.get_width(), bar.get_y() + bar.get_height() / 2),
-                    xybox=(20, 0),
-                    frameon=False,
-                    xycoords="data",
-                    boxcoords="offset points",
-                    pad=0,
-                )
-                ax.add_artist(ab)
+        im = offsetbox.OffsetImage(triad_image(triad_key), zoom=label_scale)
+        ab = offsetbox.AnnotationBbox(
+            im,
+            (bar.get_width(), bar.get_y() + bar.get_height() / 2),
+            xybox=(20, 0),
+            frameon=False,
+            xycoords="data",
+            boxcoords="offset points",
+            pad=0,
+        )
+        ax.add_artist(ab)
 
     if normalize:
         ax.set_xlabel("Proportion")
@@ -195,10 +254,15 @@ def get_triad_type(triad):
     return "Unknown"
 
 
+@instrumentation.instrumented(items=lambda G: G.number_of_nodes())
 def triadic_metrics_undirected(G):
     """
     Calculate triadic closure metrics and triad types for each node in an undirected graph.
 
+    The counts are derived analytically from the node degrees, the per-node
+    triangle counts and the total number of edges, so no node triples are
+    enumerated. Self-loops are ignored.
+
     Parameters:
     G (networkx.Graph): The input graph.
 
@@ -209,64 +273,67 @@ def triadic_metrics_undirected(G):
         - open_triads: The number of open triads (two-edge paths) the node is part of.
         - triad_<type>: The count of each triad type the node is part of.
     """
-    triad_labels = {
-        "003": "No edges",
-        "012": "Single edge",
-        "102": 'Two edges forming a "V"',
-        "300": "Full triad",
-    }
+    nodes = list(G.nodes())
+    n = len(nodes)
+    with instrumentation.span("triadic_metrics_undirected/adjacency"):
+        A = csr_graph.from_networkx(G, nodelist=nodes).adjacency()
+    m = A.nnz // 2
+    degree = np.asarray(A.sum(axis=1)).ravel()
+    with instrumentation.span("triadic_metrics_undirected/triangles", items=n):
+        triangles = csr_graph.triangles(A)
+    # number of edges that leave the neighbourhood of v, excluding edges back to v
+    neighbor_degree_sum = A @ (degree - 1)
+
+    # v is the centre of an open "V" or sits at one of its ends
+    open_triads = neighbor_degree_sum - 2 * triangles
+    triad_two_edges = degree * (degree - 1) // 2 - triangles + open_triads
+    # a single edge either touches v (the third node is adjacent to neither end)
+    # or lies entirely outside of v's closed neighbourhood
+    triad_one_edge_with_v = (
+        degree * (n - 2) - degree * (degree - 1) - neighbor_degree_sum + 2 * triangles
+    )
+    triad_one_edge_without_v = m - degree - (neighbor_degree_sum - triangles)
+    triad_one_edge = triad_one_edge_with_v + triad_one_edge_without_v
+    triad_no_edges = (
+        (n - 1) * (n - 2) // 2 - triad_one_edge - triad_two_edges - triangles
+    )
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        clustering_coefficient = np.where(
+            degree > 1, 2 * triangles / (degree * (degree - 1)), 0.0
+        )
 
     data = {
-        "clustering_coefficient": [],
-        "closed_triads": [],
-        "open_triads": [],
-        **{f"triad_{label}": [] for label in triad_labels.values()},
+        "clustering_coefficient": clustering_coefficient,
+        "closed_triads": triangles,
+        "open_triads": open_triads,
+        "triad_No edges": triad_no_edges,
+        "triad_Single edge": triad_one_edge,
+        'triad_Two edges forming a "V"': triad_two_edges,
+        "triad_Full triad": triangles,
     }
+    df = pd.DataFrame(data, index=nodes).astype(
+        {c: np.int64 for c in data if c != "clustering_coefficient"}
+    )
+    return df
 
-    node_triads = {
-        node: {label: 0 for label in triad_labels.values()} for node in G.nodes()
-    }
 
-    total_combinations = math.comb(G.number_of_nodes(), 3)
-
-    for nodes in tqdm(
-        combinations(G.nodes(), 3),
-        total=total_combinations,
-        desc="Calculating triads",
-        leave=False,
-    ):
-        subgraph = G.subgraph(nodes)
-        triad_type = get_triad_type(subgraph)
-        if triad_type in triad_labels:
-            label = triad_labels[triad_type]
-            for node in nodes:
-                node_triads[node][label] += 1
-
-    for n in tqdm(
-        G.nodes(),
-        total=G.number_of_nodes(),
-        desc="Calculating metrics",
-        leave=False,
-    ):
-        clustering_coefficient = nx.clustering(G, n)
-        closed_triads = 0
-        open_triads = 0
-        for neighbor in G.neighbors(n):
-            for second_neighbor in G.neighbors(neighbor):
-                if second_neighbor != n:
-                    if G.has_edge(n, second_neighbor):
-                        closed_triads += 1
-                    else:
-                        open_triads += 1
-
-        data["clustering_coefficient"].append(clustering_coefficient)
-        data["closed_triads"].append(closed_triads // 2)
-        data["open_triads"].append(open_triads)
-        for label in triad_labels.values():
-            data[f"triad_{label}"].append(node_triads[n][label])
-
-    df = pd.DataFrame(data, index=G.nodes())
-    return df
+def triadic_metrics_directed(G, n_jobs: int = 1):
+    """
+    Count the triads of each of the 16 directed (MAN) classes that every node is part of.
+
+    See `triad_census.triad_profile`; no node triples are enumerated.
+
+    Parameters:
+    G (networkx.DiGraph): The input graph.
+    n_jobs (int): Worker processes over shards of the nodes.
+
+    Returns:
+    pd.DataFrame: A dataframe with the node id as an index and the columns
+        triad_<type> for the types in `nx.triadic_census` order.
+    """
+    df = triad_census.triad_profile(G, n_jobs=n_jobs).add_prefix("triad_")
+    return df.rename_axis(None)
 
 
 if __name__ == "__main__":
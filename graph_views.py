@@ -0,0 +1,325 @@
+"""
+Lazy node and edge filters over networkx graphs.
+
+Cleaning a graph is usually a chain of filters: drop rare nodes, drop the nodes that
+became isolated, keep the largest connected component. Applying every step with
+`graph.copy()` or `graph.subgraph(...).copy()` duplicates the whole graph at every step.
+A `GraphFilter` instead records the surviving node set and an edge predicate; every
+step evaluates its condition on a read-only view of the current result and returns a
+new `GraphFilter`, and nothing is copied until `materialize()` is called at the end.
+The conditions are evaluated directly on the adjacency of the original graph, not
+through nested networkx views, whose lookups get slower with every level.
+
+`ConnectedComponents` labels the connected components of a graph once, with an array
+pass, and builds component graphs (or node-index arrays) only for the components that
+are asked for.
+
+>>> cleaned = (
+...     GraphFilter(g)
+...     .keep_top_percentile("count", 1.0, node_type="KEYWORD")
+...     .remove_isolated_nodes()
+...     .largest_connected_component()
+... )
+>>> view = cleaned.view()  # read-only, shares the data of `g`
+>>> g_clean = cleaned.materialize()  # an independent graph, copied once
+"""
+
+from collections.abc import KeysView
+from typing import Callable, Union
+
+import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse import csgraph
+
+import csr_graph
+
+
+def _ordered(nodes) -> KeysView:
+    """`nodes` as an ordered set, which keeps the order they are given in."""
+    return dict.fromkeys(nodes).keys()
+
+
+class _ShowNodes(nx.filters.show_nodes):
+    """
+    `nx.filters.show_nodes` over nodes in the order of the original graph. With the
+    nodes attached, a view iterates only these nodes when they are fewer than half of
+    the graph's, instead of testing every node of the graph, and keeps their order.
+    """
+
+    def __init__(self, nodes: KeysView):
+        self.nodes = nodes
+        self.length = len(nodes)
+
+
+class GraphFilter:
+    """
+    A graph restricted to a set of nodes and to the edges that pass a predicate.
+
+    Parameters:
+    graph (networkx.Graph): The original graph, of any networkx graph class.
+    nodes (set-like): The surviving nodes; `None` keeps all the nodes. Unless they are
+        an ordered set from a previous step, they are put in the order of the
+        original graph with one pass over it.
+    edge_filter (callable): `edge_filter(u, v)` (or `edge_filter(u, v, key)` for
+        multigraphs) is True for the surviving edges; `None` keeps all the edges.
+    """
+
+    def __init__(self, graph: nx.Graph, nodes=None, edge_filter: Callable = None):
+        if nodes is not None and not isinstance(nodes, KeysView):
+            nodes = _ordered(n for n in graph if n in nodes)
+        self.graph = graph
+        self.nodes = nodes
+        self.edge_filter = edge_filter
+
+    def __len__(self) -> int:
+        return len(self.graph) if self.nodes is None else len(self.nodes)
+
+    def __iter__(self):
+        """The surviving nodes, in the order of the original graph."""
+        return iter(self.graph if self.nodes is None else self.nodes)
+
+    def _neighbors(self, node):
+        """The surviving neighbours of `node`, in both directions if directed."""
+        nodes, edge_ok = self.nodes, self.edge_filter
+        multigraph = self.graph.is_multigraph()
+        adjacencies = [(self.graph.adj, False)]
+        if self.graph.is_directed():
+            adjacencies.append((self.graph.pred, True))
+        for adj, reverse in adjacencies:
+            for nbr, data in adj[node].items():
+                if nodes is not None and nbr not in nodes:
+                    continue
+                if edge_ok is not None:
+                    u, v = (nbr, node) if reverse else (node, nbr)
+                    if multigraph:
+                        if not any(edge_ok(u, v, key) for key in data):
+                            continue
+                    elif not edge_ok(u, v):
+                        continue
+                yield nbr
+
+    def _components(self):
+        """The (weakly) connected components, in the order of networkx's."""
+        seen = set()
+        for source in self:
+            if source in seen:
+                continue
+            component = {source}
+            frontier = [source]
+            while frontier:
+                next_frontier = []
+                for node in frontier:
+                    for nbr in self._neighbors(node):
+                        if nbr not in component:
+                            component.add(nbr)
+                            next_frontier.append(nbr)
+                frontier = next_frontier
+            seen.update(component)
+            yield component
+
+    def view(self, name: str = None) -> nx.Graph:
+        """
+        A read-only view of the filtered graph, sharing the original's data.
+
+        The nodes are in the order of the original graph. The view has its own copy of
+        the graph attributes, so that naming it does not rename the original.
+        """
+        ret = nx.subgraph_view(
+            self.graph,
+            filter_node=(
+                nx.filters.no_filter if self.nodes is None else _ShowNodes(self.nodes)
+            ),
+            filter_edge=self.edge_filter or nx.filters.no_filter,
+        )
+        ret.graph = dict(self.graph.graph)
+        if name is not None:
+            ret.name = name
+        # lets `as_filter` continue the chain from the original graph
+        ret.graph_filter = self
+        return ret
+
+    def materialize(self, name: str = None) -> nx.Graph:
+        """An independent (mutable) copy of the filtered graph."""
+        ret = self.view().copy()
+        if name is not None:
+            ret.name = name
+        return ret
+
+    def filter_nodes(self, predicate: Callable) -> "GraphFilter":
+        """Keep the nodes `n` (with attribute dict `d`) for which `predicate(n, d)`."""
+        node_data = self.graph.nodes
+        nodes = _ordered(n for n in self if predicate(n, node_data[n]))
+        return GraphFilter(self.graph, nodes, self.edge_filter)
+
+    def filter_edges(self, predicate: Callable) -> "GraphFilter":
+        """
+        Keep the edges for which `predicate(u, v)` (`predicate(u, v, key)` for
+        multigraphs) is True, in addition to the current edge filter.
+        """
+        if self.edge_filter is None:
+            edge_filter = predicate
+        else:
+            previous = self.edge_filter
+
+            def edge_filter(*edge):
+                return previous(*edge) and predicate(*edge)
+
+        return GraphFilter(self.graph, self.nodes, edge_filter)
+
+    def remove_nodes(self, nodes) -> "GraphFilter":
+        """Drop `nodes`."""
+        nodes = set(nodes)
+        return GraphFilter(
+            self.graph, _ordered(n for n in self if n not in nodes), self.edge_filter
+        )
+
+    def remove_isolated_nodes(self) -> "GraphFilter":
+        """Drop the nodes without edges (a node with only a self-loop is kept)."""
+        return GraphFilter(
+            self.graph,
+            _ordered(n for n in self if any(True for _ in self._neighbors(n))),
+            self.edge_filter,
+        )
+
+    def keep_top_percentile(
+        self, node_attr: str = "count", percentile: float = 1.0, node_type: str = None
+    ) -> "GraphFilter":
+        """
+        Drop the nodes (of `node_type`, if given) whose `node_attr` is below the
+        `100 - percentile` percentile of that attribute among these nodes.
+        """
+        node_data = self.graph.nodes
+        if node_type:
+            candidates = [n for n in self if node_data[n]["type"] == node_type]
+        else:
+            candidates = list(self)
+        counts = np.array([node_data[n][node_attr] for n in candidates])
+        threshold = np.percentile(counts, 100 - percentile)
+        return self.remove_nodes(
+            n for n, below in zip(candidates, counts < threshold) if below
+        )
+
+    def connected_components(self) -> list:
+        """
+        The (weakly) connected components, largest first, as `GraphFilter`s of the
+        original graph. Components of equal size keep the order of networkx's
+        `connected_components`.
+        """
+        position = {node: i for i, node in enumerate(self)}
+        ret = [
+            GraphFilter(
+                self.graph, _ordered(sorted(c, key=position.get)), self.edge_filter
+            )
+            for c in self._components()
+        ]
+        ret.sort(key=len, reverse=True)
+        return ret
+
+    def largest_connected_component(self) -> "GraphFilter":
+        """The largest (weakly) connected component; the first one found on ties."""
+        largest = max(self._components(), key=len)
+        return GraphFilter(
+            self.graph, _ordered(n for n in self if n in largest), self.edge_filter
+        )
+
+
+def as_filter(graph: nx.Graph) -> GraphFilter:
+    """
+    A `GraphFilter` of `graph`. For a view returned by `GraphFilter.view`, this is the
+    filter of the view's original graph, so that chained steps never nest views.
+    """
+    graph_filter = getattr(graph, "graph_filter", None)
+    return GraphFilter(graph) if graph_filter is None else graph_filter
+
+
+class ConnectedComponents:
+    """
+    The (weakly) connected components of a graph, labelled in one array pass.
+
+    The components are numbered by decreasing size; components of equal size keep the
+    order in which networkx's `connected_components` finds them. Nothing is copied on
+    construction: the components are produced one at a time, as arrays of node
+    indices, lists of node ids or graphs.
+
+    Parameters:
+    G (networkx.Graph or csr_graph.CSRGraph): The graph. Components of a CSRGraph are
+        available as node indices and node ids only.
+    """
+
+    def __init__(self, G: Union[nx.Graph, csr_graph.CSRGraph]):
+        self.graph = G
+        if isinstance(G, csr_graph.CSRGraph):
+            n = G.number_of_nodes
+            A = sp.csr_array(
+                (np.ones(len(G.indices), dtype=np.int8), G.indices, G.indptr),
+                shape=(n, n),
+            )
+            self.nodes = G.nodes
+        else:
+            self.nodes = np.fromiter(G, dtype=object, count=len(G))
+            index = {node: i for i, node in enumerate(self.nodes)}
+            m = G.number_of_edges()
+            ends = np.fromiter(
+                (index[node] for edge in G.edges() for node in edge[:2]),
+                dtype=np.int64,
+                count=2 * m,
+            ).reshape(-1, 2)
+            n = len(self.nodes)
+            A = sp.csr_array(
+                (np.ones(m, dtype=np.int8), (ends[:, 0], ends[:, 1])), shape=(n, n)
+            )
+        # components are labelled in the order of their first node, as networkx does
+        n_components, labels = csgraph.connected_components(
+            A, directed=True, connection="weak"
+        )
+        sizes = np.bincount(labels, minlength=n_components)
+        order = np.argsort(-sizes, kind="stable")
+        rank = np.empty(n_components, dtype=np.int64)
+        rank[order] = np.arange(n_components)
+        #: component number (0 is the largest) of every node, in graph order
+        self.labels = rank[labels]
+        #: number of nodes of every component, largest first
+        self.sizes = sizes[order]
+        self._node_order = None
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+    def node_indices(self, i: int) -> np.ndarray:
+        """Positions (in graph order) of the nodes of component `i`, sorted."""
+        if self._node_order is None:
+            # one stable sort groups the nodes of every component
+            self._node_order = np.argsort(self.labels, kind="stable")
+            self._starts = np.concatenate([[0], np.cumsum(self.sizes)])
+        return self._node_order[self._starts[i] : self._starts[i + 1]]
+
+    def nodes_of(self, i: int) -> list:
+        """Node ids of component `i`, in graph order."""
+        return self.nodes[self.node_indices(i)].tolist()
+
+    def subgraph(self, i: int, copy: bool = True, name: str = None) -> nx.Graph:
+        """
+        Component `i` as a graph: a copy, or with `copy=False` a read-only view that
+        shares the data of the graph.
+        """
+        if isinstance(self.graph, csr_graph.CSRGraph):
+            raise TypeError("Subgraphs are only available for networkx graphs")
+        base = as_filter(self.graph)
+        component = GraphFilter(
+            base.graph, _ordered(self.nodes_of(i)), base.edge_filter
+        )
+        return component.materialize(name) if copy else component.view(name)
+
+    def __iter__(self):
+        """The components as read-only views, largest first, created lazily."""
+        return (self.subgraph(i, copy=False) for i in range(len(self)))
+
+    def largest_k(self, k: int, copy: bool = True, as_indices: bool = False) -> list:
+        """
+        The `k` largest components, as graphs (see `subgraph`) or, with
+        `as_indices=True`, as arrays of node indices. The others are never built.
+        """
+        if as_indices:
+            return [self.node_indices(i) for i in range(min(k, len(self)))]
+        return [self.subgraph(i, copy=copy) for i in range(min(k, len(self)))]
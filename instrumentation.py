@@ -0,0 +1,342 @@
+"""
+Named spans that record where the time and the memory of a run go.
+
+A span is opened with `span(name)` as a context manager or with the `instrumented`
+decorator. When it closes, it records its wall time, the CPU time of the process,
+the peak of the memory allocated by Python while it was open (with tracemalloc,
+relative to the allocations at its start) and, if given, the number of items it
+processed and their rate. Spans nest: a span records its depth and the name of the
+span it is nested in, and its peak includes the peaks of the spans nested in it.
+
+Instrumentation is off until `enable()`; while it is off, `span` returns a shared
+no-op object and an `instrumented` function calls the original function after one
+flag check. Tracing the allocations slows down allocation-heavy code, so it can be
+left out with `enable(memory=False)`.
+
+The records are tabulated by `summary()` and exported with `export_json` and
+`export_chrome_trace` (the Trace Event format of chrome://tracing and Perfetto).
+Worker processes return their records with `drain()` for the parent to `merge`, as
+`feature_pipeline.run_pipeline` does.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from typing import Callable
+
+import pandas as pd
+
+_enabled = False
+_trace_memory = False
+# whether tracemalloc was started here, and must be stopped by `disable`
+_started_tracemalloc = False
+_records = []
+_local = threading.local()
+
+
+@dataclass
+class SpanRecord:
+    name: str
+    start: float  # seconds since the epoch
+    wall_seconds: float
+    cpu_seconds: float
+    peak_bytes: int = None  # None when memory is not traced
+    items: int = None
+    depth: int = 0
+    parent: str = None
+    pid: int = 0
+    tid: int = 0
+    attrs: dict = field(default_factory=dict)
+
+    @property
+    def items_per_second(self) -> float:
+        if self.items is None or self.wall_seconds <= 0:
+            return None
+        return self.items / self.wall_seconds
+
+
+def _stack() -> list:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _fold_memory_peak(stack: list):
+    """Raise the peaks of the open spans to the traced peak so far, then reset it."""
+    _, peak = tracemalloc.get_traced_memory()
+    for open_span in stack:
+        open_span._max_traced = max(open_span._max_traced, peak)
+    tracemalloc.reset_peak()
+
+
+class Span:
+    """An open span; use `add_items` to count the items it processes."""
+
+    __slots__ = (
+        "name",
+        "items",
+        "attrs",
+        "_start",
+        "_start_wall",
+        "_start_cpu",
+        "_start_traced",
+        "_max_traced",
+        "_traced",
+    )
+
+    def __init__(self, name: str, items: int = None, **attrs):
+        self.name = name
+        self.items = items
+        self.attrs = attrs
+
+    def add_items(self, n: int):
+        self.items = (self.items or 0) + int(n)
+
+    def __enter__(self):
+        stack = _stack()
+        self._traced = _trace_memory and tracemalloc.is_tracing()
+        if self._traced:
+            _fold_memory_peak(stack)
+            self._start_traced = self._max_traced = tracemalloc.get_traced_memory()[0]
+        stack.append(self)
+        self._start = time.time()
+        self._start_cpu = time.process_time()
+        self._start_wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall = time.perf_counter() - self._start_wall
+        cpu = time.process_time() - self._start_cpu
+        stack = _stack()
+        peak_bytes = None
+        if self._traced and tracemalloc.is_tracing():
+            _fold_memory_peak(stack)
+            peak_bytes = self._max_traced - self._start_traced
+        stack.pop()
+        _records.append(
+            SpanRecord(
+                name=self.name,
+                start=self._start,
+                wall_seconds=wall,
+                cpu_seconds=cpu,
+                peak_bytes=peak_bytes,
+                items=self.items,
+                depth=len(stack),
+                parent=stack[-1].name if stack else None,
+                pid=os.getpid(),
+                tid=threading.get_ident(),
+                attrs=self.attrs,
+            )
+        )
+        return False
+
+
+class _NullSpan:
+    """The span of disabled instrumentation: records nothing."""
+
+    __slots__ = ()
+    items = None
+
+    def add_items(self, n: int):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_null_span = _NullSpan()
+
+
+def span(name: str, items: int = None, **attrs):
+    """
+    A span named `name`, to be used as a context manager.
+
+    Parameters:
+    name (str): The name of the span; spans of the same name are summed up in
+        `summary()`.
+    items (int): The number of items the span processes, if known in advance;
+        otherwise count them with `add_items` on the object of the `with` statement.
+    attrs: Further values stored with the record.
+
+    Returns:
+    Span: The span, or a no-op object if instrumentation is disabled.
+    """
+    if not _enabled:
+        return _null_span
+    return Span(name, items, **attrs)
+
+
+def instrumented(name: str = None, items: Callable = None):
+    """
+    Record every call of a function as a span.
+
+    Parameters:
+    name (str): The name of the span. Defaults to the function's qualified name.
+    items (Callable): Called with the function's arguments, returns the number of
+        items a call processes.
+
+    Returns:
+    Callable: The decorator.
+    """
+
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            n_items = None if items is None else items(*args, **kwargs)
+            with Span(span_name, n_items):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def enable(memory: bool = True):
+    """
+    Start recording spans.
+
+    Parameters:
+    memory (bool): Also trace the peak memory allocations of the spans (starts
+        tracemalloc unless it is running already).
+    """
+    global _enabled, _trace_memory, _started_tracemalloc
+    _enabled = True
+    _trace_memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracemalloc = True
+
+
+def disable():
+    """Stop recording spans; the records are kept."""
+    global _enabled, _trace_memory, _started_tracemalloc
+    _enabled = False
+    _trace_memory = False
+    if _started_tracemalloc:
+        tracemalloc.stop()
+        _started_tracemalloc = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def memory_traced() -> bool:
+    return _trace_memory
+
+
+def records() -> list:
+    """The records of the spans closed so far (list of SpanRecord)."""
+    return list(_records)
+
+
+def drain() -> list:
+    """The records of the spans closed so far; they are removed from this process."""
+    ret = list(_records)
+    _records.clear()
+    return ret
+
+
+def merge(span_records: list):
+    """Add the records of another process (from its `drain()`)."""
+    _records.extend(span_records)
+
+
+def reset():
+    """Forget the records."""
+    _records.clear()
+
+
+def summary() -> pd.DataFrame:
+    """
+    The spans by name: the number of calls, the total wall and CPU time, the largest
+    peak allocation, the total items and the items per second of wall time.
+
+    Returns:
+    pandas.DataFrame: One row per span name, by decreasing total wall time.
+    """
+    columns = [
+        "calls",
+        "wall_seconds",
+        "cpu_seconds",
+        "peak_mb",
+        "items",
+        "items_per_second",
+    ]
+    if not _records:
+        return pd.DataFrame(columns=columns)
+    df = pd.DataFrame(
+        {
+            "name": [r.name for r in _records],
+            "wall_seconds": [r.wall_seconds for r in _records],
+            "cpu_seconds": [r.cpu_seconds for r in _records],
+            "peak_mb": [
+                float("nan") if r.peak_bytes is None else r.peak_bytes / 2**20
+                for r in _records
+            ],
+            "items": [float("nan") if r.items is None else r.items for r in _records],
+        }
+    )
+    ret = df.groupby("name", sort=False).agg(
+        calls=("wall_seconds", "size"),
+        wall_seconds=("wall_seconds", "sum"),
+        cpu_seconds=("cpu_seconds", "sum"),
+        peak_mb=("peak_mb", "max"),
+        items=("items", lambda items: items.sum(min_count=1)),
+    )
+    ret["items_per_second"] = ret["items"] / ret["wall_seconds"]
+    return ret.sort_values("wall_seconds", ascending=False)[columns]
+
+
+def _write(fn: str, data):
+    # write and rename, so that an interrupted run never leaves a partial file
+    with open(fn + ".tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(fn + ".tmp", fn)
+
+
+def export_json(fn: str):
+    """Write the records to `fn` as a JSON list, one object per span."""
+    _write(
+        fn,
+        [{**asdict(r), "items_per_second": r.items_per_second} for r in _records],
+    )
+
+
+def export_chrome_trace(fn: str):
+    """
+    Write the records to `fn` in the Trace Event format: open it in
+    chrome://tracing or https://ui.perfetto.dev. Every process and thread is a row.
+    """
+    events = []
+    for r in _records:
+        args = {"cpu_seconds": r.cpu_seconds, **r.attrs}
+        if r.peak_bytes is not None:
+            args["peak_mb"] = r.peak_bytes / 2**20
+        if r.items is not None:
+            args["items"] = r.items
+            args["items_per_second"] = r.items_per_second
+        events.append(
+            {
+                "name": r.name,
+                "ph": "X",
+                "ts": r.start * 1e6,
+                "dur": r.wall_seconds * 1e6,
+                "pid": r.pid,
+                "tid": r.tid,
+                "args": args,
+            }
+        )
+    _write(fn, {"traceEvents": events, "displayTimeUnit": "ms"})
@@ -0,0 +1,274 @@
+"""
+Neighbourhood-based link-prediction scores of node pairs, computed with sparse
+matrices.
+
+The scores of a batch of pairs (u, v) are computed without a Python loop over the
+pairs: the neighbours w of every v are expanded into one array and looked up in the
+sorted keys (u * n + w) of the adjacency matrix with `searchsorted`. The matches are
+the common neighbours, so
+
+- common neighbours are their counts per pair,
+- Adamic-Adar and resource allocation are their sums of 1 / log(degree) and
+  1 / degree,
+- Jaccard and preferential attachment follow from these and the degrees.
+
+The truncated Katz score sum(beta ** l * (number of walks of length l from u to v)),
+l = 1 .. max_length, meets in the middle: the walks of length l = a + b are the sums
+over w of A ** a [u, w] * A ** b [w, v], with the rows A ** a [u] computed once per
+distinct u of the batch and the rows A ** b [v] expanded per pair, so no power of A
+is formed for the whole graph. The end with the higher degree is taken as u.
+
+The pairs are scored in batches whose size is bounded by the number of matrix entries
+they touch. The candidate pairs can be given, or generated: all the pairs at distance
+exactly 2, from the rows of A @ A, also in batches.
+
+The scores equal those of the networkx functions (`nx.common_neighbors`,
+`nx.jaccard_coefficient`, `nx.adamic_adar_index`, `nx.resource_allocation_index`,
+`nx.preferential_attachment`) on graphs without self-loops; self-loops are ignored.
+"""
+
+from typing import Iterator, Union
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+import csr_graph
+
+LINK_SCORE_COLUMNS = [
+    "common_neighbors",
+    "jaccard_coefficient",
+    "adamic_adar_index",
+    "resource_allocation_index",
+    "preferential_attachment",
+    "katz",
+]
+
+
+def _as_csr(G: Union[nx.Graph, csr_graph.CSRGraph]) -> csr_graph.CSRGraph:
+    graph = G if isinstance(G, csr_graph.CSRGraph) else csr_graph.from_networkx(G)
+    if graph.directed:
+        raise nx.NetworkXNotImplemented("not implemented for directed type")
+    return graph
+
+
+def _reach(A: sp.csr_array, length: int) -> list:
+    """
+    Upper bounds on the number of nonzero entries of the rows of A ** l, for l = 0 ..
+    `length` (number of walks of length l, capped at the number of nodes).
+    """
+    n = A.shape[0]
+    reach = [np.ones(n, dtype=np.int64)]
+    for _ in range(length):
+        reach.append(np.minimum(A @ reach[-1], n))
+    return reach
+
+
+def _batches(cost: np.ndarray, max_entries: int) -> Iterator[slice]:
+    """Consecutive slices with about `max_entries` of the summed `cost` each."""
+    total = np.cumsum(cost)
+    start = 0
+    while start < len(cost):
+        done = total[start - 1] if start else 0
+        stop = max(start + 1, int(np.searchsorted(total, done + max_entries, "right")))
+        yield slice(start, stop)
+        start = stop
+
+
+def _walk_rows(A: sp.csr_array, nodes: np.ndarray, length: int) -> sp.csr_array:
+    """Rows `nodes` of A ** `length` (walk counts), with sorted indices."""
+    rows = A[nodes]
+    for _ in range(length - 1):
+        rows = rows @ A
+    rows = sp.csr_array(rows)
+    rows.sort_indices()
+    return rows
+
+
+def _entries(M: sp.csr_array, rows: np.ndarray) -> tuple:
+    """The entries of the rows `rows` of M, concatenated: owner position, column, value."""
+    indptr = M.indptr.astype(np.int64)
+    length = indptr[rows + 1] - indptr[rows]
+    owner = np.repeat(np.arange(len(rows)), length)
+    start = np.cumsum(length) - length
+    entry = indptr[rows][owner] + np.arange(len(owner)) - start[owner]
+    return owner, M.indices[entry].astype(np.int64), M.data[entry]
+
+
+def _lookup(M: sp.csr_array, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    """The values M[rows, cols] (0 where M has no entry); M has sorted indices."""
+    n = M.shape[1]
+    keys = np.repeat(np.arange(M.shape[0], dtype=np.int64), np.diff(M.indptr))
+    keys = keys * n + M.indices
+    if len(keys) == 0:
+        return np.zeros(len(rows), dtype=M.data.dtype)
+    query = rows * n + cols
+    found = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+    return np.where(keys[found] == query, M.data[found], 0)
+
+
+def _score_batch(A, degree, u, v, katz_beta, katz_max_length) -> dict:
+    """
+    The scores of the index pairs (u[i], v[i]). The walk rows of the distinct nodes u
+    are computed once; the rows of v are expanded per pair and looked up in them.
+    """
+    left, left_inverse = np.unique(u, return_inverse=True)
+    right, right_inverse = np.unique(v, return_inverse=True)
+    left_walks, right_walks = {}, {}
+
+    def count_walks(a, b):
+        # walks of length a + b: the sum over w of A ** a [u, w] * A ** b [w, v]
+        if a not in left_walks:
+            left_walks[a] = _walk_rows(A, left, a)
+        if b == 0:
+            return _lookup(left_walks[a], left_inverse, v)
+        if b not in right_walks:
+            right_walks[b] = _walk_rows(A, right, b)
+        owner, w, count = _entries(right_walks[b], right_inverse)
+        found = _lookup(left_walks[a], left_inverse[owner], w)
+        return np.bincount(owner, found * count, minlength=len(u))
+
+    # common neighbours: the neighbours w of v with an entry A[u, w]
+    owner, w, _ = _entries(A, v)
+    common = _lookup(A, u[owner], w) > 0
+    owner, w = owner[common], w[common]
+    common_neighbors = np.bincount(owner, minlength=len(u))
+    # common neighbours have degree 2 or more
+    adamic_adar = np.bincount(owner, 1 / np.log(degree[w]), minlength=len(u))
+    resource_allocation = np.bincount(owner, 1 / degree[w], minlength=len(u))
+    union = degree[u] + degree[v] - common_neighbors
+    with np.errstate(divide="ignore", invalid="ignore"):
+        jaccard = np.where(union > 0, common_neighbors / union, 0.0)
+
+    katz = np.zeros(len(u))
+    for length in range(1, katz_max_length + 1):
+        if length == 2:
+            n_walks = common_neighbors
+        else:
+            n_walks = count_walks((length + 1) // 2, length // 2)
+        katz += katz_beta**length * n_walks
+    return {
+        "common_neighbors": common_neighbors.astype(np.int64),
+        "jaccard_coefficient": jaccard,
+        "adamic_adar_index": adamic_adar,
+        "resource_allocation_index": resource_allocation,
+        "preferential_attachment": degree[u] * degree[v],
+        "katz": katz,
+    }
+
+
+def _distance_two_pairs(A: sp.csr_array, max_entries: int) -> Iterator[np.ndarray]:
+    """Batches of the index pairs (u, v), u < v, at distance exactly 2."""
+    n = A.shape[0]
+    # sorted keys u * n + v of the edges
+    keys = np.repeat(np.arange(n, dtype=np.int64), np.diff(A.indptr)) * n + A.indices
+    for batch in _batches(_reach(A, 2)[2], max_entries):
+        sources = np.arange(n, dtype=np.int64)[batch]
+        T = (A[sources] @ A).tocoo()
+        u, v = sources[T.row], T.col.astype(np.int64)
+        keep = v > u
+        u, v = u[keep], v[keep]
+        if len(keys):
+            found = np.minimum(np.searchsorted(keys, u * n + v), len(keys) - 1)
+            adjacent = keys[found] == u * n + v
+            u, v = u[~adjacent], v[~adjacent]
+        order = np.lexsort((v, u))
+        yield np.column_stack([u[order], v[order]])
+
+
+def distance_two_pairs(
+    G: Union[nx.Graph, csr_graph.CSRGraph], max_entries: int = 1 << 22
+) -> np.ndarray:
+    """
+    All the pairs of nodes at distance exactly 2: not adjacent, with a common neighbour.
+
+    Parameters:
+    G (networkx.Graph or csr_graph.CSRGraph): An undirected graph.
+    max_entries (int): The pairs are generated in batches of source nodes with about
+        this many two-step walks, which bounds the memory use.
+
+    Returns:
+    numpy.ndarray: Node ids, of shape (number of pairs, 2); every pair once, in the
+        node order of the graph.
+    """
+    graph = _as_csr(G)
+    A = graph.adjacency()
+    A.sort_indices()
+    pairs = np.concatenate(
+        [np.empty((0, 2), dtype=np.int64)] + list(_distance_two_pairs(A, max_entries))
+    )
+    return graph.nodes[pairs]
+
+
+def link_prediction_scores(
+    G: Union[nx.Graph, csr_graph.CSRGraph],
+    pairs=None,
+    katz_beta: float = 0.05,
+    katz_max_length: int = 3,
+    max_entries: int = 1 << 22,
+) -> pd.DataFrame:
+    """
+    Common neighbours, Jaccard, Adamic-Adar, resource allocation, preferential
+    attachment and truncated Katz scores of node pairs.
+
+    Parameters:
+    G (networkx.Graph or csr_graph.CSRGraph): An undirected graph.
+    pairs: The candidate pairs (u, v), as an iterable of node-id pairs or an array of
+        shape (k, 2). Defaults to all the pairs at distance exactly 2.
+    katz_beta (float): The attenuation factor of the Katz score.
+    katz_max_length (int): The longest walks counted in the Katz score.
+    max_entries (int): The pairs are scored in batches that touch about this many
+        matrix entries, which bounds the memory use.
+
+    Returns:
+    pandas.DataFrame: One row per pair, with the node ids in the columns `u` and `v`
+        followed by the LINK_SCORE_COLUMNS.
+    """
+    graph = _as_csr(G)
+    A = graph.adjacency()
+    A.sort_indices()
+    degree = np.diff(A.indptr).astype(np.int64)
+    if pairs is None:
+        batches = _distance_two_pairs(A, max_entries)
+    else:
+        index = graph.node_index
+        pairs = pairs.tolist() if isinstance(pairs, np.ndarray) else list(pairs)
+        ids = np.fromiter(
+            (index[node] for pair in pairs for node in pair),
+            dtype=np.int64,
+            count=2 * len(pairs),
+        )
+        batches = [ids.reshape(-1, 2)]
+
+    # the walk rows of the distinct higher-degree ends are computed once per batch, the
+    # rows of the other ends are expanded per pair (the scores are symmetric)
+    reach = _reach(A, max(1, (katz_max_length + 1) // 2))
+    frames = []
+    for index_pairs in batches:
+        u, v = index_pairs[:, 0], index_pairs[:, 1]
+        swap = degree[u] < degree[v]
+        left, right = np.where(swap, v, u), np.where(swap, u, v)
+        order = np.argsort(left, kind="stable")
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = left[order][1:] != left[order][:-1]
+        cost = (
+            reach[-1][left[order]] * first + reach[katz_max_length // 2][right[order]]
+        )
+        scores = {column: np.zeros(len(u)) for column in LINK_SCORE_COLUMNS}
+        for batch in _batches(cost, max_entries):
+            pairs = order[batch]
+            batch_scores = _score_batch(
+                A, degree, left[pairs], right[pairs], katz_beta, katz_max_length
+            )
+            for column, values in batch_scores.items():
+                scores[column][pairs] = values
+        frames.append(
+            pd.DataFrame({"u": graph.nodes[u], "v": graph.nodes[v], **scores}).astype(
+                {"common_neighbors": np.int64, "preferential_attachment": np.int64}
+            )
+        )
+    if not frames:
+        empty = {column: [] for column in ["u", "v"] + LINK_SCORE_COLUMNS}
+        return pd.DataFrame(empty)
+    return pd.concat(frames, ignore_index=True)
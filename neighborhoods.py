@@ -0,0 +1,263 @@
+"""
+Multi-hop neighbourhood sizes of every node: the number of nodes within distance k,
+for several depths k in one level-synchronous pass.
+
+Two modes are available:
+
+- "exact": the sources are processed in blocks of 64 * W nodes, with one bitset of W
+  words per node of the graph. Bit s of node v is set once v is reached from source s.
+  Every level pushes only the bits that are new since the previous level (the
+  frontier) along the edges of the nodes that have new bits, so every (source, node)
+  pair is discovered once, as in one BFS per source, but for a whole block of sources
+  at a time with array operations. The block width follows from the memory budget.
+- "hyperanf": every node holds a HyperLogLog counter of 2 ** precision registers (one
+  byte each) for the set of nodes within distance k; the counter at depth k is the
+  register-wise maximum of the node's counter and its neighbours' counters at depth
+  k - 1 (HyperANF, Boldi, Rosa & Vigna, 2011). The memory per node is fixed and the
+  relative standard error is about 1.04 / sqrt(2 ** precision).
+
+For directed graphs the neighbourhoods follow the out-edges, like
+`nx.single_source_shortest_path_length`. The node itself is counted (at distance 0).
+"""
+
+from typing import Literal, Union
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed, effective_n_jobs
+
+import csr_graph
+
+
+def _as_csr(G: Union[nx.Graph, csr_graph.CSRGraph]) -> csr_graph.CSRGraph:
+    return G if isinstance(G, csr_graph.CSRGraph) else csr_graph.from_networkx(G)
+
+
+def _neighbor_entries(indptr, indices, nodes):
+    """The neighbours of every node in `nodes`, concatenated, with their owners."""
+    degree = indptr[nodes + 1] - indptr[nodes]
+    owner = np.repeat(np.arange(len(nodes)), degree)
+    start = np.cumsum(degree) - degree
+    entry = indptr[nodes][owner] + np.arange(len(owner)) - start[owner]
+    return owner, indices[entry].astype(np.int64)
+
+
+def _slices(cost: np.ndarray, max_cost: int):
+    """Consecutive slices with about `max_cost` of the summed `cost` each."""
+    total = np.cumsum(cost)
+    start = 0
+    while start < len(cost):
+        done = total[start - 1] if start else 0
+        stop = max(start + 1, int(np.searchsorted(total, done + max_cost, "right")))
+        yield slice(start, stop)
+        start = stop
+
+
+def _column_counts(bits: np.ndarray, max_words: int) -> np.ndarray:
+    """The number of set bits in every bit column of the rows of `bits` (r, W)."""
+    n_words = bits.shape[1]
+    counts = np.zeros(64 * n_words, dtype=np.int64)
+    step = max(1, max_words // (8 * n_words))
+    for start in range(0, len(bits), step):
+        chunk = bits[start : start + step].astype("<u8").view(np.uint8)
+        counts += np.unpackbits(chunk, axis=1, bitorder="little").sum(0, np.int64)
+    return counts
+
+
+def _exact_block(indptr, indices, sources, depths, max_words) -> np.ndarray:
+    """Exact neighbourhood sizes of `sources`, shape (len(depths), len(sources))."""
+    n = len(indptr) - 1
+    n_words = (len(sources) + 63) // 64
+    column = np.arange(len(sources))
+    reached = np.zeros((n, n_words), dtype=np.uint64)
+    reached[sources, column // 64] = np.uint64(1) << (column % 64).astype(np.uint64)
+    frontier_nodes = np.unique(sources)
+    frontier = reached[frontier_nodes]
+    counts = np.ones(len(sources), dtype=np.int64)
+    sizes = np.zeros((len(depths), len(sources)), dtype=np.int64)
+    for level in range(max(depths) + 1):
+        if level > 0:
+            counts += _column_counts(frontier, max_words)[: len(sources)]
+        sizes[np.asarray(depths) == level] = counts
+        if level == max(depths) or len(frontier_nodes) == 0:
+            sizes[np.asarray(depths) > level] = counts
+            break
+        # push the new bits of the frontier to the neighbours, grouped by neighbour
+        owner, target = _neighbor_entries(indptr, indices, frontier_nodes)
+        order = np.argsort(target, kind="stable")
+        owner, target = owner[order], target[order]
+        group_start = np.flatnonzero(np.r_[True, target[1:] != target[:-1]])
+        group_size = np.diff(np.r_[group_start, len(target)])
+        next_nodes, next_frontier = [], []
+        for groups in _slices(group_size * n_words, max_words):
+            first = group_start[groups]
+            entries = slice(first[0], first[-1] + group_size[groups][-1])
+            pushed = np.bitwise_or.reduceat(frontier[owner[entries]], first - first[0])
+            nodes = target[first]
+            new = pushed & ~reached[nodes]
+            reached[nodes] |= new
+            keep = new.any(axis=1)
+            next_nodes.append(nodes[keep])
+            next_frontier.append(new[keep])
+        frontier_nodes = np.concatenate([np.empty(0, dtype=np.int64)] + next_nodes)
+        frontier = np.concatenate(
+            [np.empty((0, n_words), dtype=np.uint64)] + next_frontier
+        )
+    return sizes
+
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    """A 64-bit hash of every value of the uint64 array `x`."""
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _hyperloglog_counters(n: int, precision: int, seed: int) -> np.ndarray:
+    """A HyperLogLog counter of every node holding the node itself, shape (n, 2 ** b)."""
+    with np.errstate(over="ignore"):
+        h = _splitmix64(
+            np.arange(n, dtype=np.uint64) + np.uint64(seed) * np.uint64(n + 1)
+        )
+    register = (h >> np.uint64(64 - precision)).astype(np.int64)
+    rest = h & np.uint64((1 << (64 - precision)) - 1)
+    # the rank is the position of the lowest set bit of the remaining bits
+    lowest = rest & (~rest + np.uint64(1))
+    with np.errstate(divide="ignore"):
+        rank = np.where(
+            rest == 0, 64 - precision + 1, np.log2(lowest.astype(float)) + 1
+        )
+    counters = np.zeros((n, 1 << precision), dtype=np.uint8)
+    counters[np.arange(n), register] = rank.astype(np.uint8)
+    return counters
+
+
+def _hyperloglog_estimate(counters: np.ndarray) -> np.ndarray:
+    """The cardinality estimates of HyperLogLog counters, with the small-range fix."""
+    m = counters.shape[1]
+    alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+    estimate = alpha * m**2 / np.exp2(-counters.astype(float)).sum(axis=1)
+    zeros = (counters == 0).sum(axis=1)
+    with np.errstate(divide="ignore"):
+        linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((estimate <= 2.5 * m) & (zeros > 0), linear, estimate)
+
+
+def _hyperanf(indptr, indices, depths, precision, seed) -> np.ndarray:
+    """Estimated neighbourhood sizes of all the nodes, shape (len(depths), n)."""
+    n = len(indptr) - 1
+    counters = _hyperloglog_counters(n, precision, seed)
+    sizes = np.zeros((len(depths), n))
+    # the j-th neighbours of all the nodes with more than j neighbours are merged in
+    # one step; with the nodes by decreasing degree, these nodes are a prefix
+    degree = np.diff(indptr)
+    order = np.argsort(-degree, kind="stable")
+    n_longer = np.searchsorted(-degree[order], -np.arange(degree.max(initial=0)))
+    for level in range(max(depths) + 1):
+        if level > 0:
+            union = counters[order]
+            for j, k in enumerate(n_longer.tolist()):
+                neighbors = indices[indptr[order[:k]] + j]
+                np.maximum(union[:k], counters[neighbors], out=union[:k])
+            counters[order] = union
+        if level in depths:
+            sizes[np.asarray(depths) == level] = _hyperloglog_estimate(counters)
+    return sizes
+
+
+def neighborhood_sizes(
+    G: Union[nx.Graph, csr_graph.CSRGraph],
+    depths=(2, 4),
+    nodes=None,
+    mode: Literal["exact", "hyperanf"] = "exact",
+    precision: int = 8,
+    seed: int = 0,
+    n_jobs: int = 1,
+    memory_budget_mb: int = 256,
+) -> pd.DataFrame:
+    """
+    The number of nodes within distance k of every node, for every depth k.
+
+    Parameters:
+    G (networkx.Graph or csr_graph.CSRGraph): The graph; directed graphs are followed
+        along their out-edges.
+    depths (iterable of int): The depths k.
+    nodes (list): The nodes whose neighbourhoods are counted. Defaults to all nodes.
+        The exact mode only does the work for these nodes; the HyperANF mode always
+        propagates the counters of the whole graph.
+    mode (str): "exact" (bitsets) or "hyperanf" (HyperLogLog counters).
+    precision (int): log2 of the number of registers per node in the HyperANF mode.
+    seed (int): The hash seed of the HyperANF mode.
+    n_jobs (int): Worker processes over blocks of sources in the exact mode (joblib
+        semantics).
+    memory_budget_mb (int): Approximate memory for the bitsets of the exact mode.
+
+    Returns:
+    pandas.DataFrame: Indexed by node id, with the columns `n_depth_{k}`: integer
+        counts in the exact mode, estimates in the HyperANF mode.
+    """
+    if mode not in ("exact", "hyperanf"):
+        raise ValueError(f"Unknown mode {mode}")
+    depths = [int(k) for k in depths]
+    if any(k < 0 for k in depths):
+        raise ValueError("depths must be non-negative")
+    graph = _as_csr(G)
+    n = graph.number_of_nodes
+    indptr, indices = graph.indptr.astype(np.int64), graph.indices
+    if nodes is None:
+        positions = np.arange(n)
+    else:
+        positions = np.array([graph.node_index[node] for node in nodes], dtype=np.int64)
+    max_words = max(1, int(memory_budget_mb * 2**20) // 8)
+    columns = [f"n_depth_{k}" for k in depths]
+    if len(positions) == 0 or not depths:
+        return pd.DataFrame(
+            np.zeros((len(positions), len(depths)), dtype=np.int64),
+            index=graph.nodes[positions],
+            columns=columns,
+        )
+
+    if mode == "hyperanf":
+        sizes = _hyperanf(indptr, indices, depths, precision, seed)
+        sizes = sizes[:, positions]
+    else:
+        # half of the budget for the bitsets, the frontier and its new bits (about 3
+        # words per node and word of the block), half for the bits pushed in a step
+        block_size = 64 * max(1, max_words // (6 * max(n, 1)))
+        n_blocks = max(
+            -(-len(positions) // block_size),
+            1 if n_jobs == 1 else min(effective_n_jobs(n_jobs), len(positions)),
+        )
+        blocks = np.array_split(positions, n_blocks)
+        results = Parallel(n_jobs=n_jobs if n_blocks > 1 else 1)(
+            delayed(_exact_block)(indptr, indices, block, depths, max_words // 2)
+            for block in blocks
+        )
+        sizes = np.concatenate(results, axis=1)
+    return pd.DataFrame(sizes.T, index=graph.nodes[positions], columns=columns)
+
+
+def triangles_no_others(G: Union[nx.Graph, csr_graph.CSRGraph]) -> pd.DataFrame:
+    """
+    The triangle count of every node, and the number of its neighbours that are in
+    exactly one triangle (`triangles_no_others` of the node-based chapter).
+
+    Parameters:
+    G (networkx.Graph or csr_graph.CSRGraph): An undirected graph.
+
+    Returns:
+    pandas.DataFrame: Indexed by node id, with the columns `triangles` and
+        `triangles_no_others`.
+    """
+    graph = _as_csr(G)
+    if graph.directed:
+        raise nx.NetworkXNotImplemented("not implemented for directed type")
+    triangles = csr_graph.triangles(graph.adjacency())
+    # a self-loop makes the node its own neighbour, as in `G.neighbors`
+    no_others = graph.adjacency(self_loops=True) @ (triangles == 1).astype(np.int64)
+    return pd.DataFrame(
+        {"triangles": triangles, "triangles_no_others": no_others},
+        index=graph.nodes,
+    )
@@ -0,0 +1,438 @@
+"""
+Random graphs and null models that are built directly as edge arrays, and ensembles of
+them to compare the metrics of an observed graph with.
+
+The generators take O(n + m) time and memory and return `csr_graph.CSRGraph`s (call
+`to_networkx()` for a networkx graph):
+
+- `gnp_random_graph`: G(n, p). Instead of a coin flip for every one of the
+  n(n - 1) / 2 pairs, the gaps between the chosen pairs are drawn from the geometric
+  distribution and the positions of the pairs are mapped back to their ends
+  (Batagelj & Brandes, 2005).
+- `configuration_model`: a random pairing of the degree "stubs" of a degree
+  sequence, with self-loops and parallel edges removed by default (the "erased"
+  configuration model, as `nx.Graph(nx.configuration_model(...))` without loops).
+- `degree_preserving_rewire`: random double edge swaps (a, b), (c, d) -> (a, d),
+  (c, b) that keep every degree and keep the graph simple. Every round proposes
+  swaps for a random pairing of all the edges at once; swaps that would create a
+  self-loop or an existing edge, or the same edge twice, are rejected.
+- `watts_strogatz_graph`: a ring lattice whose edges (u, v) are rewired to (u, w)
+  with probability p, with w uniform, avoiding self-loops and parallel edges.
+
+`null_model_ensemble` generates seeded replicas of a null model fitted to a graph in
+worker processes and returns the distribution of their metrics (average
+clustering, average shortest path length of the largest component, triangles);
+`compare_with_ensemble` sets the observed metrics against these distributions. The
+replicas only depend on the seed, not on the number of workers.
+"""
+
+from typing import Literal, Union
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy.sparse import csgraph
+
+import csr_graph
+import instrumentation
+
+MODELS = ["gnp", "configuration", "rewire", "watts_strogatz"]
+METRICS = ["clustering", "path_length", "triangles"]
+
+
+def _as_csr(G: Union[nx.Graph, csr_graph.CSRGraph]) -> csr_graph.CSRGraph:
+    graph = G if isinstance(G, csr_graph.CSRGraph) else csr_graph.from_networkx(G)
+    if graph.directed:
+        raise nx.NetworkXNotImplemented("not implemented for directed type")
+    return graph
+
+
+def _has(keys: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Membership of `query` in the sorted array `keys`."""
+    if len(keys) == 0:
+        return np.zeros(len(query), dtype=bool)
+    found = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+    return keys[found] == query
+
+
+def _first_unique(keys: np.ndarray) -> np.ndarray:
+    """Whether every key occurs exactly once in `keys`."""
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    return counts[inverse] == 1
+
+
+def _edge_keys(u: np.ndarray, v: np.ndarray, n: int) -> np.ndarray:
+    """The key min * n + max of every undirected edge (u, v)."""
+    return np.minimum(u, v) * n + np.maximum(u, v)
+
+
+def _geometric_skip(n_pairs: int, p: float, rng) -> np.ndarray:
+    """The sorted positions in range(n_pairs) chosen each with probability p."""
+    if p <= 0 or n_pairs == 0:
+        return np.empty(0, dtype=np.int64)
+    if p >= 1:
+        return np.arange(n_pairs, dtype=np.int64)
+    chunks = []
+    position = -1
+    while True:
+        # enough gaps to pass the end in one draw, almost always
+        expected = (n_pairs - position - 1) * p
+        gaps = rng.geometric(p, int(expected + 5 * np.sqrt(expected) + 16))
+        chosen = position + np.cumsum(gaps)
+        chunks.append(chosen[chosen < n_pairs])
+        if chosen[-1] >= n_pairs:
+            return np.concatenate(chunks)
+        position = chosen[-1]
+
+
+def gnp_random_graph(
+    n: int, p: float, seed=None, directed: bool = False
+) -> csr_graph.CSRGraph:
+    """
+    A G(n, p) random graph: every pair of nodes is an edge with probability `p`.
+
+    Parameters:
+    n (int): The number of nodes, numbered 0 to n - 1.
+    p (float): The edge probability.
+    seed (int or numpy.random.SeedSequence): The random seed.
+    directed (bool): Draw every ordered pair (u, v), u != v, instead.
+
+    Returns:
+    csr_graph.CSRGraph: The graph.
+    """
+    if not 0 <= p <= 1:
+        raise ValueError("p must be in the range [0, 1]")
+    rng = np.random.default_rng(seed)
+    if directed:
+        chosen = _geometric_skip(n * (n - 1), p, rng)
+        u = chosen // max(n - 1, 1)
+        v = chosen % max(n - 1, 1)
+        v += v >= u
+    else:
+        # the pairs (u, u + 1), ..., (u, n - 1) of row u start at offsets[u]
+        rows = np.arange(n, dtype=np.int64)
+        offsets = rows * (2 * n - rows - 1) // 2
+        chosen = _geometric_skip(n * (n - 1) // 2, p, rng)
+        u = np.searchsorted(offsets, chosen, "right") - 1
+        v = chosen - offsets[u] + u + 1
+    return csr_graph.from_edge_arrays(
+        u, v, np.arange(n), directed=directed, name=f"gnp_random_graph({n}, {p})"
+    )
+
+
+def configuration_model(
+    degree_sequence, seed=None, simple: bool = True
+) -> csr_graph.CSRGraph:
+    """
+    A random graph with (up to the removed edges) the given degrees.
+
+    Parameters:
+    degree_sequence (sequence of int): The degree of every node; the sum must be
+        even.
+    seed (int or numpy.random.SeedSequence): The random seed.
+    simple (bool): Remove self-loops and collapse parallel edges, so that some
+        degrees can end up lower than requested. Otherwise they are kept.
+
+    Returns:
+    csr_graph.CSRGraph: The graph, with nodes numbered 0 to n - 1.
+    """
+    degree = np.asarray(degree_sequence, dtype=np.int64)
+    if (degree < 0).any() or degree.sum() % 2:
+        raise nx.NetworkXError(
+            "Invalid degree sequence: degrees must be non-negative with an even sum"
+        )
+    n = len(degree)
+    rng = np.random.default_rng(seed)
+    stubs = rng.permutation(np.repeat(np.arange(n, dtype=np.int64), degree))
+    u, v = stubs[0::2], stubs[1::2]
+    if simple:
+        keys = np.unique(_edge_keys(u, v, n)[u != v])
+        u, v = keys // max(n, 1), keys % max(n, 1)
+    return csr_graph.from_edge_arrays(
+        u, v, np.arange(n), name=f"configuration_model({n})"
+    )
+
+
+def degree_preserving_rewire(
+    G: Union[nx.Graph, csr_graph.CSRGraph],
+    n_swaps: int = None,
+    seed=None,
+    max_tries: int = None,
+) -> csr_graph.CSRGraph:
+    """
+    Randomise a simple undirected graph by double edge swaps, keeping every degree.
+
+    Parameters:
+    G (networkx.Graph or csr_graph.CSRGraph): The graph. Self-loops are kept as they
+        are; edge attributes are dropped.
+    n_swaps (int): The number of successful swaps. Defaults to 10 times the number
+        of edges, which mixes most graphs well (Milo et al., 2003).
+    seed (int or numpy.random.SeedSequence): The random seed.
+    max_tries (int): The maximum number of proposed swaps. Defaults to 100 times
+        `n_swaps`.
+
+    Returns:
+    csr_graph.CSRGraph: The rewired graph, with the nodes of `G`.
+    """
+    graph = _as_csr(G)
+    n = graph.number_of_nodes
+    rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(graph.indptr))
+    cols = graph.indices.astype(np.int64)
+    u, v = rows[rows < cols], cols[rows < cols]
+    loops = rows[rows == cols]
+    m = len(u)
+    if n_swaps is None:
+        n_swaps = 10 * m
+    if max_tries is None:
+        max_tries = 100 * n_swaps
+    if n_swaps > 0 and m < 2:
+        raise nx.NetworkXError("Graph has fewer than two edges")
+    rng = np.random.default_rng(seed)
+    keys = np.sort(u * n + v)
+    done = tries = 0
+    while done < n_swaps:
+        if tries >= max_tries:
+            raise nx.NetworkXAlgorithmError(
+                f"Maximum number of swap attempts ({tries}) exceeded before the "
+                f"desired swaps ({n_swaps}) were achieved"
+            )
+        # every edge is in at most one of the swaps of a round
+        order = rng.permutation(m)
+        a, b = order[0 : m - 1 : 2], order[1:m:2]
+        tries += len(a)
+        # (p, q), (r, s) -> (p, s), (r, q), with the ends of b in a random order
+        flip = rng.random(len(a)) < 0.5
+        p, q = u[a], v[a]
+        r, s = np.where(flip, v[b], u[b]), np.where(flip, u[b], v[b])
+        first, second = _edge_keys(p, s, n), _edge_keys(r, q, n)
+        valid = (p != s) & (r != q) & ~_has(keys, first) & ~_has(keys, second)
+        valid &= _first_unique(np.concatenate([first, second])).reshape(2, -1).all(0)
+        accepted = np.flatnonzero(valid)[: n_swaps - done]
+        a, b = a[accepted], b[accepted]
+        u[a], v[a] = first[accepted] // n, first[accepted] % n
+        u[b], v[b] = second[accepted] // n, second[accepted] % n
+        done += len(accepted)
+        keys = np.sort(u * n + v)
+    return csr_graph.from_edge_arrays(
+        np.concatenate([u, loops]),
+        np.concatenate([v, loops]),
+        graph.nodes,
+        name=graph.name,
+    )
+
+
+def watts_strogatz_graph(
+    n: int, k: int, p: float, seed=None, max_rounds: int = 100
+) -> csr_graph.CSRGraph:
+    """
+    A Watts-Strogatz small-world graph, as `nx.watts_strogatz_graph`.
+
+    Every node is joined to its k // 2 nearest neighbours on each side of a ring,
+    then every edge (u, v) is replaced with probability `p` by (u, w), with w a
+    uniformly random node other than u and the nodes already joined to u. An edge
+    that finds no such w in `max_rounds` draws keeps its ring neighbour.
+
+    Parameters:
+    n (int): The number of nodes, numbered 0 to n - 1.
+    k (int): The number of ring neighbours of every node.
+    p (float): The rewiring probability.
+    seed (int or numpy.random.SeedSequence): The random seed.
+    max_rounds (int): The number of draws of w.
+
+    Returns:
+    csr_graph.CSRGraph: The graph.
+    """
+    if k > n:
+        raise nx.NetworkXError("k>n, choose smaller k or larger n")
+    if k == n:
+        return gnp_random_graph(n, 1.0)
+    rng = np.random.default_rng(seed)
+    u = np.tile(np.arange(n, dtype=np.int64), k // 2)
+    v = (u + np.repeat(np.arange(1, k // 2 + 1), n)) % n
+    # the ring edges stay taken while they are rewired, so that one that keeps its
+    # neighbour is never duplicated
+    keys = np.sort(_edge_keys(u, v, n))
+    pending = np.flatnonzero(rng.random(len(u)) < p)
+    for _ in range(max_rounds):
+        if len(pending) == 0:
+            break
+        w = rng.integers(0, n, len(pending))
+        new = _edge_keys(u[pending], w, n)
+        valid = (w != u[pending]) & ~_has(keys, new)
+        # the same new edge from two rewirings: the first one gets it
+        _, first = np.unique(new[valid], return_index=True)
+        accepted = np.zeros(len(pending), dtype=bool)
+        accepted[np.flatnonzero(valid)[first]] = True
+        v[pending[accepted]] = w[accepted]
+        keys = np.sort(np.concatenate([keys, new[accepted]]))
+        pending = pending[~accepted]
+    return csr_graph.from_edge_arrays(
+        u, v, np.arange(n), name=f"watts_strogatz_graph({n}, {k}, {p})"
+    )
+
+
+def graph_metrics(
+    G: Union[nx.Graph, csr_graph.CSRGraph],
+    metrics=METRICS,
+    n_path_sources: int = None,
+    seed=None,
+) -> dict:
+    """
+    Metrics of an undirected graph.
+
+    Parameters:
+    G (networkx.Graph or csr_graph.CSRGraph): The graph.
+    metrics (list of str): Any of "clustering" (the average clustering coefficient),
+        "path_length" (the average shortest path length of the largest connected
+        component) and "triangles" (the number of triangles).
+    n_path_sources (int): Estimate the path length from this many sampled BFS
+        sources. Defaults to all the nodes.
+    seed (int or numpy.random.SeedSequence): The seed of the sampled sources.
+
+    Returns:
+    dict: metric name -> value.
+    """
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metrics {sorted(unknown)}. Choose from {METRICS}.")
+    graph = _as_csr(G)
+    ret = {}
+    for metric in metrics:
+        if metric == "clustering":
+            ret[metric] = csr_graph.average_clustering(graph)
+        elif metric == "triangles":
+            ret[metric] = int(csr_graph.triangles(graph.adjacency()).sum() // 3)
+        elif metric == "path_length":
+            A = graph.adjacency()
+            _, labels = csgraph.connected_components(A, directed=False)
+            largest = np.flatnonzero(labels == np.bincount(labels).argmax())
+            sub = A[largest][:, largest].tocsr()
+            component = csr_graph.CSRGraph(sub.indptr, sub.indices, largest)
+            sources = None
+            if n_path_sources is not None and n_path_sources < len(largest):
+                sources = n_path_sources
+            ret[metric], _ = csr_graph.average_shortest_path_length(
+                component, n_sources=sources, seed=seed
+            )
+    return ret
+
+
+def _model_params(graph: csr_graph.CSRGraph, model: str, model_params: dict) -> dict:
+    """The parameters of `model` fitted to `graph`, updated with `model_params`."""
+    n = graph.number_of_nodes
+    degree = np.asarray(graph.adjacency().sum(axis=1)).ravel()
+    m = int(degree.sum() // 2)
+    if model == "gnp":
+        params = dict(n=n, p=m / (n * (n - 1) / 2) if n > 1 else 0.0)
+    elif model == "configuration":
+        params = dict(degree_sequence=degree)
+    elif model == "rewire":
+        params = dict(G=graph)
+    elif model == "watts_strogatz":
+        # the even number of ring neighbours closest to the average degree
+        k = min(max(2, 2 * int(round(m / max(n, 1)))), max(n - 1, 0))
+        params = dict(n=n, k=k, p=0.1)
+    else:
+        raise ValueError(f"Unknown model {model}. Choose from {MODELS}.")
+    params.update(model_params)
+    return params
+
+
+_GENERATORS = {
+    "gnp": gnp_random_graph,
+    "configuration": configuration_model,
+    "rewire": degree_preserving_rewire,
+    "watts_strogatz": watts_strogatz_graph,
+}
+
+
+def _replica(model, params, metrics, n_path_sources, seed) -> dict:
+    graph_seed, metrics_seed = seed.spawn(2)
+    graph = _GENERATORS[model](**params, seed=graph_seed)
+    return graph_metrics(graph, metrics, n_path_sources, seed=metrics_seed)
+
+
+def null_model_ensemble(
+    G: Union[nx.Graph, csr_graph.CSRGraph],
+    model: Literal[
+        "gnp", "configuration", "rewire", "watts_strogatz"
+    ] = "configuration",
+    n_replicas: int = 100,
+    metrics=METRICS,
+    n_path_sources: int = None,
+    seed: int = None,
+    n_jobs: int = 1,
+    **model_params,
+) -> pd.DataFrame:
+    """
+    The metrics of `n_replicas` random graphs of a null model fitted to `G`.
+
+    The models are fitted as follows: "gnp" has the number of nodes and the density
+    of `G`, "configuration" its degree sequence, "rewire" is `G` randomised by
+    double edge swaps, and "watts_strogatz" has the number of nodes of `G`, the even
+    k closest to its average degree and p = 0.1.
+
+    Parameters:
+    G (networkx.Graph or csr_graph.CSRGraph): The observed undirected graph.
+    model (str): The null model.
+    n_replicas (int): The number of random graphs.
+    metrics (list of str): The metrics, see `graph_metrics`.
+    n_path_sources (int): Sampled BFS sources of the path length, see
+        `graph_metrics`.
+    seed (int): The random seed; replica i is the same for any `n_jobs`.
+    n_jobs (int): Worker processes (joblib semantics).
+    **model_params: Override the fitted parameters of the generator (such as `p`
+        of "watts_strogatz" or `n_swaps` of "rewire").
+
+    Returns:
+    pandas.DataFrame: One row per replica, one column per metric.
+    """
+    graph = _as_csr(G)
+    params = _model_params(graph, model, model_params)
+    seeds = np.random.SeedSequence(seed).spawn(n_replicas)
+    with instrumentation.span(f"null_model_ensemble:{model}", items=n_replicas):
+        rows = Parallel(n_jobs=n_jobs)(
+            delayed(_replica)(model, params, metrics, n_path_sources, replica_seed)
+            for replica_seed in seeds
+        )
+    return pd.DataFrame(
+        rows, index=pd.RangeIndex(n_replicas, name="replica"), columns=list(metrics)
+    )
+
+
+def compare_with_ensemble(
+    G: Union[nx.Graph, csr_graph.CSRGraph],
+    ensemble: pd.DataFrame,
+    n_path_sources: int = None,
+    seed: int = None,
+) -> pd.DataFrame:
+    """
+    The metrics of `G` against their distributions in a null-model ensemble.
+
+    Parameters:
+    G (networkx.Graph or csr_graph.CSRGraph): The observed graph.
+    ensemble (pandas.DataFrame): The output of `null_model_ensemble`.
+    n_path_sources (int): Sampled BFS sources of the observed path length.
+    seed (int): The seed of the sampled sources.
+
+    Returns:
+    pandas.DataFrame: Indexed by metric, with the columns `observed`, `mean`, `std`
+        (of the ensemble), `z_score` ((observed - mean) / std) and `percentile`
+        (the fraction of the replicas whose value is at most the observed one).
+    """
+    observed = pd.Series(
+        graph_metrics(G, list(ensemble.columns), n_path_sources, seed), dtype=float
+    )
+    mean, std = ensemble.mean(), ensemble.std(ddof=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z_score = (observed - mean) / std
+    return pd.DataFrame(
+        {
+            "observed": observed,
+            "mean": mean,
+            "std": std,
+            "z_score": z_score,
+            "percentile": (ensemble <= observed).mean(),
+        }
+    )
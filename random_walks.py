@@ -0,0 +1,322 @@
+"""
+Node2Vec-style biased random walks on CSR graphs, generated with NumPy kernels.
+
+A walk that arrived at v from t moves to a neighbour x of v with a probability
+proportional to w(v, x) times the search bias (Grover & Leskovec, 2016):
+
+- 1 / p if x = t (return),
+- 1 if x is a neighbour of t (stay at distance 1 from t),
+- 1 / q otherwise (move away).
+
+Instead of an alias table for every edge (t, v), as in the `node2vec` package, which
+needs memory for the sum of the squared degrees, the walks use one alias table per
+node for the first-order probabilities w(v, x) and rejection sampling for the bias
+(Yang et al., KnightKing, 2019): a neighbour drawn from the alias table of v is
+accepted with probability bias(t, x) / max(1 / p, 1, 1 / q), and drawn again
+otherwise. This samples the exact second-order distribution with tables of the size
+of the graph. "x is a neighbour of t" is a binary search in the sorted keys t * n + x
+of the edges.
+
+The alias tables of all the nodes are built at once: within a node, the bucket of
+every neighbour with a probability below the average (a "small" one) is topped up by
+the first "large" neighbour that still has excess probability, in order (Vose's
+method, with the pairing found by `searchsorted` on cumulative deficits and
+excesses). All the walks of a batch advance together, one step at a time; batches of
+start nodes are generated in worker processes and returned in order, so the walks
+can be streamed to a file or into a skip-gram trainer without holding them all.
+Walks from a node without (out-)neighbours stop early.
+"""
+
+from dataclasses import dataclass
+from typing import Iterator, Union
+
+import networkx as nx
+import numpy as np
+from joblib import Parallel, delayed
+
+import csr_graph
+
+
+def _as_csr(G: Union[nx.Graph, csr_graph.CSRGraph], weight: str) -> tuple:
+    """The CSR graph and its edge weights (1 where missing; None if all equal)."""
+    if isinstance(G, csr_graph.CSRGraph):
+        graph = G
+    else:
+        graph = csr_graph.from_networkx(G, edge_attrs=[weight] if weight else [])
+    weights = graph.edge_attrs.get(weight) if weight else None
+    if weights is None:
+        return graph, None
+    weights = np.nan_to_num(np.asarray(weights, dtype=float), nan=1.0)
+    if (weights < 0).any():
+        raise ValueError("edge weights must be non-negative")
+    if (weights == weights[:1]).all():
+        # the same weight everywhere: uniform neighbours, without alias tables
+        return graph, None
+    return graph, weights
+
+
+def _has(keys: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Membership of `query` in the sorted array `keys`."""
+    if len(keys) == 0:
+        return np.zeros(len(query), dtype=bool)
+    # sorted queries search the keys about twice as fast (fewer cache misses)
+    order = np.argsort(query)
+    found = np.empty(len(query), dtype=np.int64)
+    found[order] = np.searchsorted(keys, query[order])
+    found = np.minimum(found, len(keys) - 1)
+    return keys[found] == query
+
+
+def alias_tables(indptr: np.ndarray, weights: np.ndarray) -> tuple:
+    """
+    The alias tables of the rows of a CSR matrix, for sampling an entry of a row with
+    a probability proportional to its weight.
+
+    Parameters:
+    indptr (np.ndarray): The row pointers.
+    weights (np.ndarray): The non-negative weight of every entry. Rows with a zero
+        total weight are sampled uniformly.
+
+    Returns:
+    tuple: `prob` (float array) and `alias` (entry positions), aligned with the
+        entries: an entry j of a row with d entries is drawn with probability 1 / d,
+        then kept with probability prob[j] or replaced by alias[j].
+    """
+    degree = np.diff(indptr)
+    row = np.repeat(np.arange(len(degree)), degree)
+    total = np.bincount(row, weights, minlength=len(degree))
+    weights = np.where(total[row] > 0, weights, 1.0)
+    total = np.bincount(row, weights, minlength=len(degree))
+    scaled = weights * degree[row] / total[row]
+    prob = np.ones(len(weights))
+    alias = np.arange(len(weights))
+    small = np.flatnonzero(scaled < 1)
+    large = np.flatnonzero(scaled >= 1)
+    if len(small) == 0:
+        return prob, alias
+
+    # every row with a small entry has a large one; the larges of a row are
+    # large[first[r]:last[r]]
+    deficit = np.cumsum(1 - scaled[small])
+    excess = np.cumsum(scaled[large] - 1)
+    # the cumulative deficit of the smalls before every small
+    starts = np.concatenate([[0.0], deficit[:-1]])
+    first = np.searchsorted(row[large], row[small], "left")
+    last = np.searchsorted(row[large], row[small], "right")
+    # small i goes to the first large k of its row whose cumulative excess exceeds the
+    # deficit of the smalls before i; a large whose excess ends exactly there is used
+    # up already, which happens often with integer weights
+    k = np.searchsorted(excess, starts, "right")
+    k = np.clip(k, first, last - 1)
+    prob[small] = scaled[small]
+    alias[small] = large[k]
+    # large k is used up by the first small whose cumulative deficit exceeds its own
+    # cumulative excess; it becomes small and is topped up by the next large. If the
+    # deficit of the smalls before that one equals its excess, it is used up exactly
+    # and keeps prob 1
+    i = np.searchsorted(deficit, excess, "right")
+    used_up = i < len(small)
+    used_up[used_up] &= starts[i[used_up]] < excess[used_up]
+    used_up[used_up] &= row[small[i[used_up]]] == row[large[used_up]]
+    used_up[:-1] &= row[large[1:]] == row[large[:-1]]
+    used_up[-1] = False
+    k = np.flatnonzero(used_up)
+    prob[large[k]] = 1 + excess[k] - deficit[i[k]]
+    alias[large[k]] = large[k + 1]
+    return np.clip(prob, 0, 1), alias
+
+
+def _draw(indptr, indices, prob, alias, nodes, rng) -> np.ndarray:
+    """One weighted neighbour of every node in `nodes` (which have neighbours)."""
+    degree = indptr[nodes + 1] - indptr[nodes]
+    entry = indptr[nodes] + (rng.random(len(nodes)) * degree).astype(np.int64)
+    if prob is not None:
+        entry = np.where(rng.random(len(nodes)) < prob[entry], entry, alias[entry])
+    return indices[entry].astype(np.int64)
+
+
+def _walk_batch(tables, starts, walk_length, p, q, seed) -> np.ndarray:
+    """The walks from `starts`, as node indices padded with -1 after a dead end."""
+    indptr, indices, keys, prob, alias = tables
+    n = len(indptr) - 1
+    rng = np.random.default_rng(seed)
+    walks = np.full((len(starts), walk_length), -1, dtype=np.int64)
+    if walk_length == 0:
+        return walks
+    walks[:, 0] = starts
+    active = np.arange(len(starts))
+    previous, current = None, np.asarray(starts, dtype=np.int64)
+    biased = p != 1 or q != 1
+    max_bias = max(1 / p, 1, 1 / q)
+    for step in range(1, walk_length):
+        alive = indptr[current + 1] > indptr[current]
+        active, current = active[alive], current[alive]
+        if len(active) == 0:
+            break
+        if previous is None or not biased:
+            following = _draw(indptr, indices, prob, alias, current, rng)
+        else:
+            previous = previous[alive]
+            following = np.empty(len(active), dtype=np.int64)
+            pending = np.arange(len(active))
+            while len(pending):
+                t, x = previous[pending], _draw(
+                    indptr, indices, prob, alias, current[pending], rng
+                )
+                bias = np.where(
+                    x == t, 1 / p, np.where(_has(keys, t * n + x), 1.0, 1 / q)
+                )
+                accept = rng.random(len(pending)) * max_bias < bias
+                following[pending[accept]] = x[accept]
+                pending = pending[~accept]
+        walks[active, step] = following
+        previous, current = current, following
+    return walks
+
+
+def _tables(graph: csr_graph.CSRGraph, weights, p, q) -> tuple:
+    indptr = graph.indptr.astype(np.int64)
+    indices = graph.indices
+    keys = None
+    if p != 1 or q != 1:
+        n = graph.number_of_nodes
+        keys = np.repeat(np.arange(n, dtype=np.int64), np.diff(indptr)) * n + indices
+        if len(keys) > 1 and (np.diff(keys) < 0).any():
+            keys = np.sort(keys)
+    prob, alias = (None, None) if weights is None else alias_tables(indptr, weights)
+    return indptr, indices, keys, prob, alias
+
+
+def random_walk_batches(
+    G: Union[nx.Graph, csr_graph.CSRGraph],
+    walk_length: int = 80,
+    num_walks: int = 10,
+    p: float = 1.0,
+    q: float = 1.0,
+    weight: str = "weight",
+    batch_size: int = 10000,
+    n_jobs: int = 1,
+    seed: int = None,
+) -> Iterator[np.ndarray]:
+    """
+    Node2Vec random walks, `num_walks` from every node, in batches of node indices.
+
+    Parameters:
+    G (networkx.Graph or csr_graph.CSRGraph): The graph; directed graphs are walked
+        along their out-edges.
+    walk_length (int): The number of nodes of every walk.
+    num_walks (int): The number of walks from every node. Every round walks from all
+        the nodes, in a random order.
+    p (float): The return parameter.
+    q (float): The in-out parameter.
+    weight (str): The edge attribute with the transition weights, or None. Edges
+        without it weigh 1.
+    batch_size (int): The number of walks generated together.
+    n_jobs (int): Worker processes over the batches (joblib semantics).
+    seed (int): The random seed; the walks do not depend on `n_jobs`.
+
+    Returns:
+    Iterator[np.ndarray]: Arrays of shape (batch size, walk_length) with the indices
+        of the nodes in the graph (`graph.nodes`), padded with -1 after a dead end.
+    """
+    if p <= 0 or q <= 0:
+        raise ValueError("p and q must be positive")
+    graph, weights = _as_csr(G, weight)
+    tables = _tables(graph, weights, p, q)
+    n = graph.number_of_nodes
+    seeds = np.random.SeedSequence(seed)
+    order_rng = np.random.default_rng(seeds.spawn(1)[0])
+    starts = np.concatenate(
+        [np.empty(0, dtype=np.int64)]
+        + [order_rng.permutation(n) for _ in range(num_walks)]
+    )
+    batches = [
+        starts[start : start + batch_size]
+        for start in range(0, len(starts), batch_size)
+    ]
+    batch_seeds = seeds.spawn(len(batches))
+    yield from Parallel(n_jobs=n_jobs, return_as="generator")(
+        delayed(_walk_batch)(tables, batch, walk_length, p, q, batch_seed)
+        for batch, batch_seed in zip(batches, batch_seeds)
+    )
+
+
+def random_walks(G: Union[nx.Graph, csr_graph.CSRGraph], **kwargs) -> Iterator[list]:
+    """
+    Node2Vec random walks as lists of node ids converted to str, the sentences of a
+    skip-gram trainer such as `gensim.models.Word2Vec`.
+
+    Parameters:
+    G (networkx.Graph or csr_graph.CSRGraph): The graph.
+    **kwargs: The walk parameters of `random_walk_batches`.
+
+    Returns:
+    Iterator[list]: One list of str per walk.
+    """
+    graph = G if isinstance(G, csr_graph.CSRGraph) else None
+    if graph is None:
+        graph, _ = _as_csr(G, kwargs.get("weight", "weight"))
+    tokens = np.array([str(node) for node in graph.nodes.tolist()] + [""], dtype=object)
+    for batch in random_walk_batches(graph, **kwargs):
+        lengths = (batch >= 0).sum(axis=1).tolist()
+        for walk, length in zip(tokens[batch].tolist(), lengths):
+            yield walk[:length]
+
+
+def write_walks(G: Union[nx.Graph, csr_graph.CSRGraph], path: str, **kwargs) -> int:
+    """
+    Write Node2Vec random walks to a text file, one walk per line with the node ids
+    separated by spaces (the `corpus_file` format of `gensim.models.Word2Vec`).
+
+    Parameters:
+    G (networkx.Graph or csr_graph.CSRGraph): The graph.
+    path (str): The output file.
+    **kwargs: The walk parameters of `random_walk_batches`.
+
+    Returns:
+    int: The number of walks written.
+    """
+    n_walks = 0
+    with open(path, "w") as f:
+        for walk in random_walks(G, **kwargs):
+            f.write(" ".join(walk) + "\n")
+            n_walks += 1
+    return n_walks
+
+
+@dataclass
+class WalkCorpus:
+    """
+    A restartable iterable of Node2Vec random walks for skip-gram trainers that read
+    their sentences several times (`gensim.models.Word2Vec(sentences=...)`). Every
+    pass generates the same walks again instead of keeping them in memory.
+    """
+
+    G: Union[nx.Graph, csr_graph.CSRGraph]
+    walk_length: int = 80
+    num_walks: int = 10
+    p: float = 1.0
+    q: float = 1.0
+    weight: str = "weight"
+    batch_size: int = 10000
+    n_jobs: int = 1
+    seed: int = 0
+
+    def __post_init__(self):
+        if not isinstance(self.G, csr_graph.CSRGraph):
+            self.G = csr_graph.from_networkx(
+                self.G, edge_attrs=[self.weight] if self.weight else []
+            )
+
+    def __iter__(self) -> Iterator[list]:
+        return random_walks(
+            self.G,
+            walk_length=self.walk_length,
+            num_walks=self.num_walks,
+            p=self.p,
+            q=self.q,
+            weight=self.weight,
+            batch_size=self.batch_size,
+            n_jobs=self.n_jobs,
+            seed=self.seed,
+        )
@@ -0,0 +1,425 @@
+"""
+Node-removal attacks and the robustness curves of a graph.
+
+An attack removes the nodes of a graph one by one, in the order of a strategy:
+
+- "degree": highest degree first;
+- "collective_influence": highest collective influence first, CI(v) = (k_v - 1) times
+  the sum of (k_u - 1) over the neighbours u of v (Morone & Makse, 2015);
+- "betweenness": highest betweenness centrality first;
+- "random": a random permutation.
+
+A static attack ranks the nodes once, on the intact graph. An adaptive attack ranks
+them again after every removal: degree and collective influence are updated
+incrementally, only for the nodes whose scores the removal changes, and the next
+node is taken from a heap; betweenness is recomputed on the remaining graph after
+every `batch_size` removals.
+
+The size of the giant component after every removal is computed in one pass, by
+adding the nodes back in reverse order and merging components with a union-find.
+Path metrics (average shortest path length, efficiency, diameter) and clustering are
+computed on the remaining graph at every `metrics_every`-th step, from BFS from
+`n_path_sources` sampled sources (500 by default, so that a step costs O(500 m) rather
+than O(n m)); the sampled average path length comes with its confidence half-width.
+"""
+
+import heapq
+from typing import Literal, Union
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy import stats
+from scipy.sparse import csgraph
+
+import centrality
+import csr_graph
+
+STRATEGIES = ["degree", "collective_influence", "betweenness", "random"]
+
+
+def _as_csr(G: Union[nx.Graph, csr_graph.CSRGraph]) -> csr_graph.CSRGraph:
+    graph = G if isinstance(G, csr_graph.CSRGraph) else csr_graph.from_networkx(G)
+    if graph.directed:
+        raise nx.NetworkXNotImplemented("not implemented for directed type")
+    return graph
+
+
+def _induced(A: sp.csr_array, nodes: np.ndarray) -> csr_graph.CSRGraph:
+    """The subgraph induced by `nodes` (indices of `A`), with these indices as ids."""
+    B = A[nodes][:, nodes].tocsr()
+    B.sort_indices()
+    return csr_graph.CSRGraph(indptr=B.indptr, indices=B.indices, nodes=nodes)
+
+
+def _heap_order(scores: list, on_remove) -> list:
+    """
+    Removal order of an adaptive attack: repeatedly remove the node with the highest
+    current score (the first in node order on ties). `on_remove(v, removed)` returns
+    the (node, new score) pairs of the nodes whose scores changed.
+    """
+    heap = [(-score, v) for v, score in enumerate(scores)]
+    heapq.heapify(heap)
+    removed = [False] * len(scores)
+    order = []
+    while heap:
+        score, v = heapq.heappop(heap)
+        # entries of removed nodes and outdated entries are skipped
+        if removed[v] or -score != scores[v]:
+            continue
+        removed[v] = True
+        order.append(v)
+        for u, score in on_remove(v, removed):
+            scores[u] = score
+            heapq.heappush(heap, (-score, u))
+    return order
+
+
+def _adaptive_degree_order(neighbors: list) -> list:
+    degree = [len(nbrs) for nbrs in neighbors]
+
+    def on_remove(v, removed):
+        for u in neighbors[v]:
+            if not removed[u]:
+                degree[u] -= 1
+                yield u, degree[u]
+
+    return _heap_order(list(degree), on_remove)
+
+
+def _collective_influence(neighbors: list) -> tuple:
+    """Degrees, neighbour sums of (degree - 1) and collective influence (radius 1)."""
+    degree = [len(nbrs) for nbrs in neighbors]
+    neighbor_sum = [sum(degree[u] - 1 for u in nbrs) for nbrs in neighbors]
+    ci = [(k - 1) * s for k, s in zip(degree, neighbor_sum)]
+    return degree, neighbor_sum, ci
+
+
+def _adaptive_collective_influence_order(neighbors: list) -> list:
+    degree, neighbor_sum, ci = _collective_influence(neighbors)
+
+    def on_remove(v, removed):
+        # the neighbours of v lose v's term and one degree; their own neighbours
+        # (at distance 2 from v) see the degree of one neighbour drop by one
+        touched = set()
+        alive_neighbors = [u for u in neighbors[v] if not removed[u]]
+        for u in alive_neighbors:
+            neighbor_sum[u] -= degree[v] - 1
+            degree[u] -= 1
+            touched.add(u)
+        for u in alive_neighbors:
+            for w in neighbors[u]:
+                if not removed[w]:
+                    neighbor_sum[w] -= 1
+                    touched.add(w)
+        for w in touched:
+            yield w, (degree[w] - 1) * neighbor_sum[w]
+
+    return _heap_order(ci, on_remove)
+
+
+def _betweenness(A: sp.csr_array, nodes: np.ndarray, n_pivots: int, seed: int):
+    """Betweenness of the subgraph induced by `nodes`, exact or from `n_pivots`."""
+    values, _ = centrality.betweenness_closeness(
+        _induced(A, nodes),
+        mode="exact" if n_pivots is None else "sampled",
+        n_pivots=n_pivots or 1000,
+        seed=seed,
+    )
+    return values["betweenness_centrality"].to_numpy()
+
+
+def attack_order(
+    G: Union[nx.Graph, csr_graph.CSRGraph],
+    strategy: Literal[
+        "degree", "collective_influence", "betweenness", "random"
+    ] = "degree",
+    adaptive: bool = True,
+    n_steps: int = None,
+    batch_size: int = 1,
+    n_pivots: int = None,
+    seed: int = 42,
+) -> np.ndarray:
+    """
+    Node indices (rows of `csr_graph.from_networkx(G)`) in the order of removal.
+
+    Parameters:
+    G (networkx.Graph or csr_graph.CSRGraph): An undirected graph.
+    strategy (str): One of STRATEGIES.
+    adaptive (bool): Re-rank the remaining nodes after every removal (after every
+        `batch_size` removals for betweenness) instead of ranking them once.
+    n_steps (int): Number of nodes to remove; defaults to all of them.
+    batch_size (int): Removals between two betweenness computations.
+    n_pivots (int): Estimate betweenness from this many sampled sources per
+        component (see `centrality.betweenness_closeness`); exact by default.
+    seed (int): Seed of the random order and of the pivot sampling.
+
+    Returns:
+    numpy.ndarray: The indices of the first `n_steps` nodes to remove.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy}. Choose from {STRATEGIES}.")
+    graph = _as_csr(G)
+    n = graph.number_of_nodes
+    n_steps = n if n_steps is None else min(n_steps, n)
+    A = graph.adjacency()
+
+    if strategy == "random":
+        return np.random.default_rng(seed).permutation(n)[:n_steps]
+    if strategy == "betweenness":
+        if not adaptive:
+            scores = _betweenness(A, np.arange(n), n_pivots, seed)
+            return np.argsort(-scores, kind="stable")[:n_steps]
+        order = []
+        remaining = np.arange(n)
+        while len(order) < n_steps:
+            scores = _betweenness(A, remaining, n_pivots, seed)
+            batch = np.argsort(-scores, kind="stable")[
+                : min(batch_size, n_steps - len(order))
+            ]
+            order.extend(remaining[batch].tolist())
+            remaining = np.delete(remaining, batch)
+        return np.array(order, dtype=np.int64)
+
+    neighbors = [A.indices[A.indptr[v] : A.indptr[v + 1]].tolist() for v in range(n)]
+    if not adaptive:
+        if strategy == "degree":
+            scores = np.diff(A.indptr)
+        else:
+            scores = np.array(_collective_influence(neighbors)[2], dtype=np.int64)
+        return np.argsort(-scores, kind="stable")[:n_steps]
+    if strategy == "degree":
+        order = _adaptive_degree_order(neighbors)
+    else:
+        order = _adaptive_collective_influence_order(neighbors)
+    return np.array(order[:n_steps], dtype=np.int64)
+
+
+def giant_component_sizes(
+    G: Union[nx.Graph, csr_graph.CSRGraph], order: np.ndarray
+) -> np.ndarray:
+    """
+    Size of the largest connected component after removing `order[:k]`, for every k
+    from 0 to len(order), from one reverse pass with a union-find.
+
+    Parameters:
+    G (networkx.Graph or csr_graph.CSRGraph): An undirected graph.
+    order (numpy.ndarray): Node indices in the order of removal; the nodes that are
+        not in `order` are never removed.
+
+    Returns:
+    numpy.ndarray: len(order) + 1 sizes.
+    """
+    graph = _as_csr(G)
+    n = graph.number_of_nodes
+    indptr = graph.indptr.tolist()
+    indices = graph.indices.tolist()
+    order = [int(v) for v in order]
+    parent = list(range(n))
+    size = [1] * n
+
+    def find(x):
+        while parent[x] != x:
+            # path halving
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def add(v):
+        alive[v] = True
+        largest = size[find(v)]
+        for u in indices[indptr[v] : indptr[v + 1]]:
+            if not alive[u]:
+                continue
+            root_v, root_u = find(v), find(u)
+            if root_v == root_u:
+                continue
+            if size[root_v] < size[root_u]:
+                root_v, root_u = root_u, root_v
+            parent[root_u] = root_v
+            size[root_v] += size[root_u]
+            largest = size[root_v]
+        return largest
+
+    alive = [False] * n
+    removed = set(order)
+    giant = 0
+    for v in range(n):
+        if v not in removed:
+            giant = max(giant, add(v))
+    sizes = np.empty(len(order) + 1, dtype=np.int64)
+    sizes[len(order)] = giant
+    for k in range(len(order) - 1, -1, -1):
+        giant = max(giant, add(order[k]))
+        sizes[k] = giant
+    return sizes
+
+
+def path_metrics(
+    graph: csr_graph.CSRGraph,
+    n_sources: int = None,
+    seed: int = None,
+    chunk_size: int = 256,
+    confidence: float = 0.95,
+) -> dict:
+    """
+    Path metrics of an undirected graph, from BFS from all or from sampled sources.
+
+    `avg_shortest_path_length` and `graph_diameter` refer to the largest connected
+    component (inf and 0 if it is a single node), `efficiency` to the whole graph, as
+    `nx.global_efficiency`; `clustering` is the exact `nx.average_clustering`. With
+    `n_sources`, that many sources are sampled in the largest component and as many
+    in the whole graph; the diameter is then a lower bound (the largest eccentricity
+    among the sources), and `avg_shortest_path_length_half_width` is the half-width
+    of the `confidence` interval of the average path length (0.0 when it is exact),
+    as in `csr_graph.average_shortest_path_length`.
+    """
+    n = graph.number_of_nodes
+    nan = float("nan")
+    if n == 0:
+        return dict(
+            avg_shortest_path_length=nan,
+            avg_shortest_path_length_half_width=0.0,
+            efficiency=nan,
+            graph_diameter=0,
+            clustering=nan,
+        )
+    A = graph.adjacency()
+    _, labels = csgraph.connected_components(A, directed=False)
+    sizes = np.bincount(labels)
+    giant = np.flatnonzero(labels == np.argmax(sizes))
+    rng = np.random.default_rng(seed)
+    if n_sources is None or n_sources >= n:
+        giant_sources = giant
+        sources = np.arange(n)
+    else:
+        giant_sources = np.sort(
+            rng.choice(giant, min(n_sources, len(giant)), replace=False)
+        )
+        sources = np.sort(rng.choice(n, n_sources, replace=False))
+    bfs_sources = np.union1d(giant_sources, sources)
+
+    is_giant_source = np.isin(bfs_sources, giant_sources)
+    is_source = np.isin(bfs_sources, sources)
+    distance_sum = np.empty(len(bfs_sources))
+    inverse_sum = np.empty(len(bfs_sources))
+    eccentricity = np.empty(len(bfs_sources))
+    for start in range(0, len(bfs_sources), chunk_size):
+        chunk = bfs_sources[start : start + chunk_size]
+        distances = csgraph.shortest_path(
+            A, method="D", directed=False, unweighted=True, indices=chunk
+        )
+        reachable = np.isfinite(distances)
+        distances[~reachable] = 0
+        distance_sum[start : start + chunk_size] = distances.sum(axis=1)
+        eccentricity[start : start + chunk_size] = distances.max(axis=1)
+        with np.errstate(divide="ignore"):
+            inverse_sum[start : start + chunk_size] = np.where(
+                distances > 0, 1 / distances, 0
+            ).sum(axis=1)
+
+    half_width = 0.0
+    if len(giant) > 1:
+        per_source = distance_sum[is_giant_source] / (len(giant) - 1)
+        avg_shortest_path_length = per_source.mean()
+        diameter = int(eccentricity[is_giant_source].max())
+        k = len(giant_sources)
+        if 1 < k < len(giant):
+            finite_population = np.sqrt((len(giant) - k) / (len(giant) - 1))
+            standard_error = per_source.std(ddof=1) / np.sqrt(k) * finite_population
+            half_width = stats.norm.ppf(0.5 + confidence / 2) * standard_error
+    else:
+        avg_shortest_path_length, diameter = float("inf"), 0
+    efficiency = inverse_sum[is_source].mean() / (n - 1) if n > 1 else 0.0
+    return dict(
+        avg_shortest_path_length=float(avg_shortest_path_length),
+        avg_shortest_path_length_half_width=float(half_width),
+        efficiency=float(efficiency),
+        graph_diameter=diameter,
+        clustering=csr_graph.average_clustering(graph),
+    )
+
+
+def simulate_attack(
+    G: Union[nx.Graph, csr_graph.CSRGraph],
+    strategy: Literal[
+        "degree", "collective_influence", "betweenness", "random"
+    ] = "degree",
+    adaptive: bool = True,
+    n_steps: int = None,
+    batch_size: int = 1,
+    metrics_every: int = None,
+    n_path_sources: int = 500,
+    n_pivots: int = None,
+    seed: int = 42,
+) -> pd.DataFrame:
+    """
+    Robustness curve of a graph under a node-removal attack.
+
+    Parameters:
+    G (networkx.Graph or csr_graph.CSRGraph): An undirected graph; edge weights,
+        self-loops and parallel edges are ignored.
+    strategy (str): One of STRATEGIES.
+    adaptive (bool): Re-rank the remaining nodes after every removal.
+    n_steps (int): Number of nodes to remove; defaults to all of them.
+    batch_size (int): Removals between two betweenness computations (adaptive
+        betweenness only).
+    metrics_every (int): Compute the path metrics and clustering at every
+        `metrics_every`-th step; defaults to about 100 evaluations in total. Use 0
+        to skip them.
+    n_path_sources (int): Sampled BFS sources of the path metrics (see
+        `path_metrics`); all the nodes if None, or if the graph has fewer nodes.
+    n_pivots (int): Sampled sources of the betweenness; exact by default.
+    seed (int): Seed of the random strategy and of all the sampling.
+
+    Returns:
+    pandas.DataFrame: One row per number of removed nodes (`n_removed`, from 0),
+        with the node removed at that step, the fraction of removed nodes, the
+        number of remaining nodes, `largest_cc_size` at every step and
+        `avg_shortest_path_length` (with the half-width of its confidence interval,
+        `avg_shortest_path_length_half_width`), `efficiency`, `graph_diameter` and
+        `clustering` at the metric steps (NaN elsewhere).
+    """
+    graph = _as_csr(G)
+    n = graph.number_of_nodes
+    order = attack_order(
+        graph, strategy, adaptive, n_steps, batch_size, n_pivots, seed=seed
+    )
+    n_removed = np.arange(len(order) + 1)
+    ret = pd.DataFrame(
+        {
+            "n_removed": n_removed,
+            "removed_node": pd.Series(
+                [None] + graph.nodes[order].tolist(), dtype=object
+            ),
+            "fraction_removed": n_removed / max(n, 1),
+            "n_nodes": n - n_removed,
+            "largest_cc_size": giant_component_sizes(graph, order),
+        }
+    )
+    columns = [
+        "avg_shortest_path_length",
+        "avg_shortest_path_length_half_width",
+        "efficiency",
+        "graph_diameter",
+        "clustering",
+    ]
+    values = np.full((len(ret), len(columns)), np.nan)
+    if metrics_every is None:
+        metrics_every = max(1, int(np.ceil(len(order) / 100)))
+    if metrics_every:
+        A = graph.adjacency()
+        alive = np.ones(n, dtype=bool)
+        for k in n_removed:
+            if k:
+                alive[order[k - 1]] = False
+            if k % metrics_every:
+                continue
+            metrics = path_metrics(
+                _induced(A, np.flatnonzero(alive)), n_path_sources, seed=seed
+            )
+            values[k] = [metrics[column] for column in columns]
+    for i, column in enumerate(columns):
+        ret[column] = values[:, i]
+    return ret
@@ -0,0 +1,144 @@
+import os
+import time
+from datetime import timedelta
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+import caching
+import csr_graph
+
+
+def test_fingerprint():
+    df = pd.DataFrame(
+        {"a": [1, 2, 3], "b": ["x", None, "z"], "c": [[1], [2], [3]]},
+        index=[10, 20, 30],
+    )
+    key = caching.fingerprint(df)
+    assert caching.fingerprint(df.copy()) == key
+    changed = [
+        df.assign(a=[1, 2, 4]),
+        df.assign(a=[1.0, 2.0, 3.0]),
+        df.assign(c=[[1], [2], [4]]),
+        df.rename(columns={"a": "A"}),
+        df.set_axis([10, 20, 31]),
+        df.iloc[:2],
+    ]
+    assert len({caching.fingerprint(d) for d in changed} | {key}) == len(changed) + 1
+
+    # a Series is hashed with its index
+    series = pd.Series([1, 2, 3], index=list("xyz"))
+    assert caching.fingerprint(series) == caching.fingerprint(series.copy())
+    assert caching.fingerprint(series) != caching.fingerprint(
+        series.set_axis(list("pqr"))
+    )
+
+    values = [
+        np.arange(6),
+        np.arange(6).reshape(2, 3),
+        np.arange(6.0),
+        (1, "1"),
+        [1, "1"],
+        {"a": 1},
+        nx.path_graph(4),
+        nx.path_graph(4, create_using=nx.DiGraph),
+        csr_graph.from_networkx(nx.path_graph(4)),
+    ]
+    keys = [caching.fingerprint(value) for value in values]
+    assert len(set(keys)) == len(values)
+    assert caching.fingerprint(nx.path_graph(4)) == keys[6]
+    G = nx.path_graph(4)
+    G.edges[0, 1]["weight"] = 2
+    assert caching.fingerprint(G) != keys[6]
+
+
+def _square(x, offset=0):
+    _square.calls += 1
+    return {"value": x * x + offset}
+
+
+_square.calls = 0
+
+
+def test_cached(tmp_path):
+    cache = caching.ResultCache(str(tmp_path), max_bytes=1 << 20)
+    square = caching.cached(cache=cache)(_square)
+    calls = _square.calls
+    assert square(3) == {"value": 9}
+    assert square(3) == {"value": 9}
+    assert square(x=3, offset=0) == {"value": 9}
+    assert square(3, 1) == {"value": 10}
+    assert _square.calls == calls + 2
+    # independent copies
+    square(3)["value"] = 0
+    assert square(3) == {"value": 9}
+    assert square.stats.misses >= 2 and square.stats.memory_hits >= 3
+
+    # the disk tier, from a new process-level cache
+    disk_hits = square.stats.disk_hits
+    square = caching.cached(cache=caching.ResultCache(str(tmp_path), 1 << 20))(_square)
+    assert square(3, offset=1) == {"value": 10}
+    assert square.stats.disk_hits == disk_hits + 1
+    assert _square.calls == calls + 2
+    assert square.stats.bytes_read > 0 and square.stats.bytes_written > 0
+
+    square(3, cache__skip=True)
+    square(3, cache__overwrite=True)
+    assert _square.calls == calls + 4
+    # the keywords of the former cachier decorators
+    square(3, cachier__skip_cache=True)
+    square(3, cachier__overwrite_cache=True)
+    assert _square.calls == calls + 6
+    stats = caching.cache_stats()
+    assert f"{__name__}._square" in stats.index
+    assert list(stats.columns) == list(vars(caching.CacheStats()))
+
+    square.clear_cache()
+    square(3)
+    assert _square.calls == calls + 7
+
+    stale = caching.cached(stale_after=timedelta(0), cache=cache)(_square)
+    stale(5)
+    stale(5)
+    assert _square.calls == calls + 9
+
+
+def test_eviction(tmp_path):
+    cache = caching.ResultCache(str(tmp_path), max_bytes=50_000, memory_bytes=0)
+    store = caching.cached(cache=cache)(np.ones)
+    for n in range(8):
+        store(1000 + n)  # about 8 kB each
+        time.sleep(0.01)
+        if n >= 2:
+            # keep the first entry recently used
+            store(1000)
+    sizes = [size for *_, size in cache._entries()]
+    assert sum(sizes) <= 50_000
+    assert store.stats.evictions > 0
+    disk_hits = store.stats.disk_hits
+    store(1000)
+    assert store.stats.disk_hits == disk_hits + 1
+    misses = store.stats.misses
+    store(1001)
+    assert store.stats.misses == misses + 1
+
+
+def _square_in_worker(directory, x):
+    cache = caching.ResultCache(directory, max_bytes=1 << 20)
+    square = caching.cached(cache=cache)(_square)
+    return square(x), square.stats.disk_hits
+
+
+def test_cached_across_processes(tmp_path):
+    directory = str(tmp_path)
+    results = Parallel(n_jobs=2)(
+        delayed(_square_in_worker)(directory, x % 5) for x in range(40)
+    )
+    assert [value for value, _ in results] == [
+        {"value": (x % 5) ** 2} for x in range(40)
+    ]
+    assert len(os.listdir(os.path.join(directory, f"{__name__}._square"))) == 5
+    _, disk_hits = _square_in_worker(directory, 4)
+    assert disk_hits >= 1
@@ -0,0 +1,54 @@
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+
+import centrality
+import csr_graph
+
+
+@pytest.fixture
+def graph():
+    g = nx.powerlaw_cluster_graph(300, 2, 0.3, seed=1)
+    g.add_edges_from([(1000, 1001), (1001, 1002), (2000, 2001), (5, 5)])
+    g.add_node(3000)
+    return g
+
+
+def _networkx_centrality(g):
+    return pd.DataFrame(
+        {
+            "betweenness_centrality": nx.betweenness_centrality(g),
+            "closeness_centrality": nx.closeness_centrality(g),
+        }
+    )
+
+
+@pytest.mark.parametrize("mode", ["exact", "parallel"])
+def test_exact_centrality_matches_networkx(graph, mode):
+    df, half_width = centrality.betweenness_closeness(
+        csr_graph.from_networkx(graph), mode=mode, n_jobs=2, memory_budget_mb=1
+    )
+    pd.testing.assert_frame_equal(df, _networkx_centrality(graph), rtol=1e-12)
+    assert (half_width == 0).all().all()
+
+
+def test_sampled_centrality(graph):
+    G = csr_graph.from_networkx(graph)
+    expected = _networkx_centrality(graph)
+    df, half_width = centrality.betweenness_closeness(G, mode="sampled", n_pivots=60)
+    again, _ = centrality.betweenness_closeness(G, mode="sampled", n_pivots=60)
+    pd.testing.assert_frame_equal(df, again)
+    # the small components are computed exactly
+    small = [1000, 1001, 1002, 2000, 2001, 3000]
+    pd.testing.assert_frame_equal(df.loc[small], expected.loc[small], rtol=1e-12)
+    assert (half_width.loc[small] == 0).all().all()
+    assert (
+        np.corrcoef(df.betweenness_centrality, expected.betweenness_centrality)[0, 1]
+        > 0.9
+    )
+
+    _, bound = centrality.betweenness_closeness(
+        G, mode="sampled", n_pivots=60, interval="hoeffding"
+    )
+    assert ((df - expected).abs() <= bound + 1e-12).all().all()
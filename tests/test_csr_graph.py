@@ -0,0 +1,86 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+import csr_graph
+import data_utils
+
+
+@pytest.fixture
+def meetings_graph():
+    return data_utils.get_graph("Montagna_meetings_edgelist")
+
+
+def test_roundtrip_to_networkx(meetings_graph):
+    G = csr_graph.from_networkx(meetings_graph, edge_attrs=["weight"]).to_networkx()
+    assert nx.utils.graphs_equal(G, meetings_graph)
+
+
+@pytest.mark.parametrize("directed", [False, True])
+def test_to_networkx(directed):
+    G = nx.gnp_random_graph(60, 0.1, seed=4, directed=directed)
+    G = nx.relabel_nodes(G, {i: f"n{59 - i}" for i in G})
+    G.add_edge("n3", "n3", weight=0.5)
+    for i, (u, v) in enumerate(G.edges()):
+        G.edges[u, v]["weight"] = float(i)
+    H = csr_graph.from_networkx(G, edge_attrs=["weight"]).to_networkx()
+    assert nx.utils.graphs_equal(H, G)
+    assert H.is_directed() == directed
+    # the neighbours are in index (graph) order, and an undirected edge has one
+    # attribute dict, as add_edge creates them
+    position = {node: i for i, node in enumerate(G)}
+    for node in H:
+        assert list(H.adj[node]) == sorted(H.adj[node], key=position.get)
+    if directed:
+        for node in H:
+            assert list(H.pred[node]) == sorted(H.pred[node], key=position.get)
+    else:
+        u, v = next(iter(H.edges()))
+        assert H.adj[u][v] is H.adj[v][u]
+    # an ordinary graph, that keeps its views up to date
+    H.add_edge("new", "n3")
+    assert "new" in (H.pred if directed else H.adj)["n3"]
+
+
+def test_number_of_edges_with_self_loops():
+    G = nx.Graph([(0, 1), (1, 2), (2, 2)])
+    assert csr_graph.from_networkx(G).number_of_edges == G.number_of_edges()
+
+
+@pytest.mark.parametrize(
+    "G",
+    [
+        nx.karate_club_graph(),
+        nx.gnp_random_graph(200, 0.05, seed=1),
+        nx.gnp_random_graph(200, 0.05, seed=2, directed=True),
+    ],
+)
+def test_average_clustering_matches_networkx(G):
+    assert csr_graph.average_clustering(
+        csr_graph.from_networkx(G)
+    ) == nx.average_clustering(G)
+
+
+def test_average_shortest_path_length(meetings_graph):
+    G = data_utils.get_connected_component_subgraphs(meetings_graph)[0]
+    G_csr = csr_graph.from_networkx(G)
+    expected = nx.average_shortest_path_length(G)
+    assert csr_graph.average_shortest_path_length(G_csr) == (
+        pytest.approx(expected),
+        0.0,
+    )
+    estimate, half_width = csr_graph.average_shortest_path_length(
+        G_csr, n_sources=50, seed=0
+    )
+    assert abs(estimate - expected) < 3 * half_width
+
+
+def test_from_edge_chunks(tmp_path):
+    G = nx.relabel_nodes(nx.gnm_random_graph(300, 1200, seed=5), lambda n: f"v{n}")
+    edges = np.array(list(G.edges()) + [("v7", "v7"), ("v1", "v0")])
+    # many small chunks, so that most ids are first seen in a later chunk
+    chunks = [(part[:, 0], part[:, 1]) for part in np.array_split(edges, 97)]
+    graph = csr_graph.from_edge_chunks(chunks, str(tmp_path), max_entries=256)
+    expected = nx.Graph(edges.tolist())
+    assert graph.nodes.tolist() == list(expected)
+    assert nx.utils.graphs_equal(graph.to_networkx(), expected)
@@ -0,0 +1,198 @@
+import gzip
+import os
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+
+import csr_graph
+import data_utils
+
+
+@pytest.mark.parametrize(
+    "G",
+    [
+        nx.karate_club_graph(),
+        data_utils.get_graph("Montagna_phonecalls_edgelist"),
+    ],
+)
+def test_get_info_backends_agree(G):
+    assert data_utils.get_info(G, backend="csr") == data_utils.get_info(G)
+
+
+def test_get_info_sampled_paths():
+    info = data_utils.get_info(
+        nx.karate_club_graph(), backend="csr", n_path_sources=10, seed=0
+    )
+    assert "10 sampled sources" in info.splitlines()[-1]
+
+
+@pytest.fixture
+def graph_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_utils, "dir_graph_cache", str(tmp_path))
+    return tmp_path
+
+
+@pytest.mark.parametrize(
+    "dataset_name",
+    [
+        "Montagna_meetings_edgelist",
+        "Montagna_phonecalls_edgelist",
+        "corporate_directional",
+        "corporate_undirected",
+    ],
+)
+def test_load_graph_from_local_cache(graph_cache, dataset_name):
+    df = pd.read_csv(os.path.join(data_utils.dir_data, dataset_name + ".csv"))
+    expected = nx.from_pandas_edgelist(
+        df,
+        source="src",
+        target="dst",
+        edge_attr=["weight"],
+        # the loader reads "undirected" as directed too
+        create_using=nx.DiGraph if "direct" in dataset_name else nx.Graph,
+    )
+    for _ in range(2):
+        G = data_utils.load_graph_from_local(dataset_name)
+        assert nx.utils.graphs_equal(G, expected)
+        assert list(G.nodes) == list(expected.nodes)
+        # the neighbour order, on which seeded algorithms depend, is kept too
+        assert all(list(G[v]) == list(expected[v]) for v in expected)
+        if G.is_directed():
+            assert all(list(G.pred[v]) == list(expected.pred[v]) for v in expected)
+    lazy = data_utils.load_graph_from_local(dataset_name, lazy=True)
+    assert isinstance(lazy.indices, np.memmap)
+
+
+def test_graph_cache_invalidation(graph_cache, tmp_path):
+    fn = tmp_path / "edges.txt"
+    fn.write_text("# comment\n1\t2\n2\t3\n")
+    calls = []
+
+    def build(directory):
+        calls.append(1)
+        csr_graph.save(data_utils._read_snap_edgelist(str(fn)), directory)
+
+    cache_dir = str(tmp_path / "cache")
+    data_utils._cached_csr_graph(str(fn), build, cache_dir)
+    os.utime(fn, ns=(0, 0))
+    data_utils._cached_csr_graph(str(fn), build, cache_dir)
+    assert len(calls) == 1
+    fn.write_text("1\t2\n2\t3\n3\t1\n")
+    graph = data_utils._cached_csr_graph(str(fn), build, cache_dir)
+    assert len(calls) == 2
+    assert graph.number_of_edges == 3
+    # the edges are kept in the order of the file, like nx.read_edgelist does
+    G = graph.to_networkx()
+    assert list(G[1]) == [2, 3]
+    assert list(G[3]) == [2, 1]
+
+
+def test_stream_edgelist_matches_in_memory_reader(tmp_path):
+    G = nx.gnm_random_graph(500, 3000, seed=1)
+    fn = tmp_path / "edges.txt.gz"
+    with gzip.open(fn, "wt") as f:
+        f.write("# FromNodeId\tToNodeId\n")
+        for u, v in G.edges():
+            # SNAP lists undirected edges in both directions
+            f.write(f"{u * 3}\t{v * 3}\n{v * 3}\t{u * 3}\n")
+    expected = data_utils._read_snap_edgelist(str(fn))
+    # a tiny budget forces many chunks and the splitting of bucket files
+    streamed = data_utils.stream_edgelist(
+        str(fn), str(tmp_path / "csr"), memory_budget_mb=0.01
+    )
+    np.testing.assert_array_equal(streamed.nodes, expected.nodes)
+    np.testing.assert_array_equal(streamed.indptr, expected.indptr)
+    np.testing.assert_array_equal(streamed.indices, expected.indices)
+    assert nx.utils.graphs_equal(
+        streamed.to_networkx(), nx.relabel_nodes(G, lambda n: n * 3)
+    )
+
+
+def _events(n_events=2000, n_nodes=50, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "source": rng.integers(0, n_nodes, n_events),
+            "target": rng.integers(0, n_nodes, n_events),
+            "time": rng.integers(0, 400, n_events),
+        }
+    )
+
+
+def _snapshot_by_filtering(df, stop, start=None):
+    # the chapters' approach: filter the events and build a fresh graph
+    sel = df["time"] < stop
+    if start is not None:
+        sel &= df["last"] >= start if "last" in df else df["time"] >= start
+    df = df[sel].assign(
+        u=lambda d: np.minimum(d["source"], d["target"]),
+        v=lambda d: np.maximum(d["source"], d["target"]),
+    )
+    df_edges = (
+        df.groupby(["u", "v"])
+        .agg(weight=("time", "count"), first_time=("time", "min"))
+        .reset_index()
+    )
+    return nx.from_pandas_edgelist(df_edges, "u", "v", edge_attr=True)
+
+
+def _metrics(G):
+    H = nx.Graph(G)
+    H.remove_edges_from(nx.selfloop_edges(H))
+    return [
+        G.number_of_nodes(),
+        G.number_of_edges(),
+        sum(nx.triangles(H).values()) // 3,
+        nx.transitivity(H),
+    ]
+
+
+@pytest.mark.parametrize("window", [None, 60])
+def test_temporal_graph(window):
+    df = _events()
+    tg = data_utils.temporal_graph_from_edgelist(df)
+    cutoffs = list(range(0, 420, 15))
+    sweep = tg.sweep(cutoffs, window=window)
+    for cutoff in cutoffs:
+        start = None if window is None else cutoff - window
+        expected = _snapshot_by_filtering(df, cutoff, start)
+        snapshot = tg.snapshot(cutoff, start)
+        assert nx.utils.graphs_equal(snapshot, expected)
+        columns = ["n_nodes", "n_edges", "n_triangles", "transitivity"]
+        assert sweep.loc[cutoff, columns].tolist() == pytest.approx(_metrics(expected))
+        lazy = tg.snapshot(cutoff, start, lazy=True)
+        assert lazy.number_of_edges == expected.number_of_edges()
+
+    # the edges that appeared between two cutoffs
+    delta = tg.delta(100, 200)
+    first = _snapshot_by_filtering(df, 1000)
+    expected = {
+        tuple(sorted(edge))
+        for *edge, d in first.edges(data=True)
+        if 100 <= d["first_time"] < 200
+    }
+    assert set(map(tuple, np.sort(delta[["source", "target"]].values))) == expected
+    assert delta["first_time"].is_monotonic_increasing
+    if window is None:
+        assert sweep["n_new_edges"].sum() == first.number_of_edges()
+        assert (sweep["n_closing_edges"] <= sweep["n_new_edges"]).all()
+
+
+def test_temporal_graph_with_end_times():
+    df = _events(n_events=300, n_nodes=20)
+    df["time"] = pd.Timestamp("1900-01-01") + pd.to_timedelta(df["time"], unit="D")
+    df["end"] = df["time"] + pd.to_timedelta(np.arange(len(df)) % 50, unit="D")
+    df.loc[::7, "end"] = pd.NaT
+    df["last"] = df["end"].fillna(df["time"])
+    tg = data_utils.temporal_graph_from_edgelist(df, end="end")
+    window = pd.Timedelta(days=30)
+    cutoffs = pd.date_range("1900-01-01", periods=20, freq="20D")
+    sweep = tg.sweep(cutoffs, window=window)
+    for cutoff in cutoffs:
+        expected = _snapshot_by_filtering(df, cutoff, cutoff - window)
+        assert nx.utils.graphs_equal(tg.snapshot(cutoff, cutoff - window), expected)
+        assert sweep.loc[cutoff, "n_edges"] == expected.number_of_edges()
+    with pytest.raises(ValueError):
+        tg.sweep(cutoffs[::-1])
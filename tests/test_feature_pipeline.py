@@ -0,0 +1,118 @@
+import importlib
+import os
+import sys
+
+import networkx as nx
+import pandas as pd
+import pytest
+
+import instrumentation
+from feature_pipeline import Stage, run_pipeline, stage_keys
+
+
+def _degree(g, nodes):
+    # fails for the node in PIPELINE_TEST_FAIL, to interrupt a run
+    if os.environ.get("PIPELINE_TEST_FAIL") in map(str, nodes):
+        raise ValueError("interrupted")
+    return pd.DataFrame({"degree": dict(g.degree(nodes))})
+
+
+def _clustering(g):
+    return pd.DataFrame({"clustering": nx.clustering(g)})
+
+
+def _combined(g, degree, clustering):
+    return pd.concat([degree, clustering], axis=1)
+
+
+STAGES = [
+    Stage("degree", _degree, sharded=True),
+    Stage("clustering", _clustering),
+    Stage("combined", _combined, inputs=("degree", "clustering")),
+]
+
+
+def test_pipeline_matches_direct_computation(tmp_path):
+    g = nx.karate_club_graph()
+    frames, reports = run_pipeline(
+        g, STAGES, str(tmp_path), n_jobs=2, n_shards=3, verbose=False
+    )
+    expected = _combined(g, _degree(g, list(g.nodes)), _clustering(g))
+    pd.testing.assert_frame_equal(frames["combined"].sort_index(), expected)
+    assert reports["degree"].n_shards == 3
+    assert all(r.status == "computed" for r in reports.values())
+
+
+def test_pipeline_reuses_checkpoints_and_shards(tmp_path, monkeypatch):
+    g = nx.karate_club_graph()
+    run_pipeline(g, STAGES, str(tmp_path), n_jobs=1, n_shards=3, verbose=False)
+    # the merged shards are deleted
+    assert not [fn for fn in os.listdir(tmp_path) if ".shards" in fn]
+    _, reports = run_pipeline(
+        g, STAGES, str(tmp_path), n_jobs=1, n_shards=3, verbose=False
+    )
+    assert all(r.status == "cached" for r in reports.values())
+
+    # an interrupted run: the first shards exist, but the stage output does not
+    for fn in os.listdir(tmp_path):
+        if fn.startswith("degree-"):
+            os.remove(tmp_path / fn)
+    monkeypatch.setenv("PIPELINE_TEST_FAIL", "33")
+    with pytest.raises(ValueError, match="interrupted"):
+        run_pipeline(g, STAGES, str(tmp_path), n_jobs=1, n_shards=3, verbose=False)
+    (shard_dir,) = [fn for fn in os.listdir(tmp_path) if ".shards" in fn]
+    assert len(os.listdir(tmp_path / shard_dir)) == 2
+    # the resumed run only computes the missing shard
+    monkeypatch.setenv("PIPELINE_TEST_FAIL", "0")
+    frames, reports = run_pipeline(
+        g, STAGES, str(tmp_path), targets=["degree"], n_jobs=1, n_shards=3
+    )
+    assert reports["degree"].status == "computed"
+    assert frames["degree"]["degree"].sum() == 2 * g.number_of_edges()
+    assert not os.path.exists(tmp_path / shard_dir)
+    monkeypatch.delenv("PIPELINE_TEST_FAIL")
+
+    # a different graph invalidates every stage
+    g.add_edge(0, 100)
+    _, reports = run_pipeline(
+        g, STAGES, str(tmp_path), n_jobs=1, n_shards=3, verbose=False
+    )
+    assert all(r.status == "computed" for r in reports.values())
+
+
+def test_pipeline_collects_worker_spans(tmp_path):
+    g = nx.karate_club_graph()
+    instrumentation.reset()
+    instrumentation.enable(memory=False)
+    try:
+        run_pipeline(g, STAGES, str(tmp_path), n_jobs=2, n_shards=3, verbose=False)
+    finally:
+        instrumentation.disable()
+    records = instrumentation.drain()
+    names = sorted(r.name for r in records)
+    assert names == ["stage:clustering", "stage:combined"] + ["stage:degree"] * 3
+    assert sum(r.items for r in records if r.name == "stage:degree") == len(g)
+    assert all(r.pid != os.getpid() for r in records)
+
+
+def test_stage_keys_follow_dependencies(tmp_path, monkeypatch):
+    # a helper module that a stage calls; editing it must invalidate the stage
+    monkeypatch.syspath_prepend(str(tmp_path))
+    helper = tmp_path / "pipeline_helper.py"
+    helper.write_text("def scale(x):\n    return x\n")
+    module = importlib.import_module("pipeline_helper")
+    try:
+        stages = [
+            Stage("degree", _degree, deps=(module,)),
+            Stage("combined", _combined, inputs=("degree", "clustering")),
+            Stage("clustering", _clustering),
+        ]
+        keys = stage_keys(stages, "graph")
+        assert stage_keys(stages, "graph") == keys
+        helper.write_text("def scale(x):\n    return 2 * x\n")
+        changed = stage_keys(stages, "graph")
+        assert changed["degree"] != keys["degree"]
+        assert changed["combined"] != keys["combined"]
+        assert changed["clustering"] == keys["clustering"]
+    finally:
+        sys.modules.pop("pipeline_helper", None)
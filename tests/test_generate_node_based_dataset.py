@@ -0,0 +1,202 @@
+import os
+import sys
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+from joblib import Parallel, delayed
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "MLConnectedWorldBook"
+    )
+)
+import generate_node_based_dataset as gen
+
+
+def test_shared_memory_ego_features_match_sequential():
+    g = nx.relabel_nodes(nx.powerlaw_cluster_graph(300, 3, 0.3, seed=1), str)
+    g.add_edge("5", "5")
+    g.add_node("isolated")
+    expected = gen.compute_ego_graph_features(g, method="networkx")
+    actual = gen.compute_ego_graph_features(
+        g, method="networkx", n_jobs=2, chunk_size=64
+    )
+    # equal up to the summation order of floating point sums
+    pd.testing.assert_frame_equal(actual, expected, rtol=1e-12)
+
+
+def _attached_graphs():
+    return sorted(gen._attached_graphs)
+
+
+def test_shared_memory_ego_features_release_graphs():
+    # the reused workers keep at most one mapped graph, the latest one
+    g = nx.karate_club_graph()
+    for _ in range(2):
+        gen.compute_ego_graph_features(g, method="networkx", n_jobs=2, chunk_size=4)
+    attached = Parallel(n_jobs=2)(delayed(_attached_graphs)() for _ in range(8))
+    assert {len(directories) for directories in attached} <= {0, 1}
+    assert len({d for directories in attached for d in directories}) == 1
+
+
+@pytest.mark.parametrize(
+    "g",
+    [
+        nx.karate_club_graph(),
+        nx.relabel_nodes(nx.powerlaw_cluster_graph(500, 4, 0.4, seed=2), str),
+        nx.gnm_random_graph(200, 260, seed=3),
+        nx.path_graph(6),
+    ],
+)
+def test_vectorised_ego_features_match_networkx(g):
+    g = nx.Graph(g)
+    nodes = list(g.nodes)
+    g.add_edges_from([(nodes[1], nodes[1]), (nodes[4], nodes[4])])
+    g.add_node("isolated")
+    expected = gen.compute_ego_graph_features(g, method="networkx")
+    actual = gen.compute_ego_graph_features(g)
+    pd.testing.assert_frame_equal(actual, expected, rtol=1e-12, check_index_type=False)
+    subset = gen.compute_ego_graph_features(g, nodes=nodes[::-3])
+    pd.testing.assert_frame_equal(subset, actual.loc[nodes[::-3]])
+
+
+def _community_features_by_loops(g, seed):
+    # the original per-node implementation, with a seed
+    resolutions = np.round(np.linspace(0.01, 4, 10), 2)
+    labels = {}
+    for res in resolutions:
+        communities = nx.community.louvain_communities(g, resolution=res, seed=seed)
+        for i, c in enumerate(communities):
+            for n in c:
+                labels[n, res] = i
+    ret = []
+    for n in g.nodes:
+        neighbors = set(g.neighbors(n))
+        curr = {"node_id": n}
+        for res in resolutions:
+            curr[f"same_community@{res:.2f}"] = sum(
+                labels[nb, res] == labels[n, res] for nb in neighbors
+            ) / len(neighbors)
+            curr[f"n_neighboring_communities@{res:.2f}"] = len(
+                {labels[nb, res] for nb in neighbors}
+            )
+        ret.append(curr)
+    df = pd.DataFrame(ret).set_index("node_id")
+    cols_same = [c for c in df.columns if "same_community" in c]
+    cols_neighboring = [c for c in df.columns if "n_neighboring" in c]
+    df["mean_same"] = df[cols_same].mean(axis=1)
+    df["mean_neighboring"] = df[cols_neighboring].mean(axis=1)
+    for perc in [10, 25, 75, 90]:
+        df[f"percentile_same_{perc}"] = df[cols_same].apply(
+            lambda x: np.percentile(x, perc), axis=1
+        )
+        df[f"percentile_neighboring_{perc}"] = df[cols_neighboring].apply(
+            lambda x: np.percentile(x, perc), axis=1
+        )
+    return df
+
+
+def test_community_features_match_per_node_implementation():
+    g = nx.relabel_nodes(nx.powerlaw_cluster_graph(300, 3, 0.4, seed=4), str)
+    g.add_edge("7", "7")
+    expected = _community_features_by_loops(g, seed=42)
+    actual = gen.compute_community_features(g, seed=42, n_jobs=2)
+    pd.testing.assert_frame_equal(
+        actual, expected, check_index_type=False, check_dtype=False
+    )
+
+
+def _node_features_by_loops(g, nodes):
+    # the original per-node implementation
+    triangles = nx.triangles(g)
+    ret = {}
+    for node in nodes:
+        ret[node] = {
+            "degree": g.degree(node),
+            "clustering": nx.clustering(g, node),
+            "triangles": triangles[node],
+            "triangles_no_others": sum(
+                1 for n in g.neighbors(node) if triangles[n] == 1
+            ),
+            "n_depth_2": len(nx.single_source_shortest_path_length(g, node, cutoff=2)),
+            "n_depth_4": len(nx.single_source_shortest_path_length(g, node, cutoff=4)),
+        }
+    return pd.DataFrame.from_dict(ret, orient="index")
+
+
+def test_node_features_match_per_node_implementation():
+    g = nx.relabel_nodes(nx.powerlaw_cluster_graph(300, 2, 0.4, seed=5), str)
+    g.add_edges_from([("7", "7"), ("a", "b"), ("b", "c"), ("c", "a"), ("c", "d")])
+    g.add_node("isolated")
+    nodes = list(g)[::-2]
+    expected = _node_features_by_loops(g, nodes)
+    actual = gen.compute_node_features(g, nodes)
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+    estimated = gen.compute_node_features(g, nodes, neighborhood_mode="hyperanf")
+    relative = estimated["n_depth_4"] / expected["n_depth_4"] - 1
+    assert relative.abs().mean() < 0.1
+
+
+def test_stages_get_n_jobs():
+    stages = {stage.name: stage for stage in gen.get_stages("parallel", n_jobs=3)}
+    assert stages["community_features"].params["n_jobs"] == 3
+    assert stages["centrality_features"].params["n_jobs"] == 3
+    # the number of processes does not change the results, nor the checkpoints
+    keys = gen.stage_keys(gen.get_stages("parallel", n_jobs=1), "graph")
+    assert gen.stage_keys(list(stages.values()), "graph") == keys
+
+
+def test_stage_n_jobs(monkeypatch):
+    # the pipeline workers and the processes within their stages share the CPUs
+    monkeypatch.setattr(gen, "available_cpus", lambda: 8)
+    assert gen.stage_n_jobs() == 1
+    assert gen.stage_n_jobs(8) == 1
+    assert gen.stage_n_jobs(2) == 4
+    assert gen.stage_n_jobs(3) == 2
+    assert gen.stage_n_jobs(16) == 1
+
+
+@pytest.mark.parametrize("mode", ["exact", "hyperanf"])
+def test_node_features_stage(tmp_path, mode):
+    g = nx.relabel_nodes(nx.powerlaw_cluster_graph(200, 2, 0.4, seed=6), str)
+    stages = gen.get_stages(neighborhood_mode=mode)
+    frames, reports = gen.run_pipeline(
+        g,
+        stages,
+        str(tmp_path),
+        targets=["node_features"],
+        n_jobs=2,
+        n_shards=3,
+        verbose=False,
+    )
+    expected = gen.compute_node_features(g, neighborhood_mode=mode)
+    pd.testing.assert_frame_equal(
+        frames["node_features"].loc[expected.index], expected, check_dtype=False
+    )
+    # the triangles are counted once; HyperANF runs over the whole graph once
+    assert reports["triangle_features"].n_shards == 1
+    assert reports["node_features"].n_shards == (3 if mode == "exact" else 1)
+
+
+def test_sampled_centrality_half_widths(tmp_path, capsys):
+    g = nx.relabel_nodes(nx.powerlaw_cluster_graph(300, 2, 0.4, seed=7), str)
+    stages = gen.get_stages("sampled", n_pivots=50)
+    frames, _ = gen.run_pipeline(
+        g,
+        stages,
+        str(tmp_path),
+        targets=["centrality_features"],
+        n_jobs=1,
+        verbose=False,
+    )
+    widths = frames["centrality_features"].attrs["max_half_width"]
+    assert set(widths) == set(frames["centrality_features"].columns)
+    assert all(width > 0 for width in widths.values())
+    # returned with the features, not printed
+    sampled = gen.compute_centrality_features(g, mode="sampled", n_pivots=50)
+    assert capsys.readouterr().out == ""
+    assert sampled.attrs["max_half_width"] == widths
+    exact = gen.compute_centrality_features(g)
+    assert "max_half_width" not in exact.attrs
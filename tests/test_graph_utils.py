@@ -0,0 +1,136 @@
+import subprocess
+import sys
+from itertools import combinations
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.offsetbox as offsetbox
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+from matplotlib import pyplot as plt
+
+import data_utils
+import graph_utils
+from .fixtures import project_dir
+
+
+def _triadic_metrics_by_enumeration(G):
+    """The original triple-enumerating implementation, kept as a reference."""
+    labels = {
+        0: "No edges",
+        1: "Single edge",
+        2: 'Two edges forming a "V"',
+        3: "Full triad",
+    }
+    node_triads = {node: {label: 0 for label in labels.values()} for node in G}
+    for nodes in combinations(G.nodes(), 3):
+        label = labels[G.subgraph(nodes).number_of_edges()]
+        for node in nodes:
+            node_triads[node][label] += 1
+    rows = []
+    for n in G.nodes():
+        closed_triads = 0
+        open_triads = 0
+        for neighbor in G.neighbors(n):
+            for second_neighbor in G.neighbors(neighbor):
+                if second_neighbor != n:
+                    if G.has_edge(n, second_neighbor):
+                        closed_triads += 1
+                    else:
+                        open_triads += 1
+        rows.append(
+            {
+                "clustering_coefficient": nx.clustering(G, n),
+                "closed_triads": closed_triads // 2,
+                "open_triads": open_triads,
+                **{
+                    f"triad_{label}": node_triads[n][label] for label in labels.values()
+                },
+            }
+        )
+    return pd.DataFrame(rows, index=list(G.nodes()))
+
+
+@pytest.mark.parametrize(
+    "G",
+    [
+        data_utils.get_graph("Montagna_phonecalls_edgelist"),
+        nx.gnm_random_graph(40, 120, seed=1),
+    ],
+)
+def test_triadic_metrics_undirected_matches_enumeration(G):
+    expected = _triadic_metrics_by_enumeration(G)
+    actual = graph_utils.triadic_metrics_undirected(G)
+    pd.testing.assert_frame_equal(actual, expected, check_column_type=False)
+
+
+def test_triadic_metrics_undirected_matches_precomputed():
+    dataset = data_utils.load_dataset_from_local("link_prediction_data")
+    expected = dataset["triad_metrics"]
+    actual = graph_utils.triadic_metrics_undirected(dataset["graph"])
+    pd.testing.assert_frame_equal(
+        actual, expected.loc[actual.index], check_column_type=False
+    )
+
+
+@pytest.fixture
+def triad_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(graph_utils, "triad_cache_dir", str(tmp_path))
+    graph_utils.triad_atlas.cache_clear()
+    graph_utils.triad_image.cache_clear()
+    yield tmp_path
+    graph_utils.triad_atlas.cache_clear()
+    graph_utils.triad_image.cache_clear()
+
+
+def test_import_does_not_render(project_dir):
+    code = (
+        "import matplotlib.pyplot as plt, graph_utils; "
+        "assert graph_utils.triad_atlas.cache_info().currsize == 0; "
+        "assert not plt.get_fignums()"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=project_dir, check=True)
+
+
+def test_triad_atlas(triad_cache, monkeypatch):
+    atlas = graph_utils.triad_atlas()
+    size = graph_utils.TRIAD_TILE_SIZE
+    assert atlas.shape == (size, len(graph_utils.triad_types) * size, 4)
+    assert len(list(triad_cache.iterdir())) == 1
+
+    # every tile is the image of its triad
+    for name, edges in [graph_utils.triad_types[0], graph_utils.triad_types[8]]:
+        buf = graph_utils.create_triad_image(name, edges, cachier__skip_cache=True)
+        expected = np.asarray(graph_utils.Image.open(buf).convert("RGBA"))
+        tile = graph_utils.triad_image(name.split(" ")[0])
+        assert np.abs(tile.astype(int) - expected).mean() < 1
+    with pytest.raises(KeyError):
+        graph_utils.triad_image("999")
+
+    # a new process reads the atlas from disk instead of rendering it
+    graph_utils.triad_atlas.cache_clear()
+    monkeypatch.setattr(graph_utils, "_render_triad_atlas", None)
+    np.testing.assert_array_equal(graph_utils.triad_atlas(), atlas)
+
+
+def test_plot_triad_census(triad_cache):
+    g = nx.gnp_random_graph(40, 0.08, directed=True, seed=1)
+    fig, ax = plt.subplots()
+    graph_utils.plot_triad_census(g, ax=ax, top_n=5)
+    labels = [a for a in ax.artists if isinstance(a, offsetbox.AnnotationBbox)]
+    assert len(labels) == len(ax.patches) == 5
+    plt.close(fig)
+
+
+def test_plot_triad_census_precomputed(triad_cache):
+    g = nx.gnp_random_graph(40, 0.08, directed=True, seed=1)
+    census = nx.triadic_census(g)
+    fig, ax = plt.subplots()
+    graph_utils.plot_triad_census(census, ax=ax, sort_by="type", ignore_no_edges=True)
+    assert [p.get_width() for p in ax.patches] == [
+        census[name] for name in sorted(census) if name != "003"
+    ]
+    plt.close(fig)
@@ -0,0 +1,206 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+import csr_graph
+import data_utils
+import graph_views
+from MLConnectedWorldBook.src import tmdb_graph
+
+
+@pytest.fixture
+def g_multi():
+    # a movie-keyword-person multigraph with counts, isolated nodes and a few
+    # components
+    rng = np.random.default_rng(0)
+    g = nx.MultiGraph(name="test")
+    for i in range(60):
+        g.add_node(f"movie {i}", type="MOVIE", count=1)
+    for i in range(80):
+        g.add_node(f"keyword {i}", type="KEYWORD", count=int(rng.integers(1, 20)))
+    for i in range(40):
+        g.add_node(f"person {i}", type="PERSON", count=1)
+    for _ in range(150):
+        g.add_edge(
+            f"movie {rng.integers(50)}",
+            f"keyword {rng.integers(80)}",
+            key="HAS_KEYWORD",
+            weight=1.0,
+        )
+    for _ in range(100):
+        m, p = rng.integers(60), rng.integers(40)
+        g.add_edge(f"movie {m}", f"person {p}", key="PARTICIPATED_IN")
+        if rng.random() < 0.2:
+            g.add_edge(f"movie {m}", f"person {p}", key="WORKED_ON")
+    return g
+
+
+def _cleanup_by_copies(graph, percentile):
+    # the original implementations, with a copy at every step
+    nodes = [n for n, d in graph.nodes(data=True) if d["type"] == "KEYWORD"]
+    counts = np.array([graph.nodes[n]["count"] for n in nodes])
+    threshold = np.percentile(counts, 100 - percentile)
+    ret = graph.copy()
+    ret.remove_nodes_from([n for n in nodes if graph.nodes[n]["count"] < threshold])
+    isolated = [n for n in ret.nodes if ret.degree(n) == 0]
+    tmp = ret.copy()
+    tmp.remove_nodes_from(isolated)
+    return tmp.subgraph(max(nx.connected_components(tmp), key=len)).copy()
+
+
+def _edge_set(g):
+    if g.is_multigraph():
+        edges = g.edges(keys=True, data=True)
+        return {(frozenset((u, v)), key, repr(d)) for u, v, key, d in edges}
+    if g.is_directed():
+        return {(u, v, repr(d)) for u, v, d in g.edges(data=True)}
+    return {(frozenset((u, v)), repr(d)) for u, v, d in g.edges(data=True)}
+
+
+def _assert_same_graph(actual, expected):
+    # the copy-based implementations order the nodes of a component as a set does
+    assert type(actual) is type(expected)
+    assert dict(actual.nodes(data=True)) == dict(expected.nodes(data=True))
+    assert _edge_set(actual) == _edge_set(expected)
+    assert actual.number_of_edges() == expected.number_of_edges()
+    assert actual.graph == expected.graph
+
+
+@pytest.mark.parametrize("percentile", [10, 50, 100])
+def test_cleanup_chain(g_multi, percentile):
+    expected = _cleanup_by_copies(g_multi, percentile)
+    n_edges = g_multi.number_of_edges()
+
+    cleaned = (
+        graph_views.GraphFilter(g_multi)
+        .keep_top_percentile("count", percentile, node_type="KEYWORD")
+        .remove_isolated_nodes()
+        .largest_connected_component()
+    )
+    _assert_same_graph(cleaned.view(), expected)
+    _assert_same_graph(cleaned.materialize(), expected)
+    # the original order of the nodes is kept
+    order = {node: i for i, node in enumerate(g_multi)}
+    nodes = list(cleaned.materialize())
+    assert nodes == sorted(nodes, key=order.get)
+
+    g = tmdb_graph.cleanup_nodes_by_percentile(
+        g_multi, percentile=percentile, node_type="KEYWORD", copy=False
+    )
+    g = tmdb_graph.remove_isolated_nodes(g, copy=False)
+    g = tmdb_graph.get_largest_connected_component_graph(g)
+    _assert_same_graph(g, expected)
+    assert g_multi.number_of_edges() == n_edges
+
+
+def test_views_are_read_only(g_multi):
+    view = tmdb_graph.remove_isolated_nodes(g_multi, copy=False)
+    with pytest.raises(nx.NetworkXError):
+        view.add_node("new")
+    view.name = "renamed"
+    assert g_multi.name == "test"
+
+
+def test_filter_edges(g_multi):
+    cleaned = (
+        graph_views.GraphFilter(g_multi)
+        .filter_edges(lambda u, v, key: key != "HAS_KEYWORD")
+        .remove_isolated_nodes()
+    )
+    g = cleaned.materialize()
+    assert {key for _, _, key in g.edges(keys=True)} == {
+        "PARTICIPATED_IN",
+        "WORKED_ON",
+    }
+    assert {d["type"] for _, d in g.nodes(data=True)} == {"MOVIE", "PERSON"}
+
+
+@pytest.mark.parametrize("directed", [False, True])
+def test_get_connected_component_subgraphs(directed):
+    G = nx.gnm_random_graph(200, 150, seed=1, directed=directed)
+    G.name = "random"
+    tmp = G.to_undirected() if directed else G
+    expected = [G.subgraph(c).copy() for c in nx.connected_components(tmp)]
+    expected.sort(key=lambda x: x.number_of_nodes(), reverse=True)
+    for i in range(len(expected)):
+        expected[i].name = f"Component {i+1} of {G.name}"
+
+    for copy in [True, False]:
+        components = data_utils.get_connected_component_subgraphs(G, copy=copy)
+        assert len(components) == len(expected)
+        for actual, component in zip(components, expected):
+            _assert_same_graph(actual, component)
+    assert G.name == "random"
+
+
+@pytest.mark.parametrize("directed", [False, True])
+def test_connected_components(directed):
+    G = nx.gnm_random_graph(500, 300, seed=2, directed=directed)
+    expected = sorted(
+        (nx.weakly_connected_components if directed else nx.connected_components)(G),
+        key=len,
+        reverse=True,
+    )
+    components = graph_views.ConnectedComponents(G)
+    assert len(components) == len(expected)
+    np.testing.assert_array_equal(components.sizes, [len(c) for c in expected])
+    nodes = list(G)
+    for i, component in enumerate(expected):
+        assert components.nodes_of(i) == [n for n in nodes if n in component]
+        assert set(np.flatnonzero(components.labels == i)) == component
+
+    largest = components.largest_k(3)
+    assert [set(g) for g in largest] == expected[:3]
+    indices = components.largest_k(3, as_indices=True)
+    assert [set(idx.tolist()) for idx in indices] == expected[:3]
+    assert [set(g) for g in components] == expected
+
+    # the same labels from the array-backed graph
+    csr_components = graph_views.ConnectedComponents(csr_graph.from_networkx(G))
+    np.testing.assert_array_equal(csr_components.labels, components.labels)
+    with pytest.raises(TypeError):
+        csr_components.subgraph(0)
+
+
+def test_connected_components_of_a_view(g_multi):
+    view = tmdb_graph.remove_isolated_nodes(g_multi, copy=False)
+    components = graph_views.ConnectedComponents(view)
+    (largest,) = components.largest_k(1)
+    _assert_same_graph(
+        largest, g_multi.subgraph(max(nx.connected_components(view), key=len)).copy()
+    )
+
+
+class _CountingDict(dict):
+    scans = 0
+
+    def __iter__(self):
+        _CountingDict.scans += 1
+        return super().__iter__()
+
+
+class _CountingGraph(nx.Graph):
+    node_dict_factory = _CountingDict
+
+
+@pytest.mark.parametrize("copy", [True, False])
+def test_many_small_components(copy):
+    # building a component must not scan the whole graph: with a scan per component,
+    # 5,000 components take 5,000 passes over the nodes
+    G = _CountingGraph(nx.gnm_random_graph(10_000, 5_000, seed=3))
+    G.name = "random"
+    _CountingDict.scans = 0
+    components = data_utils.get_connected_component_subgraphs(G, copy=copy)
+    assert len(components) > 5_000
+    assert [len(c) for c in components] == sorted(
+        map(len, nx.connected_components(G)), reverse=True
+    )
+    assert sum(len(c) for c in components) == len(G)
+    assert _CountingDict.scans <= 2
+
+    # the chained filters iterate only the surviving nodes too
+    cleaned = graph_views.GraphFilter(G).remove_isolated_nodes()
+    _CountingDict.scans = 0
+    for component in cleaned.connected_components()[:1000]:
+        component.materialize()
+    assert _CountingDict.scans <= 2
@@ -0,0 +1,99 @@
+import json
+import time
+
+import networkx as nx
+import numpy as np
+import pytest
+
+import graph_utils
+import instrumentation
+
+
+@pytest.fixture
+def profiling():
+    instrumentation.reset()
+    instrumentation.enable()
+    yield
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+@instrumentation.instrumented(items=lambda n: n)
+def _allocate(n):
+    with instrumentation.span("inner") as s:
+        block = np.ones(n)
+        s.add_items(2)
+        s.add_items(3)
+    time.sleep(0.01)
+    return block.sum()
+
+
+def test_disabled():
+    instrumentation.reset()
+    assert not instrumentation.is_enabled()
+    with instrumentation.span("outer") as s:
+        s.add_items(1)
+    assert _allocate(10) == 10
+    assert instrumentation.records() == []
+    assert instrumentation.summary().empty
+
+
+def test_spans(profiling):
+    assert _allocate(1_000_000) == 1_000_000
+    inner, outer = instrumentation.records()
+    assert (inner.name, inner.depth, inner.parent) == ("inner", 1, "_allocate")
+    assert (outer.name, outer.depth, outer.parent) == ("_allocate", 0, None)
+    assert inner.items == 5 and outer.items == 1_000_000
+    # the array of 8 MB, which is still allocated when the inner span closes
+    assert inner.peak_bytes >= 8_000_000 and outer.peak_bytes >= inner.peak_bytes
+    assert outer.wall_seconds >= 0.01 + inner.wall_seconds
+    assert outer.start <= inner.start
+    assert outer.items_per_second == pytest.approx(1_000_000 / outer.wall_seconds)
+
+    _allocate(10)
+    summary = instrumentation.summary()
+    assert summary.loc["_allocate", "calls"] == 2
+    assert summary.loc["_allocate", "items"] == 1_000_010
+    assert summary.loc["inner", "peak_mb"] >= 8_000_000 / 2**20
+    assert summary.index[0] == "_allocate"
+
+
+def test_memory_not_traced():
+    instrumentation.reset()
+    instrumentation.enable(memory=False)
+    try:
+        _allocate(1000)
+    finally:
+        instrumentation.disable()
+    assert [r.peak_bytes for r in instrumentation.records()] == [None, None]
+    assert instrumentation.summary()["peak_mb"].isna().all()
+
+
+def test_exports(profiling, tmp_path):
+    graph_utils.triadic_metrics_undirected(nx.karate_club_graph())
+    names = [r.name for r in instrumentation.records()]
+    assert names[-1] == "triadic_metrics_undirected"
+    assert "triadic_metrics_undirected/triangles" in names
+
+    instrumentation.export_json(str(tmp_path / "profile.json"))
+    with open(tmp_path / "profile.json") as f:
+        records = json.load(f)
+    assert [r["name"] for r in records] == names
+    assert records[-1]["items"] == 34 and records[-1]["items_per_second"] > 0
+
+    instrumentation.export_chrome_trace(str(tmp_path / "profile.trace.json"))
+    with open(tmp_path / "profile.trace.json") as f:
+        events = json.load(f)["traceEvents"]
+    assert [e["name"] for e in events] == names
+    assert all(e["ph"] == "X" and e["dur"] >= 0 for e in events)
+    outer = events[-1]
+    assert all(outer["ts"] <= e["ts"] <= outer["ts"] + outer["dur"] for e in events)
+    assert outer["args"]["items"] == 34
+
+
+def test_drain_and_merge(profiling):
+    _allocate(10)
+    records = instrumentation.drain()
+    assert instrumentation.records() == []
+    instrumentation.merge(records)
+    assert instrumentation.records() == records
@@ -0,0 +1,80 @@
+from itertools import combinations
+
+import networkx as nx
+import numpy as np
+import pytest
+
+import csr_graph
+import data_utils
+import link_prediction
+
+NX_SCORES = {
+    "jaccard_coefficient": nx.jaccard_coefficient,
+    "adamic_adar_index": nx.adamic_adar_index,
+    "resource_allocation_index": nx.resource_allocation_index,
+    "preferential_attachment": nx.preferential_attachment,
+}
+
+
+@pytest.fixture(
+    params=[
+        "Montagna_phonecalls_edgelist",
+        "powerlaw_cluster",
+    ]
+)
+def G(request):
+    if request.param == "powerlaw_cluster":
+        G = nx.powerlaw_cluster_graph(200, 3, 0.3, seed=1)
+        G.add_node("isolated")
+        return nx.relabel_nodes(G, str)
+    return data_utils.get_graph(request.param)
+
+
+def _katz(G, pairs, beta, max_length):
+    nodes = list(G)
+    A = nx.to_numpy_array(G, nodelist=nodes, weight=None)
+    walks, K = np.eye(len(nodes)), np.zeros_like(A)
+    for length in range(1, max_length + 1):
+        walks = walks @ A
+        K += beta**length * walks
+    index = {node: i for i, node in enumerate(nodes)}
+    return [K[index[u], index[v]] for u, v in pairs]
+
+
+def test_link_prediction_scores(G):
+    rng = np.random.default_rng(0)
+    nodes = list(G)
+    pairs = [tuple(rng.choice(nodes, size=2, replace=False)) for _ in range(300)]
+    pairs += list(G.edges())[:50]
+    df = link_prediction.link_prediction_scores(G, pairs, max_entries=100)
+    assert list(df.columns) == ["u", "v"] + link_prediction.LINK_SCORE_COLUMNS
+    assert list(zip(df["u"], df["v"])) == pairs
+    assert df["common_neighbors"].tolist() == [
+        len(list(nx.common_neighbors(G, u, v))) for u, v in pairs
+    ]
+    for column, func in NX_SCORES.items():
+        expected = [score for *_, score in func(G, pairs)]
+        np.testing.assert_allclose(df[column], expected, err_msg=column)
+    for max_length in [1, 2, 3, 4]:
+        df = link_prediction.link_prediction_scores(
+            G, pairs, katz_beta=0.1, katz_max_length=max_length
+        )
+        np.testing.assert_allclose(df["katz"], _katz(G, pairs, 0.1, max_length))
+
+
+def test_distance_two_pairs(G):
+    lengths = dict(nx.all_pairs_shortest_path_length(G, cutoff=2))
+    expected = [(u, v) for u, v in combinations(G, 2) if lengths[u].get(v) == 2]
+    pairs = link_prediction.distance_two_pairs(G, max_entries=50)
+    assert sorted(map(tuple, pairs.tolist())) == sorted(expected)
+    assert len(pairs) == len(expected)
+
+    # the default candidates of the scores
+    df = link_prediction.link_prediction_scores(csr_graph.from_networkx(G))
+    assert sorted(zip(df["u"], df["v"])) == sorted(expected)
+    assert (df["common_neighbors"] > 0).all()
+
+
+def test_link_prediction_scores_directed():
+    with pytest.raises(nx.NetworkXNotImplemented):
+        link_prediction.link_prediction_scores(nx.DiGraph([(0, 1)]))
@@ -0,0 +1,80 @@
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+
+import csr_graph
+import neighborhoods
+
+
+def _by_bfs(G, depths):
+    return pd.DataFrame(
+        {
+            f"n_depth_{k}": [
+                len(nx.single_source_shortest_path_length(G, v, cutoff=k)) for v in G
+            ]
+            for k in depths
+        },
+        index=list(G),
+    )
+
+
+@pytest.mark.parametrize(
+    "G",
+    [
+        nx.karate_club_graph(),
+        nx.relabel_nodes(nx.powerlaw_cluster_graph(400, 2, 0.3, seed=1), str),
+        nx.gnp_random_graph(200, 0.012, seed=2, directed=True),
+        nx.path_graph(70),
+    ],
+)
+def test_neighborhood_sizes(G):
+    G = G.copy()
+    G.add_edge(list(G)[3], list(G)[3])
+    G.add_node("isolated")
+    depths = [0, 1, 2, 4, 9]
+    expected = _by_bfs(G, depths)
+    all_nodes = neighborhoods.neighborhood_sizes(G, depths=depths)
+    pd.testing.assert_frame_equal(all_nodes, expected, check_index_type=False)
+
+    # many blocks of sources, in parallel; a subset of the nodes
+    nodes = list(G)[::-3]
+    actual = neighborhoods.neighborhood_sizes(
+        csr_graph.from_networkx(G),
+        depths=depths,
+        nodes=nodes,
+        n_jobs=2,
+        memory_budget_mb=0.01,
+    )
+    pd.testing.assert_frame_equal(actual, all_nodes.loc[nodes])
+
+    estimated = neighborhoods.neighborhood_sizes(G, depths=depths, mode="hyperanf")
+    assert np.allclose(estimated["n_depth_0"], 1, rtol=0.01)
+    relative = estimated / expected - 1
+    assert relative.abs().mean().max() < 0.2
+
+
+def test_hyperanf_error():
+    G = nx.powerlaw_cluster_graph(3000, 3, 0.3, seed=3)
+    expected = _by_bfs(G, [4])["n_depth_4"]
+    for precision, tolerance in [(4, 0.5), (8, 0.15), (10, 0.08)]:
+        estimated = neighborhoods.neighborhood_sizes(
+            G, depths=[4], mode="hyperanf", precision=precision, seed=1
+        )["n_depth_4"]
+        # about 1.04 / sqrt(2 ** precision) relative standard error per counter; the
+        # estimates of overlapping neighbourhoods share their hashes
+        error = np.sqrt(((estimated / expected - 1) ** 2).mean())
+        assert error < tolerance
+
+
+def test_triangles_no_others():
+    G = nx.relabel_nodes(nx.powerlaw_cluster_graph(300, 2, 0.4, seed=5), str)
+    G.add_edges_from([("7", "7"), ("a", "b"), ("b", "c"), ("c", "a"), ("c", "d")])
+    triangles = nx.triangles(G)
+    df = neighborhoods.triangles_no_others(G)
+    assert df["triangles"].to_dict() == triangles
+    assert df["triangles_no_others"].to_dict() == {
+        v: sum(1 for u in G.neighbors(v) if triangles[u] == 1) for v in G
+    }
+    with pytest.raises(nx.NetworkXNotImplemented):
+        neighborhoods.triangles_no_others(nx.DiGraph([(0, 1)]))
@@ -0,0 +1,157 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+import null_models
+
+
+def _is_simple(graph):
+    G = graph.to_networkx()
+    return nx.number_of_selfloops(G) == 0 and G.number_of_edges() == (
+        graph.adjacency().nnz // (1 if graph.directed else 2)
+    )
+
+
+def _same_graph(graph, G):
+    H = graph.to_networkx()
+    return list(H) == list(G) and nx.utils.edges_equal(H.edges(), G.edges())
+
+
+def test_gnp_random_graph():
+    n, p = 2000, 0.01
+    graph = null_models.gnp_random_graph(n, p, seed=0)
+    expected = p * n * (n - 1) / 2
+    assert abs(graph.number_of_edges - expected) < 5 * np.sqrt(expected)
+    assert _is_simple(graph)
+    assert graph.number_of_nodes == n
+    # every node is hit, not only the pairs at the start
+    assert graph.degree().min() > 0
+
+    same = null_models.gnp_random_graph(n, p, seed=0)
+    np.testing.assert_array_equal(graph.indices, same.indices)
+
+    assert null_models.gnp_random_graph(50, 0.0).number_of_edges == 0
+    complete = null_models.gnp_random_graph(50, 1.0)
+    assert _same_graph(complete, nx.complete_graph(50))
+    with pytest.raises(ValueError):
+        null_models.gnp_random_graph(10, 1.5)
+
+
+def test_gnp_random_graph_directed():
+    complete = null_models.gnp_random_graph(20, 1.0, directed=True)
+    assert _same_graph(complete, nx.complete_graph(20, nx.DiGraph))
+
+    n, p = 1000, 0.02
+    graph = null_models.gnp_random_graph(n, p, seed=1, directed=True)
+    expected = p * n * (n - 1)
+    assert abs(graph.number_of_edges - expected) < 5 * np.sqrt(expected)
+    assert _is_simple(graph)
+
+
+def test_configuration_model():
+    degree = np.random.default_rng(0).integers(1, 20, 500)
+    degree[0] += degree.sum() % 2
+
+    multigraph = null_models.configuration_model(degree, seed=0, simple=False)
+    # every stub is an edge end; a self-loop is stored once and has two ends
+    rows = np.repeat(np.arange(len(degree)), np.diff(multigraph.indptr))
+    loops = rows == multigraph.indices
+    np.testing.assert_array_equal(
+        np.bincount(rows, minlength=len(degree))
+        + np.bincount(rows[loops], minlength=len(degree)),
+        degree,
+    )
+
+    graph = null_models.configuration_model(degree, seed=0)
+    assert _is_simple(graph)
+    realised = graph.degree()
+    assert (realised <= degree).all()
+    # few stubs are lost in a sparse graph
+    assert realised.sum() > 0.95 * degree.sum()
+
+    with pytest.raises(nx.NetworkXError):
+        null_models.configuration_model([1, 2, 2])
+
+
+def test_degree_preserving_rewire():
+    G = nx.powerlaw_cluster_graph(500, 4, 0.5, seed=0)
+    G.add_edge(3, 3)
+    rewired = null_models.degree_preserving_rewire(G, seed=0)
+    R = rewired.to_networkx()
+    assert dict(R.degree()) == dict(G.degree())
+    assert list(nx.selfloop_edges(R)) == [(3, 3)]
+    # the swaps destroy most of the clustering, and almost every edge moves
+    assert nx.average_clustering(R) < 0.5 * nx.average_clustering(G)
+    assert len(set(map(frozenset, R.edges())) & set(map(frozenset, G.edges()))) < (
+        0.2 * G.number_of_edges()
+    )
+
+    R = null_models.degree_preserving_rewire(G, n_swaps=7, seed=0).to_networkx()
+    changed = set(map(frozenset, G.edges())) - set(map(frozenset, R.edges()))
+    assert len(changed) <= 14 and changed
+
+    with pytest.raises(nx.NetworkXAlgorithmError):
+        # no swap of a star keeps it simple
+        null_models.degree_preserving_rewire(nx.star_graph(5), n_swaps=1, seed=0)
+    with pytest.raises(nx.NetworkXNotImplemented):
+        null_models.degree_preserving_rewire(nx.DiGraph([(0, 1), (2, 3)]))
+
+
+def test_watts_strogatz_graph():
+    lattice = null_models.watts_strogatz_graph(30, 4, 0.0)
+    assert _same_graph(lattice, nx.watts_strogatz_graph(30, 4, 0.0))
+
+    n, k = 1000, 6
+    graph = null_models.watts_strogatz_graph(n, k, 0.2, seed=0)
+    assert graph.number_of_edges == n * k // 2
+    assert _is_simple(graph)
+    ring = set(map(frozenset, nx.watts_strogatz_graph(n, k, 0.0).edges()))
+    moved = n * k // 2 - len(set(map(frozenset, graph.to_networkx().edges())) & ring)
+    assert abs(moved - 0.2 * n * k / 2) < 5 * np.sqrt(0.2 * 0.8 * n * k / 2)
+
+    # every edge rewired, in a graph too dense for all of them to find a node
+    dense = null_models.watts_strogatz_graph(9, 8, 1.0, seed=0)
+    assert dense.number_of_edges == 36 and _is_simple(dense)
+    with pytest.raises(nx.NetworkXError):
+        null_models.watts_strogatz_graph(5, 6, 0.1)
+
+
+def test_graph_metrics():
+    G = nx.karate_club_graph()
+    G.add_edges_from([(100, 101), (101, 102)])
+    metrics = null_models.graph_metrics(G)
+    assert metrics["clustering"] == pytest.approx(nx.average_clustering(G))
+    assert metrics["triangles"] == sum(nx.triangles(G).values()) // 3
+    assert metrics["path_length"] == pytest.approx(
+        nx.average_shortest_path_length(nx.karate_club_graph())
+    )
+    with pytest.raises(ValueError):
+        null_models.graph_metrics(G, ["diameter"])
+
+
+@pytest.mark.parametrize("model", null_models.MODELS)
+def test_null_model_ensemble(model):
+    G = nx.karate_club_graph()
+    ensemble = null_models.null_model_ensemble(G, model, n_replicas=6, seed=0)
+    assert list(ensemble.columns) == null_models.METRICS
+    assert len(ensemble) == 6 and ensemble.notna().all().all()
+    # the replicas differ, and do not depend on the number of workers
+    assert ensemble["triangles"].nunique() > 1
+    parallel = null_models.null_model_ensemble(G, model, n_replicas=6, seed=0, n_jobs=2)
+    assert ensemble.equals(parallel)
+
+
+def test_compare_with_ensemble():
+    G = nx.powerlaw_cluster_graph(300, 3, 0.8, seed=0)
+    ensemble = null_models.null_model_ensemble(
+        G, "rewire", n_replicas=20, n_path_sources=50, seed=0
+    )
+    comparison = null_models.compare_with_ensemble(G, ensemble)
+    assert list(comparison.index) == null_models.METRICS
+    # the clustering of the observed graph is far above that of its rewirings
+    assert comparison.loc["clustering", "z_score"] > 5
+    assert comparison.loc["clustering", "percentile"] == 1.0
+    assert comparison.loc["triangles", "observed"] == (
+        sum(nx.triangles(G).values()) // 3
+    )
+    np.testing.assert_allclose(comparison["mean"], ensemble.mean())
@@ -0,0 +1,149 @@
+from collections import Counter
+
+import networkx as nx
+import numpy as np
+import pytest
+
+import csr_graph
+import random_walks
+
+
+def _implied_probabilities(indptr, prob, alias):
+    degree = np.diff(indptr)
+    row = np.repeat(np.arange(len(degree)), degree)
+    return (prob + np.bincount(alias, 1 - prob, minlength=len(prob))) / degree[row]
+
+
+@pytest.mark.parametrize("integer", [False, True])
+def test_alias_tables(integer):
+    rng = np.random.default_rng(0)
+    degree = rng.integers(0, 12, 300)
+    indptr = np.concatenate([[0], np.cumsum(degree)])
+    if integer:
+        # integer weights tie the running deficits and excesses exactly
+        weights = rng.integers(0, 4, indptr[-1]).astype(float)
+    else:
+        weights = rng.random(indptr[-1]) ** 3
+        weights[rng.random(len(weights)) < 0.1] = 0
+    weights[indptr[5] : indptr[6]] = 0  # a row without weight: uniform
+    prob, alias = random_walks.alias_tables(indptr, weights)
+
+    row = np.repeat(np.arange(len(degree)), degree)
+    assert (row[alias] == row).all()
+    implied = _implied_probabilities(indptr, prob, alias)
+    total = np.bincount(row, weights)[row]
+    expected = np.where(total > 0, weights / np.maximum(total, 1e-300), 1 / degree[row])
+    np.testing.assert_allclose(implied, expected, atol=1e-12)
+
+
+@pytest.mark.parametrize(
+    "weights",
+    [[1, 2, 2, 2, 3, 0], [2, 3, 3, 0], [1, 1, 2, 0, 0, 4], [0, 0, 1, 1]],
+)
+def test_alias_tables_ties(weights):
+    weights = np.array(weights, dtype=float)
+    indptr = np.array([0, len(weights)])
+    implied = _implied_probabilities(
+        indptr, *random_walks.alias_tables(indptr, weights)
+    )
+    np.testing.assert_allclose(implied, weights / weights.sum(), atol=1e-12)
+
+
+def test_weighted_steps():
+    G = nx.Graph()
+    for leaf, weight in zip("abcdef", [1, 2, 2, 2, 3, 0]):
+        G.add_edge("hub", leaf, weight=weight)
+    walks = np.concatenate(
+        list(
+            random_walks.random_walk_batches(
+                csr_graph.from_networkx(G, edge_attrs=["weight"]),
+                walk_length=2,
+                num_walks=20_000,
+                weight="weight",
+                seed=0,
+            )
+        )
+    )
+    steps = walks[walks[:, 0] == 0, 1]
+    frequencies = np.bincount(steps, minlength=7)[1:] / len(steps)
+    np.testing.assert_allclose(frequencies, [0.1, 0.2, 0.2, 0.2, 0.3, 0], atol=0.015)
+
+
+def _transition_z_scores(G, walks, p, q):
+    # the observed frequency of every move t -> v -> x, as a z-score against the
+    # exact second-order probability
+    moves = Counter()
+    for walk in walks:
+        moves.update(zip(walk, walk[1:], walk[2:]))
+    arrivals = Counter()
+    for (t, v, _), count in moves.items():
+        arrivals[t, v] += count
+    z = []
+    for (t, v), total in arrivals.items():
+        if total < 1000:
+            continue
+        bias = {
+            x: d.get("weight", 1) * (1 / p if x == t else 1 if x in G[t] else 1 / q)
+            for x, d in G[v].items()
+        }
+        if len(bias) == 1:
+            continue
+        for x, b in bias.items():
+            expected = b / sum(bias.values())
+            observed = moves[t, v, x] / total
+            z.append((observed - expected) / np.sqrt(expected * (1 - expected) / total))
+    return np.array(z)
+
+
+@pytest.mark.parametrize("p, q", [(1, 1), (0.25, 4), (4, 0.25)])
+def test_random_walks_distribution(p, q):
+    G = nx.karate_club_graph()
+    walks = np.concatenate(
+        list(
+            random_walks.random_walk_batches(
+                G, walk_length=30, num_walks=200, p=p, q=q, seed=1, batch_size=2500
+            )
+        )
+    )
+    assert walks.shape == (200 * 34, 30)
+    assert sorted(np.bincount(walks[:, 0])) == [200] * 34
+    z = _transition_z_scores(G, walks.tolist(), p, q)
+    assert len(z) > 100
+    assert abs(z.mean()) < 0.3
+    assert 0.8 < z.std() < 1.2
+
+
+def test_random_walks():
+    G = nx.relabel_nodes(nx.gnp_random_graph(60, 0.05, seed=0, directed=True), str)
+    G.add_node("isolated")
+    kwargs = dict(walk_length=12, num_walks=3, p=0.5, q=2, seed=3, batch_size=50)
+    walks = list(random_walks.random_walks(G, **kwargs))
+    assert len(walks) == 3 * G.number_of_nodes()
+    for walk in walks:
+        assert 1 <= len(walk) <= 12
+        assert all(G.has_edge(u, v) for u, v in zip(walk, walk[1:]))
+        # dead ends stop the walk
+        assert len(walk) == 12 or G.out_degree(walk[-1]) == 0
+    assert ["isolated"] in walks
+
+    # reproducible, also across processes and from a CSR graph
+    graph = csr_graph.from_networkx(G)
+    assert list(random_walks.random_walks(graph, n_jobs=2, **kwargs)) == walks
+    corpus = random_walks.WalkCorpus(G, **kwargs)
+    assert list(corpus) == walks
+    assert list(corpus) == walks
+
+
+def test_write_walks(tmp_path):
+    G = nx.karate_club_graph()
+    path = str(tmp_path / "walks.txt")
+    n_walks = random_walks.write_walks(G, path, walk_length=5, num_walks=2, seed=0)
+    assert n_walks == 68
+    with open(path) as f:
+        lines = [line.split() for line in f]
+    assert lines == list(
+        random_walks.random_walks(G, walk_length=5, num_walks=2, seed=0)
+    )
+    assert all(
+        G.has_edge(int(u), int(v)) for walk in lines for u, v in zip(walk, walk[1:])
+    )
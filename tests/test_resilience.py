@@ -0,0 +1,146 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+import csr_graph
+import data_utils
+import resilience
+
+
+@pytest.fixture(
+    params=["Montagna_meetings_edgelist.csv", "Montagna_phonecalls_edgelist.csv"]
+)
+def G(request):
+    return data_utils.load_graph_from_local(request.param)
+
+
+def _collective_influence(graph, node):
+    # the chapter's definition
+    sum_neighbors = sum(graph.degree(u) - 1 for u in graph.neighbors(node))
+    return (graph.degree(node) - 1) * sum_neighbors
+
+
+def _scores(graph, strategy):
+    if strategy == "degree":
+        return dict(graph.degree())
+    if strategy == "betweenness":
+        return nx.betweenness_centrality(graph)
+    return {node: _collective_influence(graph, node) for node in graph}
+
+
+def _order_by_recomputing(G, strategy, adaptive):
+    # the chapter's loop: rank, remove the top node, repeat
+    graph = G.copy()
+    scores = _scores(graph, strategy)
+    order = []
+    while graph.number_of_nodes():
+        if adaptive:
+            scores = _scores(graph, strategy)
+        ranked = sorted(
+            ((node, scores[node]) for node in graph),
+            key=lambda x: x[1],
+            reverse=True,
+        )
+        node = ranked[0][0]
+        order.append(node)
+        graph.remove_node(node)
+    return order
+
+
+@pytest.mark.parametrize("strategy", ["degree", "collective_influence"])
+@pytest.mark.parametrize("adaptive", [True, False])
+def test_attack_order(G, strategy, adaptive):
+    expected = _order_by_recomputing(G, strategy, adaptive)
+    order = resilience.attack_order(G, strategy, adaptive)
+    assert [list(G)[i] for i in order] == expected
+
+
+def test_attack_order_betweenness(G):
+    # near-ties in betweenness can be ordered differently after floating-point
+    # rounding, so only the first removals are compared
+    expected = _order_by_recomputing(G, "betweenness", adaptive=True)
+    order = resilience.attack_order(G, "betweenness", n_steps=10)
+    assert [list(G)[i] for i in order] == expected[:10]
+    batched = resilience.attack_order(G, "betweenness", n_steps=10, batch_size=3)
+    assert len(set(batched.tolist())) == 10
+    assert batched[0] == order[0]
+
+
+def test_random_order(G):
+    order = resilience.attack_order(G, "random", seed=1)
+    assert sorted(order.tolist()) == list(range(len(G)))
+    np.testing.assert_array_equal(order, resilience.attack_order(G, "random", seed=1))
+
+
+def test_giant_component_sizes(G):
+    order = resilience.attack_order(G, "random", seed=3, n_steps=60)
+    sizes = resilience.giant_component_sizes(G, order)
+    nodes = list(G)
+    graph = G.copy()
+    expected = [len(max(nx.connected_components(graph), key=len))]
+    for i in order:
+        graph.remove_node(nodes[i])
+        expected.append(len(max(nx.connected_components(graph), key=len)))
+    np.testing.assert_array_equal(sizes, expected)
+
+
+def test_path_metrics(G):
+    metrics = resilience.path_metrics(csr_graph.from_networkx(G))
+    giant = G.subgraph(max(nx.connected_components(G), key=len))
+    assert metrics["avg_shortest_path_length"] == pytest.approx(
+        nx.average_shortest_path_length(giant)
+    )
+    assert metrics["graph_diameter"] == nx.diameter(giant)
+    assert metrics["efficiency"] == pytest.approx(nx.global_efficiency(G))
+    assert metrics["clustering"] == pytest.approx(nx.average_clustering(G))
+    assert metrics["avg_shortest_path_length_half_width"] == 0.0
+
+    sampled = resilience.path_metrics(csr_graph.from_networkx(G), n_sources=30, seed=0)
+    assert sampled["graph_diameter"] <= metrics["graph_diameter"]
+    assert sampled["avg_shortest_path_length"] == pytest.approx(
+        metrics["avg_shortest_path_length"], rel=0.2
+    )
+    assert 0 < sampled["avg_shortest_path_length_half_width"] < 0.5
+    assert abs(
+        sampled["avg_shortest_path_length"] - metrics["avg_shortest_path_length"]
+    ) < (3 * sampled["avg_shortest_path_length_half_width"])
+
+
+def test_simulate_attack(G):
+    df = resilience.simulate_attack(G, "degree", metrics_every=5)
+    assert len(df) == len(G) + 1
+    assert df["removed_node"].iloc[0] is None
+    assert set(df["removed_node"].iloc[1:]) == set(G)
+    assert df["largest_cc_size"].iloc[-1] == 0
+    assert (np.diff(df["largest_cc_size"]) <= 0).all()
+    metric_rows = df[df["graph_diameter"].notna()]
+    assert metric_rows["n_removed"].tolist() == list(range(0, len(df), 5))
+
+    # the metrics after ten removals equal networkx's on the remaining graph
+    graph = G.copy()
+    graph.remove_nodes_from(df["removed_node"].iloc[1:11])
+    giant = graph.subgraph(max(nx.connected_components(graph), key=len))
+    row = df.iloc[10]
+    assert row["largest_cc_size"] == len(giant)
+    assert row["avg_shortest_path_length"] == pytest.approx(
+        nx.average_shortest_path_length(giant)
+    )
+    assert row["graph_diameter"] == nx.diameter(giant)
+    assert row["efficiency"] == pytest.approx(nx.global_efficiency(graph))
+    assert row["clustering"] == pytest.approx(nx.average_clustering(graph))
+
+
+def test_simulate_attack_samples_paths():
+    # larger graphs sample 500 BFS sources by default
+    G = nx.powerlaw_cluster_graph(1200, 3, 0.3, seed=0)
+    sampled = resilience.simulate_attack(G, "degree", n_steps=2, metrics_every=1)
+    exact = resilience.simulate_attack(
+        G, "degree", n_steps=2, metrics_every=1, n_path_sources=None
+    )
+    assert (exact["avg_shortest_path_length_half_width"] == 0).all()
+    half_width = sampled["avg_shortest_path_length_half_width"]
+    assert (half_width > 0).all()
+    assert (
+        abs(sampled["avg_shortest_path_length"] - exact["avg_shortest_path_length"])
+        < 3 * half_width
+    ).all()
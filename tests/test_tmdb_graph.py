@@ -0,0 +1,192 @@
+import json
+import os
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+from yake import yake
+
+import caching
+from MLConnectedWorldBook.src import tmdb_graph
+from .fixtures import book_dir, project_dir
+
+
+@pytest.fixture
+def df_movies(book_dir):
+    df = pd.read_csv(os.path.join(book_dir, "data", "tmdb_5000_movies.csv.zip"))
+    # a few rows with duplicated titles and with missing overviews
+    return pd.concat([df.head(60), df.head(3), df[df.overview.isna()]])
+
+
+@pytest.fixture
+def keyword_cache(tmp_path, monkeypatch):
+    directory = tmp_path / "keywords"
+    cache = caching.ResultCache(str(directory), max_bytes=2**30)
+    monkeypatch.setattr(tmdb_graph, "keyword_cache", cache)
+    return directory
+
+
+def _build_graph_row_by_row(df, n_grams=2, top=10):
+    # the original implementation
+    kw_extractor = yake.KeywordExtractor(
+        lan="en", n=n_grams, dedupLim=0.9, dedupFunc="seqm", windowsSize=1, top=top
+    )
+    g = nx.Graph()
+    for _, row in df.iterrows():
+        movie_title = row["title"]
+        overview = row["overview"]
+        if not overview:
+            continue
+        keywords = kw_extractor.extract_keywords(str(overview).lower())
+        keywords = [(k[0], np.log10(1 / k[1])) for k in keywords]
+        if movie_title not in g:
+            g.add_node(movie_title, label=movie_title, type="MOVIE", count=1)
+        else:
+            g.nodes[movie_title]["count"] += 1
+        for keyword, weight in keywords:
+            if keyword not in g:
+                g.add_node(keyword, label=keyword, type="KEYWORD", count=1)
+            else:
+                g.nodes[keyword]["count"] += 1
+            if g.has_edge(movie_title, keyword):
+                g.edges[movie_title, keyword]["weight"] += weight
+            else:
+                g.add_edge(movie_title, keyword, weight=weight)
+    return g
+
+
+def _assert_graphs_equal(actual, expected):
+    assert list(actual.nodes(data=True)) == list(expected.nodes(data=True))
+    assert list(actual.edges) == list(expected.edges)
+    np.testing.assert_allclose(
+        [w for _, _, w in actual.edges(data="weight")],
+        [w for _, _, w in expected.edges(data="weight")],
+        rtol=1e-12,
+    )
+
+
+def test_build_movies_and_keywords_graph(df_movies, keyword_cache, monkeypatch):
+    expected = _build_graph_row_by_row(df_movies, top=5)
+    actual = tmdb_graph.build_movies_and_keywords_graph(
+        df_movies, top=5, n_jobs=2, cachier__skip_cache=True
+    )
+    _assert_graphs_equal(actual, expected)
+    # one entry per distinct overview
+    n_overviews = len({str(o).lower() for o in df_movies["overview"] if o})
+    assert len(os.listdir(keyword_cache / "tmdb_graph.extract_keywords")) == n_overviews
+
+    # smaller `top` values are served from the keyword cache
+    def fail(*args, **kwargs):
+        raise AssertionError("keywords were extracted again")
+
+    monkeypatch.setattr(tmdb_graph, "_extract_keywords_batch", fail)
+    actual = tmdb_graph.build_movies_and_keywords_graph(
+        df_movies, top=3, n_jobs=1, cachier__skip_cache=True
+    )
+    _assert_graphs_equal(actual, _build_graph_row_by_row(df_movies, top=3))
+
+
+@pytest.fixture
+def df_credits(df_movies):
+    rng = np.random.default_rng(0)
+    names = [f"person {i}" for i in range(80)] + ["love", "Avatar"]
+    jobs = ["Director", "Producer", "Writer", "Screenplay", "Editor", "Sound"]
+    rows = []
+    for title in list(df_movies.title.unique()) + ["A movie without overview"]:
+        cast = [
+            {"name": str(rng.choice(names)), "order": int(order), "character": "x"}
+            for order in rng.permutation(12)
+        ]
+        crew = [
+            {"name": str(rng.choice(names)), "job": str(rng.choice(jobs))}
+            for _ in range(rng.integers(0, 8))
+        ]
+        rows.append(
+            {
+                "movie_id": len(rows),
+                "title": title,
+                "cast": json.dumps(cast),
+                "crew": json.dumps(crew),
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture
+def credits_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(tmdb_graph, "credits_cache_dir", str(tmp_path / "credits"))
+    return tmp_path / "credits"
+
+
+def _graph_with_credit_info_row_by_row(g_movies_and_keywords, df_credits, top_n_cast):
+    # the original implementation
+    credit_edges = []
+    for _, row in df_credits.iterrows():
+        for c in json.loads(row.cast):
+            if c["order"] > top_n_cast:
+                continue
+            credit_edges.append(
+                {"MOVIE": row["title"], "PERSON": c["name"], "type": "PARTICIPATED_IN"}
+            )
+        for c in json.loads(row.crew):
+            if c["job"] not in ["Director", "Producer", "Writer", "Screenplay"]:
+                continue
+            credit_edges.append(
+                {"MOVIE": row["title"], "PERSON": c["name"], "type": "WORKED_ON"}
+            )
+    g_multi = nx.MultiGraph()
+    for node, data in g_movies_and_keywords.nodes(data=True):
+        g_multi.add_node(node, **data)
+    for u, v, data in g_movies_and_keywords.edges(data=True):
+        g_multi.add_edge(u, v, key="HAS_KEYWORD", **data)
+    for row in credit_edges:
+        movie, person, edge_type = row["MOVIE"], row["PERSON"], row["type"]
+        if movie not in g_multi.nodes:
+            g_multi.add_node(movie, type="MOVIE")
+        if person not in g_multi.nodes:
+            g_multi.add_node(person, type="PERSON")
+        if not g_multi.has_edge(movie, person, key=edge_type):
+            g_multi.add_edge(movie, person, key=edge_type)
+    return g_multi
+
+
+def test_get_graph_with_credit_info(
+    df_movies, df_credits, keyword_cache, credits_cache
+):
+    g = tmdb_graph.build_movies_and_keywords_graph(
+        df_movies, n_jobs=1, cachier__skip_cache=True
+    )
+    for top_n_cast in [20, 3]:
+        expected = _graph_with_credit_info_row_by_row(g, df_credits, top_n_cast)
+        actual = tmdb_graph.get_graph_with_credit_info(g, df_credits, top_n_cast)
+        assert list(actual.nodes(data=True)) == list(expected.nodes(data=True))
+        assert list(actual.edges(keys=True, data=True)) == list(
+            expected.edges(keys=True, data=True)
+        )
+        # the parsed credits are cached and reused
+        assert len(os.listdir(credits_cache)) == 1
+
+
+def test_get_graph_with_credit_info_missing_names(
+    df_movies, df_credits, keyword_cache, credits_cache
+):
+    g = tmdb_graph.build_movies_and_keywords_graph(
+        df_movies, n_jobs=1, cachier__skip_cache=True
+    )
+    expected = _graph_with_credit_info_row_by_row(g, df_credits, 20)
+    # malformed credits without a name, next to the well-formed ones
+    df_credits = df_credits.copy()
+    cast = json.loads(df_credits.loc[0, "cast"])
+    df_credits.loc[0, "cast"] = json.dumps(cast + [{"name": None, "order": 0}])
+    crew = json.loads(df_credits.loc[1, "crew"])
+    crew.append({"name": None, "job": "Director"})
+    df_credits.loc[1, "crew"] = json.dumps(crew)
+    assert tmdb_graph.parse_credits(df_credits)["name"].isna().sum() == 2
+
+    actual = tmdb_graph.get_graph_with_credit_info(g, df_credits)
+    named = [n for n in actual if not pd.isna(n)]
+    assert list(actual.subgraph(named).edges(keys=True)) == list(
+        expected.edges(keys=True)
+    )
+    assert actual.number_of_edges() == expected.number_of_edges() + 2
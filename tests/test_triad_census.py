@@ -0,0 +1,101 @@
+from itertools import combinations
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+
+import csr_graph
+import data_utils
+import graph_utils
+import triad_census
+
+
+def _random_digraph(n, p, seed):
+    G = nx.gnp_random_graph(n, p, directed=True, seed=seed)
+    rng = np.random.default_rng(seed)
+    # mutual links and self-loops, which the census ignores
+    for u, v in list(G.edges())[::5]:
+        G.add_edge(v, u)
+    for u in rng.choice(n, size=3, replace=False):
+        G.add_edge(int(u), int(u))
+    return nx.relabel_nodes(G, {u: f"node {u}" for u in G})
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("n, p", [(30, 0.2), (80, 0.05), (5, 0.0)])
+def test_triadic_census(n, p, seed):
+    G = _random_digraph(n, p, seed)
+    expected = nx.triadic_census(G)
+    census = triad_census.triadic_census(G)
+    assert census == expected
+    assert list(census) == list(triad_census.TRIAD_NAMES)
+    assert triad_census.triadic_census(csr_graph.from_networkx(G)) == expected
+    # small batches and parallel shards
+    assert triad_census.triadic_census(G, max_candidates=10) == expected
+    assert triad_census.triadic_census(G, n_jobs=2, max_candidates=10) == expected
+
+
+def test_triadic_census_rabbi_graph():
+    G = data_utils.get_graph("rabbi_quotation_data")
+    assert triad_census.triadic_census(G) == nx.triadic_census(G)
+
+
+def test_triadic_census_undirected():
+    with pytest.raises(nx.NetworkXNotImplemented):
+        triad_census.triadic_census(nx.path_graph(4))
+
+
+def test_sampled_triadic_census():
+    G = _random_digraph(300, 0.02, seed=0)
+    expected = nx.triadic_census(G)
+    m = nx.Graph(G.to_undirected()).number_of_edges() - nx.number_of_selfloops(G)
+
+    # all the edges: exact
+    df = triad_census.sampled_triadic_census(G, n_edges=m, seed=0)
+    assert df["estimate"].round().astype(int).to_dict() == expected
+    assert (df["half_width"] == 0).all()
+
+    # a sample: the totals add up, and the intervals mostly cover the truth
+    covered = []
+    for seed in range(20):
+        df = triad_census.sampled_triadic_census(G, n_edges=m // 4, seed=seed)
+        assert df["estimate"].sum() == pytest.approx(sum(expected.values()))
+        assert (df["half_width"] > 0).any()
+        truth = df.index.map(expected)
+        covered.append((np.abs(df["estimate"] - truth) <= df["half_width"]).mean())
+    assert np.mean(covered) > 0.8
+
+
+def _profile_by_enumeration(G):
+    H = nx.DiGraph(G)
+    H.remove_edges_from(nx.selfloop_edges(H))
+    profile = pd.DataFrame(0, index=list(G), columns=list(triad_census.TRIAD_NAMES))
+    for nodes in combinations(G, 3):
+        profile.loc[list(nodes), nx.triad_type(H.subgraph(nodes))] += 1
+    return profile
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_triad_profile(seed):
+    G = _random_digraph(20, 0.2, seed)
+    expected = _profile_by_enumeration(G)
+    profile = triad_census.triad_profile(G)
+    pd.testing.assert_frame_equal(profile, expected, check_names=False)
+    parallel = triad_census.triad_profile(G, n_jobs=2, max_candidates=10)
+    pd.testing.assert_frame_equal(parallel, profile)
+
+
+@pytest.mark.parametrize(
+    "dataset_name", ["rabbi_quotation_data", "corporate_directional"]
+)
+def test_triad_profile_totals(dataset_name):
+    G = data_utils.get_graph(dataset_name)
+    profile = triad_census.triad_profile(G)
+    assert list(profile.index) == list(G)
+    # every triad is counted at its three nodes
+    assert (profile.sum() == 3 * pd.Series(nx.triadic_census(G))).all()
+
+    metrics = graph_utils.triadic_metrics_directed(G)
+    assert list(metrics.columns) == [f"triad_{name}" for name in profile.columns]
+    np.testing.assert_array_equal(metrics.values, profile.values)
@@ -0,0 +1,446 @@
+"""
+Directed triadic census on CSR arrays.
+
+The census counts the triples of nodes of a directed graph by their isomorphism class
+(the 16 MAN classes "003" ... "300"), with the same results as `nx.triadic_census`.
+
+networkx follows Batagelj & Mrvar (2001): every connected triad is counted once, at
+one of its undirected edges (v, u) with v < u, as the triple (v, u, w) for the
+neighbours w of v or u with u < w, or with v < w < u if w is not a neighbour of v.
+That visits every open wedge, which is quadratic in the degree of the hubs. Here the
+same classification is split in three parts, all on NumPy arrays:
+
+- the triads with two dyads (open wedges) depend only on the types of the two dyads
+  (out, in or mutual) at their centre, so they are counted per node from the numbers
+  of dyads of each type, minus the wedges that are closed;
+- the triangles are enumerated once each, along the edges oriented by degree, and
+  classified by looking up their six links in the sorted edge keys with
+  `searchsorted`. Shards of source nodes can be processed in parallel;
+- the triads with one dyad follow from a formula per edge, and the empty triads
+  ("003") from the total.
+
+For very large graphs, `sampled_triadic_census` computes the first and third parts
+exactly and estimates the triangle part from a uniform sample of the oriented edges,
+with normal confidence intervals.
+"""
+
+from math import comb
+from typing import Union
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from joblib import Parallel, delayed
+from networkx.algorithms.triads import TRIAD_NAMES, TRICODE_TO_NAME
+from scipy import stats
+
+import csr_graph
+
+# column of every tricode (0..63) in TRIAD_NAMES order
+_TRICODE_COLUMN = np.array(
+    [TRIAD_NAMES.index(TRICODE_TO_NAME[code]) for code in range(64)]
+)
+
+
+def _prepare(G: Union[nx.DiGraph, csr_graph.CSRGraph]) -> tuple:
+    """
+    Sorted keys (row * n + column) of the directed links, the undirected adjacency
+    without self-loops, the undirected edges (v, u) with v < u and the node ids.
+    """
+    graph = G if isinstance(G, csr_graph.CSRGraph) else csr_graph.from_networkx(G)
+    if not graph.directed:
+        raise nx.NetworkXNotImplemented("not implemented for undirected type")
+    n = graph.number_of_nodes
+    row = np.repeat(np.arange(n, dtype=np.int64), np.diff(graph.indptr))
+    col = graph.indices.astype(np.int64)
+    keep = row != col
+    keys = np.unique(row[keep] * n + col[keep])
+    A = sp.csr_array(
+        (np.ones(len(keys), dtype=np.int8), (keys // n, keys % n)), shape=(n, n)
+    )
+    S = (A + A.T).tocsr()
+    S.sort_indices()
+    S.data[:] = 1
+    upper = sp.triu(S, k=1).tocoo()
+    order = np.lexsort((upper.col, upper.row))
+    edges = np.column_stack([upper.row[order], upper.col[order]]).astype(np.int64)
+    indptr, indices = S.indptr.astype(np.int64), S.indices.astype(np.int64)
+    return n, keys, indptr, indices, edges, graph.nodes
+
+
+def _has(keys: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Membership of `query` in the sorted array `keys`."""
+    if len(keys) == 0:
+        return np.zeros(len(query), dtype=bool)
+    found = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+    return keys[found] == query
+
+
+def _neighbor_entries(indptr, indices, nodes):
+    """The neighbours of every node in `nodes`, concatenated, with their owners."""
+    degree = indptr[nodes + 1] - indptr[nodes]
+    owner = np.repeat(np.arange(len(nodes)), degree)
+    start = np.cumsum(degree) - degree
+    entry = indptr[nodes][owner] + np.arange(len(owner)) - start[owner]
+    return owner, indices[entry]
+
+
+def _dyad_types(n, keys, edges):
+    """
+    The type of every undirected edge (v, u) seen from v: 1 if only v -> u, 2 if only
+    u -> v, 3 if mutual.
+    """
+    v, u = edges[:, 0], edges[:, 1]
+    return _has(keys, v * n + u) + 2 * _has(keys, u * n + v)
+
+
+def _swap(dyad):
+    """The same dyad types, seen from the other node."""
+    return ((dyad & 1) << 1) | ((dyad >> 1) & 1)
+
+
+def _wedge_pairs(by_type: np.ndarray) -> np.ndarray:
+    """
+    The number of pairs of dyads, per triad class, at centre nodes with `by_type[:, t]`
+    dyads of type t (rows are nodes): the open and closed two-dyad wedges.
+    """
+    pairs = np.zeros((len(by_type), len(TRIAD_NAMES)), dtype=np.int64)
+    for first in (1, 2, 3):
+        for second in range(first, 4):
+            if first == second:
+                count = by_type[:, first] * (by_type[:, first] - 1) // 2
+            else:
+                count = by_type[:, first] * by_type[:, second]
+            pairs[:, _TRICODE_COLUMN[first + 4 * second]] += count
+    return pairs
+
+
+def _oriented(n, indptr, edges):
+    """
+    The undirected edges oriented from the lower to the higher (degree, node) rank, as
+    sorted keys and as a CSR adjacency with sorted neighbours.
+    """
+    rank = np.empty(n, dtype=np.int64)
+    rank[np.lexsort((np.arange(n), np.diff(indptr)))] = np.arange(n)
+    v, u = edges[:, 0], edges[:, 1]
+    flip = rank[v] > rank[u]
+    a, b = np.where(flip, u, v), np.where(flip, v, u)
+    order = np.lexsort((b, a))
+    a, b = a[order], b[order]
+    out_indptr = np.zeros(n + 1, dtype=np.int64)
+    out_indptr[1:] = np.cumsum(np.bincount(a, minlength=n))
+    return a * n + b, out_indptr, b
+
+
+def _triangles(n, keys, oriented_keys, out_indptr, out_indices, sources):
+    """
+    The triangles (a, b, c) with the oriented edges a -> b, a -> c and b -> c, for the
+    oriented edges a -> b in `sources` (a slice or indices of the oriented edges): the
+    position of a -> b in `sources`, the nodes (a, b, c) and their tricode.
+    """
+    a = oriented_keys[sources] // n
+    b = out_indices[sources]
+    owner, c = _neighbor_entries(out_indptr, out_indices, a)
+    closed = _has(oriented_keys, b[owner] * n + c)
+    owner, c = owner[closed], c[closed]
+    a, b = a[owner], b[owner]
+    code = (
+        _has(keys, a * n + b) * 1
+        + _has(keys, b * n + a) * 2
+        + _has(keys, a * n + c) * 4
+        + _has(keys, c * n + a) * 8
+        + _has(keys, b * n + c) * 16
+        + _has(keys, c * n + b) * 32
+    )
+    return owner, (a, b, c), code
+
+
+def _triangle_contributions(n, keys, oriented_keys, out_indptr, out_indices, sources):
+    """
+    What the triangles found from every oriented edge in `sources` change in the census
+    computed as if there were none (rows are the edges, columns in TRIAD_NAMES order):
+    the triangles are added, the wedges at their three corners are not open, the nodes
+    of their edges are not outside both ends, and the empty triads balance the total.
+    """
+    owner, _, code = _triangles(
+        n, keys, oriented_keys, out_indptr, out_indices, sources
+    )
+    vu, vw, uw = code & 3, (code >> 2) & 3, (code >> 4) & 3
+    n_sources = len(oriented_keys[sources])
+    size = n_sources * len(TRIAD_NAMES)
+    offset = owner * len(TRIAD_NAMES)
+    change = np.bincount(offset + _TRICODE_COLUMN[code], minlength=size)
+    for first, second in [(vu, vw), (_swap(vu), uw), (_swap(vw), _swap(uw))]:
+        change -= np.bincount(
+            offset + _TRICODE_COLUMN[first + 4 * second], minlength=size
+        )
+    change = change.reshape(n_sources, len(TRIAD_NAMES))
+    mutual = np.bincount(
+        owner, (vu == 3) * 1 + (vw == 3) + (uw == 3), minlength=n_sources
+    ).astype(np.int64)
+    change[:, TRIAD_NAMES.index("102")] += mutual
+    change[:, TRIAD_NAMES.index("012")] += 3 * np.bincount(owner, minlength=n_sources)
+    change[:, TRIAD_NAMES.index("012")] -= mutual
+    change[:, 0] -= change.sum(axis=1)
+    return change
+
+
+def _slices(cost, max_candidates):
+    """Consecutive slices with about `max_candidates` of the cumulative `cost` each."""
+    start = 0
+    while start < len(cost):
+        done = cost[start - 1] if start else 0
+        stop = max(
+            start + 1, int(np.searchsorted(cost, done + max_candidates, "right"))
+        )
+        yield slice(start, stop)
+        start = stop
+
+
+def _shards(n, oriented, n_jobs) -> list:
+    """
+    Slices of the oriented edges, for `n_jobs` workers: shards of consecutive source
+    nodes with about the same number of candidates.
+    """
+    oriented_keys, out_indptr, _ = oriented
+    m = len(oriented_keys)
+    if n_jobs == 1 or m == 0:
+        return [slice(0, m)]
+    cost = np.cumsum(np.diff(out_indptr)[oriented_keys // n])
+    n_shards = 4 * max(1, abs(n_jobs))
+    bounds = np.searchsorted(cost, cost[-1] * np.arange(1, n_shards) / n_shards)
+    bounds = np.unique(np.concatenate([[0], bounds, [m]]))
+    return [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def _triangle_census(n, keys, oriented, shard, max_candidates):
+    """The sum of the triangle contributions of the oriented edges in `shard`."""
+    oriented_keys, out_indptr, out_indices = oriented
+    total = np.zeros(len(TRIAD_NAMES), dtype=np.int64)
+    cost = np.cumsum(np.diff(out_indptr)[oriented_keys[shard] // n])
+    for batch in _slices(cost, max_candidates):
+        sources = slice(shard.start + batch.start, shard.start + batch.stop)
+        total += _triangle_contributions(n, keys, *oriented, sources).sum(axis=0)
+    return total
+
+
+def _open_census(n, keys, indptr, edges) -> np.ndarray:
+    """
+    The census as if the graph had no triangles: the two-dyad wedges at every node and
+    the nodes outside both ends of every edge. "003" balances the total.
+    """
+    dyad = _dyad_types(n, keys, edges)
+    by_type = np.zeros((n, 4), dtype=np.int64)
+    np.add.at(by_type, (edges[:, 0], dyad), 1)
+    np.add.at(by_type, (edges[:, 1], _swap(dyad)), 1)
+    census = np.zeros(len(TRIAD_NAMES), dtype=object)
+    census[:] = [int(count) for count in _wedge_pairs(by_type).sum(axis=0)]
+    degree = np.diff(indptr)
+    outside = n - degree[edges[:, 0]] - degree[edges[:, 1]]
+    census[TRIAD_NAMES.index("102")] = int(outside[dyad == 3].sum())
+    census[TRIAD_NAMES.index("012")] = int(outside[dyad != 3].sum())
+    census[0] = comb(n, 3) - census.sum()
+    return census
+
+
+def triadic_census(
+    G: Union[nx.DiGraph, csr_graph.CSRGraph],
+    n_jobs: int = 1,
+    max_candidates: int = 1 << 22,
+) -> dict:
+    """
+    The triadic census of a directed graph; the same counts as `nx.triadic_census`.
+
+    Parameters:
+    G (networkx.DiGraph or csr_graph.CSRGraph): A directed graph. Self-loops and
+        parallel edges are ignored.
+    n_jobs (int): Worker processes over shards of the nodes (joblib semantics).
+    max_candidates (int): Triangles are searched in batches with about this many
+        candidates, which bounds the memory use.
+
+    Returns:
+    dict: Triad name -> count, in TRIAD_NAMES order.
+    """
+    n, keys, indptr, indices, edges, _ = _prepare(G)
+    oriented = _oriented(n, indptr, edges)
+    shards = _shards(n, oriented, n_jobs)
+    parts = Parallel(n_jobs=n_jobs if len(shards) > 1 else 1)(
+        delayed(_triangle_census)(n, keys, oriented, shard, max_candidates)
+        for shard in shards
+    )
+    total = _open_census(n, keys, indptr, edges) + np.sum(parts, axis=0)
+    return {name: int(count) for name, count in zip(TRIAD_NAMES, total)}
+
+
+def sampled_triadic_census(
+    G: Union[nx.DiGraph, csr_graph.CSRGraph],
+    n_edges: int = 10000,
+    seed: int = None,
+    confidence: float = 0.95,
+    max_candidates: int = 1 << 22,
+) -> pd.DataFrame:
+    """
+    Estimate the triadic census, with the triangles searched from a uniform sample of
+    `n_edges` edges.
+
+    The triads without a triangle are counted exactly. Every triangle is found from
+    exactly one (oriented) edge, so the triangle part of the census is the sum of the
+    per-edge contributions; it is estimated as the number of edges times their mean
+    over the sample, with a finite-population-corrected normal confidence interval.
+
+    Returns:
+    pandas.DataFrame: Indexed by triad name (TRIAD_NAMES order), with the columns
+        `estimate` and `half_width` (0 when all the edges are used).
+    """
+    n, keys, indptr, indices, edges, _ = _prepare(G)
+    oriented = _oriented(n, indptr, edges)
+    m = len(edges)
+    k = min(n_edges, m)
+    sample = np.sort(np.random.default_rng(seed).choice(m, size=k, replace=False))
+    cost = np.cumsum(np.diff(oriented[1])[oriented[0][sample] // n])
+    change = np.zeros((0, len(TRIAD_NAMES)), dtype=np.int64)
+    change = np.concatenate(
+        [change]
+        + [
+            _triangle_contributions(n, keys, *oriented, sample[batch])
+            for batch in _slices(cost, max_candidates)
+        ]
+    ).astype(np.float64)
+    estimate = _open_census(n, keys, indptr, edges).astype(np.float64)
+    half_width = np.zeros(len(TRIAD_NAMES))
+    if k:
+        estimate += m * change.mean(axis=0)
+    if 1 < k < m:
+        z = stats.norm.ppf(0.5 + confidence / 2)
+        correction = np.sqrt((m - k) / (m - 1))
+        half_width = m * z * change.std(axis=0, ddof=1) / np.sqrt(k) * correction
+    return pd.DataFrame(
+        {"estimate": estimate, "half_width": half_width},
+        index=pd.Index(TRIAD_NAMES, name="triad"),
+    )
+
+
+def _corner_classes(code):
+    """
+    The wedge class at every corner of triangles with tricodes `code`, and the class of
+    the one-dyad triads of their three edges.
+    """
+    vu, vw, uw = code & 3, (code >> 2) & 3, (code >> 4) & 3
+    corners = [
+        _TRICODE_COLUMN[vu + 4 * vw],
+        _TRICODE_COLUMN[_swap(vu) + 4 * uw],
+        _TRICODE_COLUMN[_swap(vw) + 4 * _swap(uw)],
+    ]
+    dyads = [_TRICODE_COLUMN[dyad] for dyad in (vu, vw, uw)]
+    return corners, dyads
+
+
+def _triangle_profile(n, keys, oriented, shard, max_candidates):
+    """
+    What the triangles found from the oriented edges in `shard` change in the per-node
+    profile computed as if there were none, flattened (node * 16 + class).
+    """
+    oriented_keys, out_indptr, out_indices = oriented
+    n_classes = len(TRIAD_NAMES)
+    profile = np.zeros(n * n_classes, dtype=np.int64)
+    cost = np.cumsum(np.diff(out_indptr)[oriented_keys[shard] // n])
+    for batch in _slices(cost, max_candidates):
+        sources = slice(shard.start + batch.start, shard.start + batch.stop)
+        _, nodes, code = _triangles(n, keys, *oriented, sources)
+        corners, dyads = _corner_classes(code)
+        # every node of a triangle is in it, not in the three wedges it closes, and in
+        # one fewer one-dyad triad per edge of the triangle
+        added = [_TRICODE_COLUMN[code]] + dyads
+        for node in nodes:
+            offset = node * n_classes
+            profile += np.bincount(
+                np.concatenate([offset + k for k in added + corners]),
+                np.repeat([1, -1], [len(code) * len(added), len(code) * 3]),
+                minlength=len(profile),
+            ).astype(np.int64)
+    return profile
+
+
+def _open_profile(n, keys, indptr, edges) -> np.ndarray:
+    """
+    The per-node triad profile (nodes x 16) as if the graph had no triangles, without
+    "003".
+    """
+    n_classes = len(TRIAD_NAMES)
+    dyad = _dyad_types(n, keys, edges)
+    by_type = np.zeros((n, 4), dtype=np.int64)
+    np.add.at(by_type, (edges[:, 0], dyad), 1)
+    np.add.at(by_type, (edges[:, 1], _swap(dyad)), 1)
+    degree = np.diff(indptr)
+    # the edges from both ends: node x, its neighbour c, the type of (c, x) seen from c
+    x = np.concatenate([edges[:, 1], edges[:, 0]])
+    c = np.concatenate([edges[:, 0], edges[:, 1]])
+    t = np.concatenate([dyad, _swap(dyad)])
+
+    # x at the centre of a wedge
+    profile = _wedge_pairs(by_type).ravel()
+    # x at an end of a wedge with centre c, the other end of type s
+    for s in (1, 2, 3):
+        profile += np.bincount(
+            x * n_classes + _TRICODE_COLUMN[t + 4 * s],
+            by_type[c, s] - (t == s),
+            minlength=n * n_classes,
+        ).astype(np.int64)
+    profile = profile.reshape(n, n_classes)
+
+    # one-dyad triads: x at an end of the edge (x, c) and a third node outside both
+    # neighbourhoods, or x outside the neighbourhoods of both ends of an edge
+    mutual = by_type[:, 3]
+    asymmetric = by_type[:, 1] + by_type[:, 2]
+    for name, degree_t, is_t in [
+        ("102", mutual, t == 3),
+        ("012", asymmetric, t != 3),
+    ]:
+        outside = np.where(is_t, n - degree[x] - degree[c], 0)
+        neighbor_edges = np.bincount(x, degree_t[c] - is_t, minlength=n)
+        profile[:, TRIAD_NAMES.index(name)] = (
+            np.bincount(x, outside, minlength=n)
+            + degree_t.sum() // 2
+            - degree_t
+            - neighbor_edges
+        ).astype(np.int64)
+    return profile
+
+
+def triad_profile(
+    G: Union[nx.DiGraph, csr_graph.CSRGraph],
+    n_jobs: int = 1,
+    max_candidates: int = 1 << 22,
+) -> pd.DataFrame:
+    """
+    The number of triads of every class that every node of a directed graph is part of.
+
+    Nothing beyond the triangles is enumerated: the wedges and the one-dyad triads
+    follow from the dyad types of every node and of its neighbours, and "003" from the
+    C(n - 1, 2) triads of every node. Every triad is counted at its three nodes, so the
+    column sums are three times the triadic census.
+
+    Parameters:
+    G (networkx.DiGraph or csr_graph.CSRGraph): A directed graph. Self-loops and
+        parallel edges are ignored.
+    n_jobs (int): Worker processes over shards of the nodes (joblib semantics).
+    max_candidates (int): Triangles are searched in batches with about this many
+        candidates, which bounds the memory use.
+
+    Returns:
+    pd.DataFrame: Nodes x triad classes (TRIAD_NAMES order) counts, indexed by node.
+    """
+    n, keys, indptr, indices, edges, nodes = _prepare(G)
+    oriented = _oriented(n, indptr, edges)
+    shards = _shards(n, oriented, n_jobs)
+    parts = Parallel(n_jobs=n_jobs if len(shards) > 1 else 1)(
+        delayed(_triangle_profile)(n, keys, oriented, shard, max_candidates)
+        for shard in shards
+    )
+    profile = _open_profile(n, keys, indptr, edges)
+    profile += np.sum(parts, axis=0).reshape(n, len(TRIAD_NAMES))
+    profile[:, 0] = (n - 1) * (n - 2) // 2 - profile.sum(axis=1)
+    return pd.DataFrame(
+        profile, index=pd.Index(nodes, name="node"), columns=list(TRIAD_NAMES)
+    )